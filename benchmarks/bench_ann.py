@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from src.index_factory import create_index, resolve_index_type, search_params, train
+
+
+def _clustered(n: int, dim: int, rng: np.random.Generator, centers: int = 256) -> np.ndarray:
+    # Real embeddings are clustered; uniform noise would make every IVF list equally bad
+    c = rng.standard_normal((centers, dim)).astype("float32")
+    x = c[rng.integers(centers, size=n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+# Recall@k vs single-query latency for each index type on synthetic vectors
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_ann")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = _clustered(args.vectors, args.dim, rng)
+    queries = _clustered(args.queries, args.dim, rng)
+    ids = np.arange(len(base), dtype="int64")
+
+    print(f"{'type':>6} {'knob':>12} {'build_s':>8} {'MB':>7} {'p50_ms':>7} {'p99_ms':>7} {'recall':>7}")
+    truth = None
+    sweeps = {"flat": [None], "hnsw": [16, 32, 64, 128], "ivf": [1, 4, 16, 64], "ivfpq": [1, 4, 16, 64]}
+    for kind, knobs in sweeps.items():
+        resolved = resolve_index_type(kind, len(base))
+        start = time.perf_counter()
+        index = create_index(resolved, args.dim, len(base))
+        train(index, base)
+        index.add_with_ids(base, ids)
+        build_s = time.perf_counter() - start
+        mb = len(faiss.serialize_index(index)) / 1e6
+        for knob in knobs:
+            params = search_params(resolved, nprobe=knob, ef_search=knob)
+            lat = []
+            found = []
+            for q in queries:
+                t = time.perf_counter()
+                _, I = index.search(q[None, :], args.k, params=params)
+                lat.append((time.perf_counter() - t) * 1000)
+                found.append(I[0])
+            if truth is None:
+                truth = np.array(found)
+            label = "-" if knob is None else (f"efSearch={knob}" if resolved == "hnsw" else f"nprobe={knob}")
+            print(
+                f"{resolved:>6} {label:>12} {build_s:>8.2f} {mb:>7.1f} "
+                f"{np.percentile(lat, 50):>7.3f} {np.percentile(lat, 99):>7.3f} {_recall(np.array(found), truth):>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
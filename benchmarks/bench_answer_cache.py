@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from src import gitlab_api_handler, langchain_chain
+from src.answer_cache import answer_cache
+from src.config import settings
+from src.embedding_pipeline import reset_pipeline
+from src.index_registry import registry
+from src.index_updater import rebuild_index_for_project
+from src.query_processor import answer_question
+from src.utils import TTLFileCache
+
+from .fakes import FakeEmbeddingsServer, FakeGitLabServer, fake_chat_model, synthetic_repo
+
+
+# /ask latency: cold vs exact repeat vs near-duplicate question, with a slow fake LLM
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_answer_cache")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--embed-latency", type=float, default=0.03)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeGitLabServer(synthetic_repo(200)) as gitlab, FakeEmbeddingsServer(
+        latency=args.embed_latency
+    ) as emb:
+        settings.gitlab_base_url = gitlab.api_url
+        settings.embedding_base_url = emb.base_url
+        settings.embedding_api_key = "bench"
+        settings.index_dir = f"{tmp}/indices"
+        settings.embedding_cache_path = f"{tmp}/emb.sqlite"
+        gitlab_api_handler.cache = TTLFileCache(f"{tmp}/cache")
+        reset_pipeline()
+        registry.clear()
+        langchain_chain.make_chain = lambda: fake_chat_model(latency=args.llm_latency)
+        project = gitlab.projects[0]
+        rebuild_index_for_project(project)
+
+        timings = {"cold": [], "exact": [], "semantic": []}
+        for i in range(args.rounds):
+            question = f"Where is order number {i} saved?"
+            # same words with different punctuation: misses the exact hash, hits by similarity
+            variants = (("cold", question), ("exact", question), ("semantic", question.rstrip("?") + "?!"))
+            for kind, q in variants:
+                start = time.perf_counter()
+                out = answer_question(project, q)
+                timings[kind].append((time.perf_counter() - start) * 1000)
+                if kind != "cold" and not out["cached"]:
+                    timings[kind].pop()
+        print(f"{'path':>9} {'n':>4} {'p50_ms':>8} {'mean_ms':>8}")
+        for kind, values in timings.items():
+            if values:
+                print(f"{kind:>9} {len(values):>4} {statistics.median(values):>8.2f} {statistics.mean(values):>8.2f}")
+        print("stats:", answer_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from src.chunking import chunk_source, get_tokenizer
+from src.config import settings
+
+
+def _legacy_chunks(text: str, max_tokens: int) -> List[str]:
+    # The previous splitter: 4 chars per token, blank-line paragraphs, then hard cuts
+    max_chars = max_tokens * 4
+    chunks: List[str] = []
+    current = ""
+    for para in text.split("\n\n"):
+        if current and len(current) + len(para) + 2 > max_chars:
+            chunks.append(current)
+            current = para
+        else:
+            current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return [c[i : i + max_chars] for c in chunks for i in range(0, len(c), max_chars)]
+
+
+def _go_file(i: int) -> str:
+    funcs = [
+        f"// Handle{j} serves route {j} of service {i}.\n"
+        f"func Handle{j}(w http.ResponseWriter, r *http.Request) {{\n"
+        f"\tid := r.URL.Query().Get(\"id\")\n"
+        f"\tif id == \"\" {{\n\t\thttp.Error(w, \"missing id\", http.StatusBadRequest)\n\t\treturn\n\t}}\n"
+        f"\tfor k := 0; k < {j + 3}; k++ {{\n\t\tlog.Printf(\"retry %d for %s\", k, id)\n\t}}\n"
+        f"\tw.Write([]byte(id))\n}}\n"
+        for j in range(40)
+    ]
+    return f"package service{i}\n\nimport (\n\t\"log\"\n\t\"net/http\"\n)\n\n" + "\n".join(funcs)
+
+
+def _ts_file(i: int) -> str:
+    methods = [
+        f"  /** Loads order {j}. */\n"
+        f"  async load{j}(id: string): Promise<Order> {{\n"
+        f"    const res = await this.http.get(`/orders/${{id}}/{j}`);\n"
+        f"    if (!res.ok) {{\n      throw new Error(\"failed\");\n    }}\n"
+        f"    return res.json() as Order;\n  }}\n"
+        for j in range(60)
+    ]
+    return f"import {{ Http }} from \"./http\";\n\nexport class OrderClient{i} {{\n" + "\n".join(methods) + "}\n"
+
+
+def _corpus(mb: float) -> Dict[str, Dict[str, str]]:
+    # The repository's own Python and Markdown, plus generated Go and TypeScript, each
+    # repeated up to ~mb megabytes per language
+    root = Path(__file__).resolve().parents[1]
+    python = [p.read_text(encoding="utf-8") for p in sorted(root.glob("**/*.py")) if ".git" not in p.parts]
+    markdown = [p.read_text(encoding="utf-8") for p in sorted(root.glob("*.md"))]
+    sources: Dict[str, Callable[[int], str]] = {
+        "py": lambda i: python[i % len(python)],
+        "go": _go_file,
+        "ts": _ts_file,
+        "md": lambda i: markdown[i % len(markdown)],
+    }
+    corpus: Dict[str, Dict[str, str]] = {}
+    for ext, make in sources.items():
+        files: Dict[str, str] = {}
+        size = 0
+        while size < mb * 1024**2:
+            text = make(len(files))
+            files[f"f{len(files)}.{ext}"] = text
+            size += len(text.encode("utf-8"))
+        corpus[ext] = files
+    return corpus
+
+
+# Chunking throughput per language (MB/s of source) and chunk quality against the token
+# budget: chunks over it, mean fill, and the legacy character splitter for reference
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_chunking")
+    parser.add_argument("--mb", type=float, default=2.0, help="source megabytes per language")
+    parser.add_argument("--max-tokens", type=int, default=settings.chunk_max_tokens)
+    parser.add_argument("--overlap", type=int, default=settings.chunk_overlap_tokens)
+    parser.add_argument("--tokenizer", default=settings.chunk_tokenizer)
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer(args.tokenizer)
+    print(f"tokenizer: {tokenizer.name}, max_tokens: {args.max_tokens}, overlap: {args.overlap}")
+    print(f"{'lang':>5} {'chunker':>8} {'MB/s':>8} {'chunks':>7} {'mean_tok':>9} {'max_tok':>8} {'over':>6}")
+    for ext, files in _corpus(args.mb).items():
+        mb = sum(len(t.encode("utf-8")) for t in files.values()) / 1024**2
+        chunkers: Dict[str, Callable[[str, str], List[str]]] = {
+            "legacy": lambda path, text: _legacy_chunks(text, args.max_tokens),
+            "syntax": lambda path, text: chunk_source(text, path, args.max_tokens, args.overlap, tokenizer),
+        }
+        for name, chunk in chunkers.items():
+            start = time.perf_counter()
+            chunks = [c for path, text in files.items() for c in chunk(path, text)]
+            elapsed = time.perf_counter() - start
+            tokens = [tokenizer.count(c) for c in chunks]
+            over = sum(1 for n in tokens if n > args.max_tokens)
+            print(
+                f"{ext:>5} {name:>8} {mb / elapsed:>8.1f} {len(chunks):>7} {sum(tokens) / len(tokens):>9.0f}"
+                f" {max(tokens):>8} {over:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src import langchain_chain
+from src.chunking import chunk_source
+from src.config import settings
+from src.context_assembler import assemble_context, context_tokenizer
+from src.lexical_index import BM25Index
+
+
+# Prompt size and assembly cost: the old context (first 8 retrieved chunks joined as-is) vs
+# the assembler, on BM25 retrieval over this repository's own files chunked with overlap.
+# Also the cost of building a chat client per answer vs reusing one.
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_context")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=settings.context_candidates)
+    parser.add_argument("--chunk-tokens", type=int, default=settings.chunk_max_tokens)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--budget", type=int, default=settings.context_max_tokens)
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parents[1]
+    chunks: List[Dict[str, Any]] = []
+    for path in sorted(root.glob("src/*.py")) + sorted(root.glob("benchmarks/*.py")):
+        rel = str(path.relative_to(root))
+        for text in chunk_source(path.read_text(encoding="utf-8"), rel, args.chunk_tokens, args.overlap):
+            chunks.append({"project": "bench", "path": rel, "id": len(chunks), "text": text})
+    names = sorted({m for c in chunks for m in re.findall(r"def (\w{4,})", c["text"])})
+    rng = random.Random(0)
+    questions = [f"how does {rng.choice(names)} work with {rng.choice(names)}?" for _ in range(args.queries)]
+    tokenizer = context_tokenizer()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bm25 = BM25Index.build(Path(tmp) / "bm25", ((c["id"], c["path"] + "\n" + c["text"]) for c in chunks))
+        old_tokens: List[int] = []
+        new_tokens: List[int] = []
+        new_blocks: List[int] = []
+        assemble_ms: List[float] = []
+        for q in questions:
+            hits = [{**chunks[i], "score": s} for i, s in bm25.search(q, args.candidates)]
+            old_tokens.append(tokenizer.count("\n\n".join(h["text"] for h in hits[:8])))
+            start = time.perf_counter()
+            blocks = assemble_context(hits, max_tokens=args.budget, tokenizer=tokenizer)
+            assemble_ms.append((time.perf_counter() - start) * 1000)
+            new_tokens.append(sum(b["tokens"] for b in blocks))
+            new_blocks.append(len(blocks))
+
+    print(f"tokenizer: {tokenizer.name}, chunks: {len(chunks)}, candidates: {args.candidates}, budget: {args.budget}")
+    print(f"{'context':>10} {'mean_tok':>9} {'p95_tok':>8} {'max_tok':>8} {'blocks':>7} {'p50_ms':>7}")
+    for name, tokens, blocks, ms in (
+        ("first-8", old_tokens, [8] * len(old_tokens), None),
+        ("assembled", new_tokens, new_blocks, assemble_ms),
+    ):
+        tokens = sorted(tokens)
+        p50 = f"{statistics.median(ms):>7.2f}" if ms else f"{'-':>7}"
+        print(
+            f"{name:>10} {statistics.mean(tokens):>9.0f} {tokens[int(len(tokens) * 0.95)]:>8} {tokens[-1]:>8}"
+            f" {statistics.mean(blocks):>7.1f} {p50}"
+        )
+
+    settings.openai_api_key = settings.openai_api_key or "bench"
+    start = time.perf_counter()
+    for _ in range(20):
+        langchain_chain.make_chain()
+    per_answer = (time.perf_counter() - start) / 20 * 1000
+    langchain_chain.get_chat_model()
+    start = time.perf_counter()
+    for _ in range(20):
+        langchain_chain.get_chat_model()
+    reused = (time.perf_counter() - start) / 20 * 1000
+    print(f"chat client: new per answer {per_answer:.2f} ms, reused {reused:.4f} ms (before any connection setup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+from src import gitlab_api_handler, langchain_chain
+from src.config import settings
+from src.embedding_pipeline import reset_pipeline
+from src.index_registry import registry
+from src.index_updater import rebuild_index_for_project
+from src.query_processor import answer_question
+from src.utils import TTLFileCache
+
+from .fakes import FakeEmbeddingsServer, FakeGitLabServer, fake_chat_model, synthetic_repo
+
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+# Lower is better for these, higher for throughput. Differences under the floor are noise
+# whatever the relative change (a 0.3 -> 0.5 ms p50 is not a regression).
+_LOWER_BETTER = {"p50_ms": 2.0, "p95_ms": 2.0, "p99_ms": 2.0, "peak_mb": 16.0}
+_HIGHER_BETTER = ("throughput",)
+# Below these sample counts a tail percentile is just the slowest call: not compared
+_MIN_SAMPLES = {"p95_ms": 20, "p99_ms": 100}
+# Options that do not change what is measured, left out of the recorded config
+_RUN_OPTIONS = {"baseline", "save_baseline", "threshold", "out"}
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _reset_peak_rss() -> None:
+    # Writing 5 to clear_refs resets VmHWM to the current RSS, so each stage reports its
+    # own peak rather than the largest one so far
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def measure(call: Callable[[Any], Any], items: Sequence[Any], clients: int = 1, units: int = 1) -> Dict[str, float]:
+    # Latency of each call, calls (times `units`, e.g. files per rebuild) per second over
+    # the whole stage, and the stage's peak RSS
+    latencies: List[float] = []
+
+    def one(item: Any) -> None:
+        t = time.perf_counter()
+        call(item)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    _reset_peak_rss()
+    start = time.perf_counter()
+    if clients > 1:
+        with ThreadPoolExecutor(max_workers=clients) as ex:
+            list(ex.map(one, items))
+    else:
+        for item in items:
+            one(item)
+    elapsed = time.perf_counter() - start
+    return {
+        "n": len(latencies),
+        "throughput": len(latencies) * units / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "peak_mb": _status_kb("VmHWM") / 1024,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    # Human-readable regressions of `results` against `baseline` beyond `threshold` (0.2 = 20%)
+    regressions: List[str] = []
+    for stage, old in baseline.get("stages", {}).items():
+        new = results.get("stages", {}).get(stage)
+        if new is None:
+            regressions.append(f"{stage}: missing from this run")
+            continue
+        for metric, floor in _LOWER_BETTER.items():
+            if min(old.get("n", 0), new["n"]) < _MIN_SAMPLES.get(metric, 0):
+                continue
+            if metric in old and new[metric] > old[metric] * (1 + threshold) and new[metric] - old[metric] > floor:
+                regressions.append(f"{stage}.{metric}: {old[metric]:.1f} -> {new[metric]:.1f}")
+        for metric in _HIGHER_BETTER:
+            if metric in old and new[metric] < old[metric] / (1 + threshold):
+                regressions.append(f"{stage}.{metric}: {old[metric]:.1f} -> {new[metric]:.1f}")
+    return regressions
+
+
+def _changed(files: Dict[str, str], n: int, round_no: int) -> Dict[str, str]:
+    out = dict(files)
+    for path in sorted(p for p in files if p.endswith(".py"))[:n]:
+        out[path] = files[path] + f"def patched_{round_no}(value):\n    return value - {round_no}\n"
+    return out
+
+
+def run_suite(args: argparse.Namespace, tmp: str) -> Dict[str, Any]:
+    files = synthetic_repo(args.files, args.file_size)
+    projects = ("bench-app", "bench-lib")
+    stages: Dict[str, Dict[str, float]] = {}
+    with FakeGitLabServer(files, projects=projects, latency=args.gitlab_latency) as gitlab, FakeEmbeddingsServer(
+        dim=args.dim, latency=args.embed_latency
+    ) as emb:
+        settings.gitlab_base_url = gitlab.api_url
+        settings.gitlab_token = "bench"
+        settings.embedding_base_url = emb.base_url
+        settings.embedding_api_key = "bench"
+        settings.openai_api_key = "bench"
+        # Every rebuild starts cold and every question runs the whole pipeline
+        settings.embedding_cache_enabled = False
+        settings.answer_cache_enabled = False
+        settings.index_dir = f"{tmp}/indices"
+        reset_pipeline()
+        registry.clear()
+        langchain_chain.make_chain = lambda: fake_chat_model(latency=args.llm_latency)
+        langchain_chain.reset_chat_model()
+
+        def rebuild(item: tuple) -> None:
+            project, round_no = item
+            gitlab_api_handler.cache = TTLFileCache(f"{tmp}/cache-{project}-{round_no}")
+            rebuild_index_for_project(project, full=True)
+
+        items = [(p, r) for r in range(args.rebuild_rounds) for p in projects]
+        stages["rebuild_full"] = measure(rebuild, items, units=len(files))
+
+        def update(round_no: int) -> None:
+            # The same files change in every round, each time relative to the previous one
+            gitlab.commit(_changed(files, args.changed, round_no), f"{round_no + 1:040x}")
+            gitlab.diffs = [{"old_path": p, "new_path": p} for p in sorted(gitlab.files) if gitlab.files[p] != files[p]]
+            result = rebuild_index_for_project(projects[0])
+            assert result["mode"] == "incremental", result
+
+        stages["rebuild_incremental"] = measure(update, range(args.rebuild_rounds), units=args.changed)
+
+        names = sorted(p.rsplit("/", 1)[-1][:-3] for p in files if p.endswith(".py"))
+        questions = [f"what does {names[(i * 7919) % len(names)]} return for value {i}?" for i in range(args.queries)]
+        stages["answer_question"] = measure(lambda q: answer_question(projects[0], q), questions)
+
+        from fastapi.testclient import TestClient
+
+        from src.chat_interface import app
+
+        def post(path: str, **params: Any) -> None:
+            resp = client.post(path, params=params)
+            resp.raise_for_status()
+
+        def stream(q: str) -> None:
+            with client.stream("GET", f"/ask/stream/{projects[0]}", params={"q": q}) as resp:
+                resp.raise_for_status()
+                body = "".join(resp.iter_text())
+            assert "event: done" in body, body[-200:]
+
+        with TestClient(app) as client:
+            api = [f"api: {q}" for q in questions]
+            stages["api_ask"] = measure(lambda q: post(f"/ask/{projects[0]}", q=q), api, clients=args.clients)
+            stages["api_ask_stream"] = measure(stream, api, clients=args.clients)
+            stages["api_ask_many"] = measure(
+                lambda q: post("/ask", q=q, projects=list(projects)), api, clients=args.clients
+            )
+    return {"config": {k: v for k, v in vars(args).items() if k not in _RUN_OPTIONS}, "stages": stages}
+
+
+def _print(results: Dict[str, Any]) -> None:
+    print(f"{'stage':>20} {'n':>5} {'per_s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'peak_mb':>8}")
+    for name, s in results["stages"].items():
+        print(
+            f"{name:>20} {s['n']:>5} {s['throughput']:>9.1f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f}"
+            f" {s['p99_ms']:>9.2f} {s['peak_mb']:>8.0f}"
+        )
+
+
+# End-to-end suite against local stand-ins for GitLab, the embeddings API and the chat
+# model: full and incremental rebuilds, answer_question and the /ask endpoints. per_s is
+# files/s for full rebuilds, changed files/s for incremental ones and requests/s otherwise.
+# Compares with the JSON baseline and exits 1 when a metric regresses past --threshold.
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_e2e")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--file-size", type=int, default=2000)
+    parser.add_argument("--changed", type=int, default=20, help="files modified per incremental rebuild")
+    parser.add_argument("--rebuild-rounds", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent API clients")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--gitlab-latency", type=float, default=0.002)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--out", type=Path, help="also write this run's results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_suite(args, tmp)
+    _print(results)
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("config") != results["config"]:
+        print(f"baseline {args.baseline} was recorded with other options: {baseline.get('config')}")
+        sys.exit(2)
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print("REGRESSION", line)
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
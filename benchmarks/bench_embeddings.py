@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+from src.config import settings
+from src.embedding_pipeline import EmbeddingPipeline, openai_batch_fn, reset_pipeline
+
+from .fakes import FakeEmbeddingsServer
+
+
+# Embedding throughput (texts/s) as a function of in-flight requests against a local stand-in
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_embeddings")
+    parser.add_argument("--texts", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency per request, seconds")
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    args = parser.parse_args()
+
+    texts = [f"def function_{i}(x):\n    return x * {i}\n" * 8 for i in range(args.texts)]
+    with FakeEmbeddingsServer(latency=args.latency) as server:
+        settings.embedding_base_url = server.base_url
+        settings.embedding_api_key = "bench"
+        reset_pipeline()
+        print(f"{'in_flight':>9} {'seconds':>8} {'texts/s':>9} {'requests':>9}")
+        for c in (int(v) for v in args.concurrency.split(",")):
+            before = server.requests
+            pipe = EmbeddingPipeline(openai_batch_fn(), batch_size=args.batch_size, max_in_flight=c, tokens_per_minute=0)
+            start = time.perf_counter()
+            vectors = pipe.embed(texts)
+            elapsed = time.perf_counter() - start
+            assert len(vectors) == len(texts)
+            print(f"{c:>9} {elapsed:>8.2f} {len(texts) / elapsed:>9.0f} {server.requests - before:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import faiss
+import numpy as np
+
+from src.index_factory import create_index, mmap_flags, search_params, train
+
+from .bench_ann import _clustered, _recall
+
+
+def _rss_mb() -> Dict[str, float]:
+    # RssAnon is private to the process; RssFile is page cache that other workers
+    # mapping the same generation share
+    out: Dict[str, float] = {}
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            key = line.split(":", 1)[0]
+            if key in ("RssAnon", "RssFile"):
+                out[key] = int(line.split()[1]) / 1024
+    return out
+
+
+def _child(path: str, kind: str, mmap: bool, data: str, k: int) -> None:
+    # A fresh interpreter per measurement, like a worker opening the generation
+    queries = np.load(f"{data}/queries.npy")
+    truth = np.load(f"{data}/truth.npy")
+    before = _rss_mb()
+    start = time.perf_counter()
+    index = faiss.read_index(path, mmap_flags(kind) if mmap else 0)
+    load_ms = (time.perf_counter() - start) * 1000
+    params = search_params(kind)
+    lat = []
+    found = []
+    for q in queries:
+        t = time.perf_counter()
+        _, ids = index.search(q[None, :], k, params=params)
+        lat.append((time.perf_counter() - t) * 1000)
+        found.append(ids[0])
+    after = _rss_mb()
+    print(
+        json.dumps(
+            {
+                "load_ms": load_ms,
+                "anon_mb": after["RssAnon"] - before["RssAnon"],
+                "file_mb": after["RssFile"] - before["RssFile"],
+                "p50_ms": float(np.percentile(lat, 50)),
+                "recall": _recall(np.array(found), truth),
+            }
+        )
+    )
+
+
+# What one worker pays to open and query a project index: today's private IndexFlatIP copy
+# vs float32/SQ8/fp16 vectors mapped from the generation file (INDEX_STORAGE, INDEX_MMAP).
+# Recall@k is against exact float32 search; anon_mb is per worker, file_mb is shared.
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_index_storage")
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        path, kind, mmap = args.child
+        _child(path, kind, mmap == "1", args.data, args.k)
+        return
+
+    rng = np.random.default_rng(0)
+    base = _clustered(args.vectors, args.dim, rng)
+    queries = _clustered(args.queries, args.dim, rng)
+    ids = np.arange(len(base), dtype="int64")
+    root = Path(__file__).resolve().parents[1]
+    rows = [
+        ("IndexFlatIP", "flat", "float32", False),
+        ("flat", "flat", "float32", True),
+        ("flat", "flat", "sq8", False),
+        ("flat", "flat", "sq8", True),
+        ("flat", "flat", "fp16", True),
+        ("ivf", "ivf", "float32", True),
+        ("ivf", "ivf", "sq8", True),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = faiss.IndexFlatIP(args.dim)
+        exact.add(base)
+        np.save(f"{tmp}/queries.npy", queries)
+        np.save(f"{tmp}/truth.npy", exact.search(queries, args.k)[1])
+        del exact
+
+        print(f"vectors: {len(base)} x {args.dim}, k: {args.k}")
+        print(
+            f"{'index':>11} {'storage':>8} {'mmap':>5} {'file_mb':>8} {'load_ms':>8} {'anon_mb':>8}"
+            f" {'shared_mb':>9} {'p50_ms':>7} {'recall':>7}"
+        )
+        for label, kind, storage, mmap in rows:
+            path = f"{tmp}/{label}-{storage}.faiss"
+            if not Path(path).exists():
+                if label == "IndexFlatIP":
+                    # Files written before INDEX_STORAGE existed
+                    index = faiss.IndexIDMap2(faiss.IndexFlatIP(args.dim))
+                else:
+                    index = create_index(kind, args.dim, len(base), storage)
+                    train(index, base)
+                index.add_with_ids(base, ids)
+                faiss.write_index(index, path)
+                del index
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_index_storage", "--child", path, kind, str(int(mmap)),
+                 "--data", tmp, "--k", str(args.k)],
+                cwd=root, capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{label:>11} {storage:>8} {'yes' if mmap else 'no':>5} {Path(path).stat().st_size / 1024**2:>8.1f}"
+                f" {r['load_ms']:>8.1f} {r['anon_mb']:>8.1f} {r['file_mb']:>9.1f} {r['p50_ms']:>7.3f}"
+                f" {r['recall']:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+
+from src import gitlab_api_handler
+from src.config import settings
+from src.gitlab_api_handler import GitLabAPI
+from src.index_updater import _is_selected, _select_paths
+from src.utils import TTLFileCache
+
+from .fakes import FakeGitLabServer, synthetic_repo
+
+
+# Per-file vs archive ingest of a synthetic repository served by a local GitLab stand-in
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_ingest")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-size", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.01, help="server latency per request, seconds")
+    parser.add_argument("--workers", type=int, default=settings.gitlab_fetch_workers)
+    args = parser.parse_args()
+
+    repo = synthetic_repo(args.files, args.file_size)
+    with FakeGitLabServer(repo, latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        project = server.projects[0]
+        print(f"{'mode':>8} {'files':>6} {'MB':>6} {'seconds':>8} {'files/s':>8} {'requests':>9}")
+        for mode in ("files", "archive"):
+            # cold cache for each mode
+            gitlab_api_handler.cache = TTLFileCache(f"{tmp}/{mode}")
+            api = GitLabAPI(base_url=server.api_url, token="bench")
+            before = server.requests
+            start = time.perf_counter()
+            tree = api.get_repository_tree(project)
+            if mode == "files":
+                files = list(api.iter_files(project, sorted(_select_paths(tree)), workers=args.workers))
+            else:
+                files = list(api.iter_archive_files(project, include=_is_selected))
+            elapsed = time.perf_counter() - start
+            mb = sum(len(f["content"]) for f in files) / 1e6
+            print(
+                f"{mode:>8} {len(files):>6} {mb:>6.1f} {elapsed:>8.2f} "
+                f"{len(files) / elapsed:>8.0f} {server.requests - before:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .fakes import FakeEmbeddingsServer, FakeGitLabServer, synthetic_repo
+
+
+def _rss_mb(field: str) -> float:
+    # VmRSS (current) / VmHWM (peak) in KiB. Not ru_maxrss: it survives fork+exec, so the
+    # child would start at the parent's peak, which holds the whole fake repository
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(project: str) -> None:
+    # Runs in a fresh interpreter pointed at the fakes through the environment, so the peak
+    # RSS is the rebuild's own and not the fake servers' in-memory repository
+    from src.index_builder import FaissIndex, index_path_for
+    from src.index_updater import rebuild_index_for_project
+
+    baseline = _rss_mb("VmRSS")
+    start = time.perf_counter()
+    result = rebuild_index_for_project(project)
+    elapsed = time.perf_counter() - start
+    idx = FaissIndex(index_path_for(project)).load()
+    print(
+        json.dumps(
+            {
+                "seconds": elapsed,
+                "chunks": result["chunks"],
+                "baseline_mb": baseline,
+                "peak_mb": _rss_mb("VmHWM"),
+                "disk_mb": idx.nbytes / 1024**2,
+            }
+        )
+    )
+
+
+# Peak RSS of a full rebuild (tree -> archive fetch -> chunk -> embed -> index) as the
+# repository grows. disk_mb is the published generation (index, chunk store, postings).
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_ingest_memory")
+    parser.add_argument("--files", default="10000,30000,100000")
+    parser.add_argument("--file-size", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child)
+        return
+
+    root = Path(__file__).resolve().parents[1]
+    print(f"{'files':>8} {'chunks':>8} {'seconds':>8} {'base_mb':>8} {'peak_mb':>8} {'growth_mb':>9} {'disk_mb':>8}")
+    for n in (int(v) for v in args.files.split(",")):
+        with tempfile.TemporaryDirectory() as tmp, FakeGitLabServer(synthetic_repo(n, args.file_size)) as gitlab, \
+                FakeEmbeddingsServer(dim=args.dim, latency=0.0) as emb:
+            env = {
+                **os.environ,
+                "GITLAB_BASE_URL": gitlab.api_url,
+                "GITLAB_TOKEN": "bench",
+                "EMBEDDING_BASE_URL": emb.base_url,
+                "EMBEDDING_API_KEY": "bench",
+                "EMBEDDING_CACHE_ENABLED": "false",
+                "CACHE_DIR": f"{tmp}/cache",
+                "INDEX_DIR": f"{tmp}/indices",
+                "LOG_LEVEL": "WARNING",
+            }
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingest_memory", "--child", gitlab.projects[0]],
+                cwd=root, env=env, capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{n:>8} {r['chunks']:>8} {r['seconds']:>8.1f} {r['baseline_mb']:>8.0f} {r['peak_mb']:>8.0f}"
+                f" {r['peak_mb'] - r['baseline_mb']:>9.0f} {r['disk_mb']:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from src.config import settings
+from src.embedding_pipeline import reset_pipeline
+from src.index_builder import FaissIndex
+from src.query_batcher import MicroBatcher, QueryEmbedder, _embed_batch, _search_batch
+
+from .fakes import FakeEmbeddingsServer
+
+
+def _run(clients: int, questions: List[str], ask: Callable[[str], object]) -> tuple:
+    latencies: List[float] = []
+
+    def one(q: str) -> None:
+        start = time.perf_counter()
+        ask(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as ex:
+        list(ex.map(one, questions))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(questions) / elapsed, statistics.median(latencies), p99
+
+
+# Query embedding + vector search under concurrent load: one request and one single-row
+# search per question (current path) vs micro-batched, vs batched with the query LRU
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmarks.bench_query_batching")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.03, help="embeddings API latency per request, seconds")
+    parser.add_argument("--repeat", type=float, default=0.5, help="share of questions asked before")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    questions = [f"where is handler {i} for order {i * 7} defined?" for i in range(args.queries)]
+    repeated = [rng.choice(questions[: max(1, i)]) if rng.random() < args.repeat else q for i, q in enumerate(questions)]
+
+    with tempfile.TemporaryDirectory() as tmp, FakeEmbeddingsServer(latency=args.latency) as emb:
+        settings.embedding_base_url = emb.base_url
+        settings.embedding_api_key = "bench"
+        settings.embedding_cache_enabled = False
+        settings.index_dir = tmp
+        reset_pipeline()
+        idx = FaissIndex(f"{tmp}/bench.faiss")
+        idx.build(
+            {"path": f"f{i}.py", "chunk_id": "0", "text": f"def handler_{i}(order): return order * {i}"}
+            for i in range(args.chunks)
+        )
+
+        direct = QueryEmbedder(0, 0, MicroBatcher(_embed_batch, 0))
+        batched = QueryEmbedder(0, 0, MicroBatcher(_embed_batch, args.window_ms, workers=settings.embedding_max_in_flight))
+        cached = QueryEmbedder(4096, 3600, MicroBatcher(_embed_batch, args.window_ms, workers=settings.embedding_max_in_flight))
+        search = MicroBatcher(_search_batch, args.window_ms, workers=2)
+        modes = [
+            ("direct", questions, lambda q: idx.search_vector(direct.embed(q), 6)),
+            ("batched", questions, lambda q: search((idx, batched.embed(q), 6))),
+            ("batch+lru", repeated, lambda q: search((idx, cached.embed(q), 6))),
+        ]
+        print(f"{'path':>10} {'qps':>8} {'p50_ms':>8} {'p99_ms':>8} {'api_calls':>10}")
+        for name, qs, ask in modes:
+            before = emb.requests
+            qps, p50, p99 = _run(args.clients, qs, ask)
+            print(f"{name:>10} {qps:>8.0f} {p50:>8.2f} {p99:>8.2f} {emb.requests - before:>10}")
+        print("embed batches:", batched.batcher.stats(), "search batches:", search.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+# Local stand-ins for external services used by the benchmarks and tests
+
+
+def _token_vector(token: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype("float32")
+
+
+def fake_vector(text: str, dim: int) -> List[float]:
+    # Bag-of-words hashing embedding: deterministic, and texts sharing words are close,
+    # so retrieval and near-duplicate matching behave like a (very) small real model
+    import re
+
+    tokens = re.findall(r"\w+", text.lower()) or [text]
+    vec = np.zeros(dim, dtype="float32")
+    for tok in tokens:
+        vec += _token_vector(tok, dim)
+    vec /= np.linalg.norm(vec) or 1.0
+    return vec.tolist()
+
+
+class _Server:
+    handler_cls: type
+
+    def __init__(self) -> None:
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_cls)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # silence stderr
+        pass
+
+    @property
+    def owner(self):
+        return self.server.owner  # type: ignore[attr-defined]
+
+    def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class _EmbeddingsHandler(_JsonHandler):
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        body = self._read_json()
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        server: FakeEmbeddingsServer = self.owner
+        tokens = sum(len(t) // 4 + 1 for t in inputs)
+        if not server.admit(tokens):
+            self._send(429, {"error": {"message": "rate limited"}}, {"retry-after": "0.05"})
+            return
+        time.sleep(server.latency + server.per_input_latency * len(inputs))
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_vector(t, server.dim)}
+            for i, t in enumerate(inputs)
+        ]
+        self._send(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+
+class FakeEmbeddingsServer(_Server):
+    # OpenAI-compatible /v1/embeddings with deterministic unit vectors, fixed latency
+    # and an optional tokens-per-minute budget that answers 429 when exhausted
+    handler_cls = _EmbeddingsHandler
+
+    def __init__(self, dim: int = 64, latency: float = 0.02, per_input_latency: float = 0.0, tpm: int = 0) -> None:
+        super().__init__()
+        self.dim = dim
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.tpm = tpm
+        self.requests = 0
+        self.throttled = 0
+        self._window_start = time.monotonic()
+        self._window_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def admit(self, tokens: int) -> bool:
+        with self._lock:
+            self.requests += 1
+            if not self.tpm:
+                return True
+            now = time.monotonic()
+            if now - self._window_start >= 60.0:
+                self._window_start = now
+                self._window_tokens = 0
+            if self._window_tokens + tokens > self.tpm:
+                self.throttled += 1
+                return False
+            self._window_tokens += tokens
+            return True
+
+
+def synthetic_repo(n_files: int, file_size: int = 2000, seed: int = 0) -> Dict[str, str]:
+    # Deterministic repository: a README, some configs and n_files Python modules
+    rng = np.random.default_rng(seed)
+    files: Dict[str, str] = {
+        "README.md": "# Synthetic service\n\nRun with `make run`.\n",
+        "config/settings.yaml": "database:\n  url: postgres://db/app\n",
+        "docker-compose.yml": "services:\n  app:\n    build: .\n",
+    }
+    words = ["load", "save", "user", "order", "cache", "index", "token", "query", "parse", "build"]
+    for i in range(n_files):
+        name = f"{words[i % len(words)]}_{i}"
+        body: List[str] = []
+        size = 0
+        j = 0
+        while size < file_size:
+            w = words[int(rng.integers(len(words)))]
+            line = f"def {w}_{name}_{j}(value):\n    return value + {j}  # {w}\n\n"
+            body.append(line)
+            size += len(line)
+            j += 1
+        files[f"pkg{i % 50}/{name}.py"] = "".join(body)
+    return files
+
+
+def _blob_id(content: str) -> str:
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class _GitLabHandler(_JsonHandler):
+    def do_GET(self) -> None:
+        from urllib.parse import parse_qs, unquote, urlsplit
+
+        server: FakeGitLabServer = self.owner
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        segments = [unquote(s) for s in parts.path.split("/") if s]
+        time.sleep(server.latency)
+        kind = segments[5] if len(segments) > 5 else segments[-1]
+        with server.lock:
+            server.requests += 1
+            server.requests_by_kind[kind] = server.requests_by_kind.get(kind, 0) + 1
+        # /api/v4/projects[/<id>/repository/<kind>[/<arg>]]
+        if segments[:3] == ["api", "v4", "projects"] and len(segments) == 3:
+            self._paged([{"id": i + 1, "path_with_namespace": p, "name": p.split("/")[-1]} for i, p in enumerate(server.projects)], query)
+            return
+        if len(segments) < 6 or segments[:3] != ["api", "v4", "projects"] or segments[4] != "repository":
+            self._send(404, {"message": "404 Not Found"})
+            return
+        project, arg = segments[3], "/".join(segments[6:])
+        if project not in server.projects:
+            self._send(404, {"message": "404 Project Not Found"})
+            return
+        files = server.files
+        if kind == "tree":
+            self._paged(server.tree(), query)
+        elif kind == "files":
+            if arg not in files:
+                self._send(404, {"message": "404 File Not Found"})
+                return
+            content = files[arg]
+            self._send(
+                200,
+                {
+                    "file_name": arg.split("/")[-1],
+                    "file_path": arg,
+                    "encoding": "base64",
+                    "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+                    "blob_id": _blob_id(content),
+                    "commit_id": server.sha,
+                },
+            )
+        elif kind == "blobs":
+            blob = arg.split("/")[0]
+            for content in files.values():
+                if _blob_id(content) == blob:
+                    body = content.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+            self._send(404, {"message": "404 Blob Not Found"})
+        elif kind == "archive.tar.gz":
+            data = server.archive()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            # A stalled download: half the promised body, then nothing
+            self.wfile.write(data[: len(data) // 2] if server.archive_stalls else data)
+        elif kind == "commits":
+            self._send(200, {"id": server.sha, "short_id": server.sha[:8]})
+        elif kind == "branches":
+            self._send(200, {"name": arg, "commit": {"id": server.sha}})
+        elif kind == "compare":
+            self._send(200, {"commits": [], "diffs": server.diffs, "compare_timeout": False})
+        else:
+            self._send(404, {"message": "404 Not Found"})
+
+    def _paged(self, items: List[Any], query: Dict[str, str]) -> None:
+        from urllib.parse import urlencode, urlsplit
+
+        per_page = int(query.get("per_page", 20))
+        total_pages = max(1, -(-len(items) // per_page))
+        if query.get("pagination") == "keyset":
+            # No totals, only a Link to the next page. The cursor resumes after an item's id:
+            # id_after (projects) or page_token (tree record id), in offset-page order
+            start = 0
+            if "id_after" in query:
+                start = next((i for i, it in enumerate(items) if int(it["id"]) > int(query["id_after"])), len(items))
+            elif "page_token" in query:
+                start = next((i + 1 for i, it in enumerate(items) if str(it["id"]) == query["page_token"]), len(items))
+            chunk = items[start : start + per_page]
+            headers = {}
+            if chunk and start + per_page < len(items):
+                cursor = "id_after" if "id_after" in query else "page_token"
+                next_query = urlencode({**query, cursor: chunk[-1]["id"]})
+                headers["Link"] = f'<{self.owner.url}{urlsplit(self.path).path}?{next_query}>; rel="next"'
+            self._send(200, chunk, headers)
+            return
+        page = int(query.get("page", 1))
+        chunk = items[(page - 1) * per_page : page * per_page]
+        headers = {"X-Page": str(page), "X-Per-Page": str(per_page)}
+        if self.owner.send_totals:
+            headers.update({"X-Total": str(len(items)), "X-Total-Pages": str(total_pages)})
+        if page < total_pages:
+            headers["X-Next-Page"] = str(page + 1)
+        self._send(200, chunk, headers)
+
+
+class FakeGitLabServer(_Server):
+    # Minimal GitLab REST v4 stand-in over a synthetic in-memory repository
+    handler_cls = _GitLabHandler
+
+    def __init__(
+        self,
+        files: Optional[Dict[str, str]] = None,
+        projects: tuple[str, ...] = ("group/app",),
+        latency: float = 0.0,
+        send_totals: bool = True,
+    ) -> None:
+        super().__init__()
+        self.files = files if files is not None else synthetic_repo(50)
+        self.projects = projects
+        self.latency = latency
+        self.send_totals = send_totals
+        self.archive_stalls = False
+        self.sha = "0" * 40
+        self.diffs: List[Dict[str, Any]] = []
+        self.requests = 0
+        self.requests_by_kind: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self._archive: Optional[bytes] = None
+        self._tree: Optional[List[Dict[str, str]]] = None
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/api/v4"
+
+    def commit(self, files: Dict[str, str], sha: str) -> None:
+        self.files = files
+        self.sha = sha
+        self._archive = None
+        self._tree = None
+
+    def tree(self) -> List[Dict[str, str]]:
+        # Built once per commit: hashing every blob on each page request is quadratic
+        with self.lock:
+            if self._tree is None:
+                self._tree = [
+                    {"id": _blob_id(c), "name": p.split("/")[-1], "type": "blob", "path": p, "mode": "100644"}
+                    for p, c in sorted(self.files.items())
+                ]
+            return self._tree
+
+    def archive(self) -> bytes:
+        import io
+        import tarfile
+
+        with self.lock:
+            if self._archive is None:
+                buf = io.BytesIO()
+                with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+                    for path, content in sorted(self.files.items()):
+                        data = content.encode("utf-8")
+                        info = tarfile.TarInfo(f"app-{self.sha}-{self.sha}/{path}")
+                        info.size = len(data)
+                        tar.addfile(info, io.BytesIO(data))
+                self._archive = buf.getvalue()
+            return self._archive
+
+
+def fake_chat_model(answer: str = "Ответ из контекста.", latency: float = 0.3, token_latency: float = 0.0):
+    # Chat model stand-in: `latency` before the first token, `token_latency` per word after it
+    import re
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import AIMessageChunk
+    from langchain_core.outputs import ChatGenerationChunk
+
+    class FakeChatModel(FakeListChatModel):
+        first_token_latency: float = 0.0
+        per_token_latency: float = 0.0
+
+        def _call(self, messages, stop=None, run_manager=None, **kwargs):
+            words = len(self.responses[0].split())
+            time.sleep(self.first_token_latency + self.per_token_latency * words)
+            return self.responses[0]
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.first_token_latency)
+            for i, tok in enumerate(re.findall(r"\S+\s*", self.responses[0])):
+                if i:
+                    time.sleep(self.per_token_latency)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=tok))
+
+    return FakeChatModel(responses=[answer], first_token_latency=latency, per_token_latency=token_latency)
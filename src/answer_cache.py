@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+
+
+def _question_hash(question: str) -> str:
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# LRU + TTL cache of answers keyed by (project, ref, index generation, question). Entries of
+# an older generation can never match again, so a rebuild invalidates them implicitly;
+# near-duplicate questions match by cosine similarity of their query embeddings.
+class AnswerCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, similarity_threshold: float = 0.97) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[str, str, Hashable, str], Tuple[float, Dict[str, Any], Optional[np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch_locked(self, key: Tuple[str, str, Hashable, str]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if time.time() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, project_id: str, ref: str, generation: Hashable, question: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._touch_locked((project_id, ref, generation, _question_hash(question)))
+            if value is not None:
+                self.exact_hits += 1
+            return value
+
+    def get_similar(
+        self, project_id: str, ref: str, generation: Hashable, query_vec: np.ndarray
+    ) -> Optional[Dict[str, Any]]:
+        vec = np.asarray(query_vec, dtype="float32").reshape(-1)
+        with self._lock:
+            candidates = [
+                (key, emb)
+                for key, (_, _, emb) in self._entries.items()
+                if key[:3] == (project_id, ref, generation) and emb is not None and emb.shape == vec.shape
+            ]
+            if candidates:
+                # Query vectors are L2-normalised: one matrix-vector product gives all cosines
+                sims = np.stack([emb for _, emb in candidates]) @ vec
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity_threshold:
+                    value = self._touch_locked(candidates[best][0])
+                    if value is not None:
+                        self.semantic_hits += 1
+                        return value
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        project_id: str,
+        ref: str,
+        generation: Hashable,
+        question: str,
+        value: Dict[str, Any],
+        query_vec: Optional[np.ndarray] = None,
+    ) -> None:
+        emb = None if query_vec is None else np.asarray(query_vec, dtype="float32").reshape(-1)
+        key = (project_id, ref, generation, _question_hash(question))
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value, emb)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, project_id: str, ref: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == project_id and (ref is None or k[1] == ref)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+answer_cache = AnswerCache(
+    settings.answer_cache_max_entries, settings.answer_cache_ttl_seconds, settings.answer_cache_similarity
+)
@@ -1,24 +1,40 @@
 from __future__ import annotations
 
 import argparse
-from typing import Optional
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional
 
-from fastapi import FastAPI, Header, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from .access_control import can_access_project
+from .answer_cache import answer_cache
 from .config import settings
-from .index_updater import rebuild_index_for_project
-from .query_processor import answer_question
+from .index_registry import registry
+from .jobs import scheduler
+from .query_batcher import query_embedder, search_batcher
+from .query_processor import answer_question, answer_question_multi, llm_recorder, stream_answer_events, ttfb_recorder
 from .utils import setup_logger
-from .gitlab_api_handler import GitLabAPI
+from .gitlab_api_handler import AsyncGitLabAPI, GitLabAPI, aclose_clients, cache as gitlab_cache, revalidation_stats
 
 
 logger = setup_logger(__name__, settings.log_level)
 
-app = FastAPI(title="GitLab Multi-Repo Q&A Bot")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    yield
+    await aclose_clients()
+
+
+app = FastAPI(title="GitLab Multi-Repo Q&A Bot", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -28,8 +44,25 @@ def _is_configured() -> bool:
 
 
 @app.get("/healthz")
-def healthz() -> dict:
+async def healthz() -> dict:
     return {"status": "ok"}
+
+
+@app.get("/stats")
+async def stats() -> dict:
+    return {
+        "index_registry": registry.stats(),
+        "answer_cache": answer_cache.stats(),
+        "query_embeddings": query_embedder.stats(),
+        "query_search": search_batcher.stats(),
+        "gitlab_cache": gitlab_cache.stats(),
+        "gitlab_revalidation": revalidation_stats.as_dict(),
+        "stream_ttfb": ttfb_recorder.summary(),
+        "llm_latency": llm_recorder.summary(),
+        "jobs": scheduler.stats(),
+    }
+
+
 @app.middleware("http")
 async def redirect_to_setup(request: Request, call_next):
     if not _is_configured():
@@ -40,12 +73,12 @@ async def redirect_to_setup(request: Request, call_next):
 
 
 @app.get("/setup", response_class=HTMLResponse)
-def setup_page(request: Request):
+async def setup_page(request: Request):
     return templates.TemplateResponse("setup.html", {"request": request})
 
 
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
+async def home(request: Request):
     if not _is_configured():
         return RedirectResponse(url="/setup")
     # Minimal dashboard with simple controls
@@ -54,37 +87,100 @@ def home(request: Request):
 
 
 
-@app.post("/rebuild/{project_id}")
-def rebuild(project_id: str, x_api_key: Optional[str] = Header(default=None)) -> dict:
+@app.post("/rebuild/{project_id}", status_code=202)
+async def rebuild(
+    project_id: str, ref: str = "HEAD", full: bool = False, x_api_key: Optional[str] = Header(default=None)
+) -> dict:
+    # Enqueues a background job; poll GET /jobs/{job_id} for progress and the result
     if not can_access_project(project_id, x_api_key):
         raise HTTPException(status_code=403, detail="Forbidden")
-    rebuild_index_for_project(project_id)
-    return {"status": "ok"}
+    job = scheduler.submit(project_id, ref=ref, full=full)
+    return {"status": job.status, "job_id": job.id, "job": job.as_dict()}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, x_api_key: Optional[str] = Header(default=None)) -> dict:
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not can_access_project(job.project_id, x_api_key):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return job.as_dict()
+
+
+@app.get("/jobs")
+async def list_jobs(project_id: Optional[str] = None, x_api_key: Optional[str] = Header(default=None)) -> dict:
+    jobs = [j.as_dict() for j in scheduler.list(project_id) if can_access_project(j.project_id, x_api_key)]
+    return {"jobs": jobs}
+
+
+def _sse(events: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for ev in events:
+        yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+
+
+@app.api_route("/ask/stream/{project_id}", methods=["GET", "POST"])
+async def ask_stream(project_id: str, q: str, x_api_key: Optional[str] = Header(default=None)) -> StreamingResponse:
+    if not can_access_project(project_id, x_api_key):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return StreamingResponse(
+        _sse(stream_answer_events(project_id, q)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/ask/{project_id}")
-def ask(project_id: str, q: str, x_api_key: Optional[str] = Header(default=None)) -> dict:
+async def ask(project_id: str, q: str, x_api_key: Optional[str] = Header(default=None)) -> dict:
     if not can_access_project(project_id, x_api_key):
         raise HTTPException(status_code=403, detail="Forbidden")
-    return answer_question(project_id, q)
+    return await run_in_threadpool(answer_question, project_id, q)
+
+
+@app.post("/ask")
+async def ask_many(
+    q: str,
+    projects: List[str] = Query(default=[]),
+    group: Optional[str] = None,
+    x_api_key: Optional[str] = Header(default=None),
+) -> dict:
+    candidates = [p.strip() for p in projects]
+    group = (group or "").strip()
+    if group:
+        try:
+            listed = await AsyncGitLabAPI().list_group_projects(group)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise HTTPException(status_code=404, detail=f"Group not found: {group}")
+            raise HTTPException(status_code=502, detail=f"GitLab error {e.response.status_code} listing group {group}")
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"GitLab unavailable: {e}")
+        candidates.extend(p.get("path_with_namespace", "") for p in listed)
+    candidates = [p for p in dict.fromkeys(candidates) if p]
+    if not candidates:
+        raise HTTPException(status_code=400, detail="No projects to ask: pass projects or a non-empty group")
+    allowed = [p for p in candidates if can_access_project(p, x_api_key)]
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await run_in_threadpool(answer_question_multi, allowed, q)
 
 
 @app.post("/setup/validate/gitlab")
-def validate_gitlab(base_url: str, token: str) -> dict:
+async def validate_gitlab(base_url: str, token: str) -> dict:
     try:
-        api = GitLabAPI(base_url=base_url, token=token)
+        api = AsyncGitLabAPI(base_url=base_url, token=token)
         # trivial call to check auth and reachability
-        api.get_repository_tree(project_id="projects")  # will likely 404; ensure host/token usable via headers
+        await api.get_repository_tree(project_id="projects")  # will likely 404; ensure host/token usable via headers
     except Exception as e:
         return {"ok": False, "error": str(e)}
     return {"ok": True}
 
 
 @app.get("/setup/projects")
-def list_projects(q: str | None = None) -> dict:
+async def list_projects(q: str | None = None) -> dict:
     try:
-        api = GitLabAPI()
-        items = api.list_projects(search=q)
+        api = AsyncGitLabAPI()
+        items = await api.list_projects(search=q)
         # Return minimal info for selection
         projects = [
             {"id": str(i.get("id")), "path_with_namespace": i.get("path_with_namespace", ""), "name": i.get("name", "")}
@@ -96,7 +192,7 @@ def list_projects(q: str | None = None) -> dict:
 
 
 @app.post("/setup/validate/openai")
-def validate_openai(api_key: str, base_url: str | None = None, model: str | None = None) -> dict:
+async def validate_openai(api_key: str, base_url: str | None = None, model: str | None = None) -> dict:
     try:
         from langchain_openai import OpenAIEmbeddings
 
@@ -108,7 +204,7 @@ def validate_openai(api_key: str, base_url: str | None = None, model: str | None
 
 
 @app.post("/setup/save")
-def setup_save(gitlab_base_url: str, gitlab_token: str, llm_api_key: str | None = None, llm_base_url: str | None = None, llm_model: str | None = None, embedding_api_key: str | None = None, embedding_base_url: str | None = None, embedding_model: str | None = None) -> dict:
+async def setup_save(gitlab_base_url: str, gitlab_token: str, llm_api_key: str | None = None, llm_base_url: str | None = None, llm_model: str | None = None, embedding_api_key: str | None = None, embedding_base_url: str | None = None, embedding_model: str | None = None) -> dict:
     # Persist to .env, overwrite or append keys
     import os
     from pathlib import Path
@@ -145,28 +241,90 @@ def setup_save(gitlab_base_url: str, gitlab_token: str, llm_api_key: str | None
     os.environ.update(keys)
     from .config import settings as runtime_settings
     runtime_settings.__init__()  # reload from env
+    from .embedding_pipeline import reset_pipeline
+    from .langchain_chain import reset_chat_model
+    reset_pipeline()
+    reset_chat_model()
     return {"ok": True}
 
 
+def _cli_projects(parser: argparse.ArgumentParser, args: argparse.Namespace) -> List[str]:
+    # --project may repeat or carry a comma-separated list; blank names are dropped
+    projects = [p.strip() for value in args.project for p in value.split(",")]
+    group = (args.group or "").strip()
+    if group:
+        try:
+            projects.extend(p.get("path_with_namespace", "") for p in GitLabAPI().list_group_projects(group))
+        except httpx.HTTPError as e:
+            parser.exit(1, f"{args.cmd}: cannot list group {group}: {e}\n")
+    return [p for p in dict.fromkeys(projects) if p]
+
+
 def main_cli() -> None:
     parser = argparse.ArgumentParser(prog="src")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
     ask_p = sub.add_parser("ask", help="Ask a question")
-    ask_p.add_argument("--project", required=True)
+    ask_p.add_argument("--project", action="append", default=[], help="Repeat to search several projects")
+    ask_p.add_argument("--group", help="Search every project of a GitLab group")
+    ask_p.add_argument("--stream", action="store_true", help="Print the answer as it is generated")
     ask_p.add_argument("question", nargs="+")
 
-    build_p = sub.add_parser("rebuild", help="Rebuild index for a project")
-    build_p.add_argument("--project", required=True)
+    build_p = sub.add_parser("rebuild", help="Rebuild indexes, several projects at once")
+    build_p.add_argument("--project", action="append", default=[], help="Repeat to rebuild several projects")
+    build_p.add_argument("--group", help="Rebuild every project of a GitLab group")
+    build_p.add_argument("--full", action="store_true", help="Ignore the indexed commit and rebuild from scratch")
 
     args = parser.parse_args()
     if args.cmd == "ask":
         q = " ".join(args.question)
-        out = answer_question(args.project, q)
+        group = (args.group or "").strip()
+        if args.stream and group:
+            parser.error("ask: --stream supports a single --project")
+        projects = _cli_projects(parser, args)
+        if not projects:
+            parser.error("ask: --project or a non-empty --group is required")
+        if args.stream and len(projects) != 1:
+            parser.error("ask: --stream supports a single --project")
+        if args.stream:
+            for ev in stream_answer_events(projects[0], q):
+                if ev["event"] == "token":
+                    sys.stdout.write(ev["data"])
+                    sys.stdout.flush()
+                elif ev["event"] == "error":
+                    print(f"\nError: {ev['data']['error']}", file=sys.stderr)
+                elif ev["event"] == "done":
+                    print()
+                    print(f"(ttfb {ev['data']['ttfb_ms']} ms, total {ev['data']['total_ms']} ms)", file=sys.stderr)
+            return
+        if len(projects) == 1 and not group:
+            out = answer_question(projects[0], q)
+        else:
+            out = answer_question_multi(projects, q)
         print(out["answer"])  # text IO only
+        if out.get("usage"):
+            u = out["usage"]
+            print(f"(prompt {u['prompt_tokens']} tokens, retrieval {u['retrieval_ms']} ms, llm {u['llm_ms']} ms)", file=sys.stderr)
     elif args.cmd == "rebuild":
-        rebuild_index_for_project(args.project)
-        print("OK")
+        projects = _cli_projects(parser, args)
+        if not projects:
+            parser.error("rebuild: --project or a non-empty --group is required")
+        jobs = [scheduler.submit(p, full=args.full) for p in projects]
+        seen: Dict[str, str] = {}
+        while not scheduler.wait(jobs, timeout=1.0):
+            for job in jobs:
+                if job.status == "running" and seen.get(job.id) != job.stage:
+                    seen[job.id] = job.stage
+                    print(f"{job.project_id}: {job.stage} {job.progress}", file=sys.stderr)
+        failed = 0
+        for job in jobs:
+            if job.status == "done" and job.result is not None:
+                print(f"{job.project_id}: OK ({job.result['mode']}, {job.result['chunks']} chunks)")
+            else:
+                failed += 1
+                print(f"{job.project_id}: FAILED ({job.error})")
+        if failed:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
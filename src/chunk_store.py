@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import fcntl
+import io
+import json
+import mmap
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+# Two sidecar files per index:
+#   <name>.chunks.bin  concatenated UTF-8 JSON records {"path", "chunk_id", "text"}
+#   <name>.chunks.idx  little-endian uint64 (offset, length) pair per record
+# Lookup by id is two array reads plus one small json.loads over an mmap slice.
+# Generations made by incremental updates share one blob (hard links, append-only) and
+# each keep their own offsets table, so an update writes only its new records. A writer
+# holds an exclusive flock on the shared blob until release(), so appends never interleave,
+# and rollback() cuts the blob back to where that writer started.
+_IDX_DTYPE = np.dtype("<u8")
+
+
+def _mmap_file(path: Path) -> Optional[mmap.mmap]:
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ChunkStore:
+    def __init__(self, index_path: str | Path) -> None:
+        base = Path(index_path)
+        self.bin_path = base.with_suffix(".chunks.bin")
+        self.idx_path = base.with_suffix(".chunks.idx")
+        self._bin: Optional[mmap.mmap] = None
+        self._idx: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._writer: Optional[int] = None
+        self._base_size: Optional[int] = None
+
+    def exists(self) -> bool:
+        return self.bin_path.exists() and self.idx_path.exists()
+
+    def _encode(self, records: Iterable[Dict[str, Any]], bin_f, idx_f, start: int) -> int:
+        offset = start
+        count = 0
+        for r in records:
+            data = json.dumps(
+                {"path": r.get("path", ""), "chunk_id": r.get("chunk_id", ""), "text": r.get("text", "")},
+                ensure_ascii=False,
+            ).encode("utf-8")
+            bin_f.write(data)
+            idx_f.write(np.array([offset, len(data)], dtype=_IDX_DTYPE).tobytes())
+            offset += len(data)
+            count += 1
+        return count
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> int:
+        self.close()
+        self.bin_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".tmp{os.getpid()}"
+        bin_tmp = self.bin_path.with_name(self.bin_path.name + suffix)
+        idx_tmp = self.idx_path.with_name(self.idx_path.name + suffix)
+        with bin_tmp.open("wb") as bin_f, idx_tmp.open("wb") as idx_f:
+            count = self._encode(records, bin_f, idx_f, 0)
+        os.replace(bin_tmp, self.bin_path)
+        os.replace(idx_tmp, self.idx_path)
+        return count
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> int:
+        # Returns the id of the first appended record. The blob is extended before the
+        # offsets table, so a concurrent reader never sees an offset past its blob.
+        if not self.exists():
+            self.write([])
+        self.close()
+        start_id = self.idx_path.stat().st_size // (2 * _IDX_DTYPE.itemsize)
+        idx_buf = io.BytesIO()
+        with self.bin_path.open("ab") as bin_f:
+            self._encode(records, bin_f, idx_buf, bin_f.tell())
+        with self.idx_path.open("ab") as idx_f:
+            idx_f.write(idx_buf.getvalue())
+        return start_id
+
+    def link_from(self, other: "ChunkStore") -> None:
+        # Start from `other`'s records without copying them. Appending to the shared blob never
+        # touches bytes an earlier offsets table points at, and readers map it at a fixed size.
+        # When another writer holds the blob (e.g. the CLI and the server updating the same
+        # index), this one works on a private copy instead of waiting.
+        self.close()
+        try:
+            os.link(other.bin_path, self.bin_path)
+        except OSError:
+            # e.g. a filesystem without hard links
+            shutil.copyfile(other.bin_path, self.bin_path)
+        else:
+            if not self._lock_blob():
+                tmp = self.bin_path.with_name(self.bin_path.name + f".tmp{os.getpid()}")
+                shutil.copyfile(other.bin_path, tmp)
+                os.replace(tmp, self.bin_path)
+        shutil.copyfile(other.idx_path, self.idx_path)
+        self._base_size = self.bin_path.stat().st_size
+
+    def _lock_blob(self) -> bool:
+        fd = os.open(self.bin_path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._writer = fd
+        return True
+
+    def release(self) -> None:
+        # Closing the descriptor drops the flock
+        if self._writer is not None:
+            os.close(self._writer)
+            self._writer = None
+        self._base_size = None
+
+    def rollback(self) -> None:
+        # Undo this writer's appends to a blob shared with published generations. Only valid
+        # before its own generation is published, which is what the lock guarantees.
+        self.close()
+        if self._base_size is not None and self.bin_path.exists():
+            os.truncate(self.bin_path, self._base_size)
+        self.release()
+
+    def _open(self) -> None:
+        if self._offsets is not None:
+            return
+        with self._lock:
+            if self._offsets is not None:
+                return
+            if not self.exists():
+                # not cached: the store may be written later (e.g. legacy migration)
+                return
+            self._bin = _mmap_file(self.bin_path)
+            self._idx = _mmap_file(self.idx_path)
+            if self._idx is None:
+                self._offsets = np.zeros((0, 2), dtype=_IDX_DTYPE)
+            else:
+                self._offsets = np.frombuffer(self._idx, dtype=_IDX_DTYPE).reshape(-1, 2)
+
+    def open(self) -> "ChunkStore":
+        # Map the files now: a reader then keeps working after they are unlinked
+        self._open()
+        return self
+
+    def close(self) -> None:
+        self._offsets = None
+        for m in (self._bin, self._idx):
+            if m is not None:
+                try:
+                    m.close()
+                except BufferError:
+                    # an exported numpy view is still alive; let GC release the map
+                    pass
+        self._bin = None
+        self._idx = None
+
+    def __len__(self) -> int:
+        self._open()
+        return 0 if self._offsets is None else len(self._offsets)
+
+    def get(self, chunk_id: int) -> Optional[Dict[str, str]]:
+        self._open()
+        offsets, blob = self._offsets, self._bin
+        if offsets is None or blob is None or not 0 <= chunk_id < len(offsets):
+            return None
+        offset, length = (int(v) for v in offsets[chunk_id])
+        try:
+            return json.loads(blob[offset : offset + length].decode("utf-8"))
+        except Exception:
+            return None
+
+    def get_text(self, chunk_id: int) -> str:
+        rec = self.get(chunk_id)
+        return rec.get("text", "") if rec else ""
+
+    def migrate_from_json(self, meta_path: Path) -> bool:
+        # Convert a legacy monolithic <name>.meta.json sidecar once, then drop it
+        if self.exists() or not meta_path.exists():
+            return False
+        with meta_path.open("r", encoding="utf-8") as f:
+            meta: List[Dict[str, Any]] = json.load(f)
+        self.write(meta)
+        try:
+            meta_path.unlink()
+        except FileNotFoundError:
+            pass
+        return True
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import ast
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+from .utils import setup_logger
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+
+# Short word pieces, single punctuation and indentation runs: close to what a BPE
+# vocabulary does to code. Nothing spans a newline, so per-line counts add up exactly
+# (as they do for tiktoken, whose pre-tokenizer splits at newlines as well).
+_APPROX_RE = re.compile(r"\w{1,4}|[^\w\s]|^[ \t]+", re.MULTILINE)
+
+
+class Tokenizer:
+    name = "approx"
+
+    def count(self, text: str) -> int:
+        return len(_APPROX_RE.findall(text))
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        starts = [m.start() for m in _APPROX_RE.finditer(text)][::max_tokens]
+        starts[:1] = [0]
+        return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+class TiktokenTokenizer(Tokenizer):
+    def __init__(self, encoding) -> None:
+        self.name = encoding.name
+        self._enc = encoding
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode_ordinary(text))
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        ids = self._enc.encode_ordinary(text)
+        return [self._enc.decode(ids[i : i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+
+@lru_cache(maxsize=8)
+def get_tokenizer(name: str = "", model: str = "") -> Tokenizer:
+    # "" -> the encoding of `model` (EMBEDDING_MODEL by default; cl100k_base if tiktoken
+    # does not know it); "approx" or a tokenizer that cannot be loaded (no tiktoken, BPE
+    # file not downloadable) -> the regex estimate
+    if name == "approx":
+        return Tokenizer()
+    model = model or settings.embedding_model
+    try:
+        import tiktoken
+
+        if name:
+            return TiktokenTokenizer(tiktoken.get_encoding(name))
+        try:
+            return TiktokenTokenizer(tiktoken.encoding_for_model(model))
+        except KeyError:
+            return TiktokenTokenizer(tiktoken.get_encoding("cl100k_base"))
+    except Exception as e:
+        logger.warning("Tokenizer %r unavailable (%s); estimating token counts", name or model, e)
+        return Tokenizer()
+
+
+# A splitter returns, per line, the preference for starting a chunk there: 0 is the best
+# place (a top-level definition after a blank line), higher is worse, NO_CUT never.
+NO_CUT = 1 << 30
+Splitter = Callable[[List[str]], Optional[List[int]]]
+
+_COMMENT_PREFIXES = ("#", "//", "/*", "*", "@")
+
+
+def _blank_bonus(lines: List[str], i: int) -> int:
+    return 0 if i == 0 or not lines[i - 1].strip() else 1
+
+
+def _attach_comments(lines: List[str], i: int) -> int:
+    # Comments and decorators directly above a definition start its chunk
+    while i > 0 and lines[i - 1].lstrip().startswith(_COMMENT_PREFIXES):
+        i -= 1
+    return i
+
+
+_BODY_FIELDS = ("body", "orelse", "finalbody", "handlers")
+
+
+def python_levels(lines: List[str]) -> Optional[List[int]]:
+    try:
+        tree = ast.parse("".join(lines))
+    except (SyntaxError, ValueError):
+        return None
+    levels = [NO_CUT] * len(lines)
+    stack: List[Tuple[ast.AST, int]] = [(node, 0) for node in tree.body]
+    while stack:
+        node, depth = stack.pop()
+        first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]) - 1
+        first = _attach_comments(lines, first)
+        levels[first] = min(levels[first], 2 * depth + _blank_bonus(lines, first))
+        if node.end_lineno == node.lineno:
+            continue
+        # Only statement lists can hold a chunk boundary; expressions are never walked
+        for field in _BODY_FIELDS:
+            stack.extend((child, depth + 1) for child in getattr(node, field, ()))
+    return levels
+
+
+# Strings and comments, so braces inside them do not count
+_BRACE_NOISE_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*|/\*.*?\*/')
+_CONTINUATION_ENDS = (",", "(", "[", "=", "+", "-", "*", "/", "&&", "||", ".", "?", ":", "\\")
+_CLOSERS = ("}", ")", "]", ".")
+
+
+def brace_levels(lines: List[str]) -> List[int]:
+    # JS/TS/Go/Java & co: a line can start a chunk at its brace depth unless it closes a
+    # block, continues the previous line, or follows a comment/annotation it belongs to
+    levels = [NO_CUT] * len(lines)
+    depth = 0
+    prev = ""
+    for i, line in enumerate(lines):
+        code = _BRACE_NOISE_RE.sub("", line).strip()
+        text = line.strip()
+        if text and not text.startswith(_CLOSERS) and not (prev and prev.endswith(_CONTINUATION_ENDS)):
+            if i == 0 or not lines[i - 1].lstrip().startswith(_COMMENT_PREFIXES):
+                levels[i] = 2 * max(depth, 0) + _blank_bonus(lines, i)
+        depth += code.count("{") - code.count("}")
+        if text:
+            prev = code
+    return levels
+
+
+def _indent(line: str) -> int:
+    ws = line[: len(line) - len(line.lstrip(" \t"))]
+    return len(ws) + 3 * ws.count("\t")  # a tab counts as four columns
+
+
+def indent_levels(lines: List[str]) -> List[int]:
+    # Everything else (Ruby, YAML, prose, Python that does not parse): indentation depth,
+    # preferring lines after a blank one, so paragraphs and top-level blocks stay whole
+    indents = [_indent(line) for line in lines if line.strip()]
+    unit = min((n for n in indents if n), default=4)
+    levels = [NO_CUT] * len(lines)
+    prev_indent = 0
+    for i, line in enumerate(lines):
+        text = line.strip()
+        if not text:
+            continue
+        indent = _indent(line)
+        if indent <= prev_indent or _blank_bonus(lines, i) == 0:
+            if not text.startswith(_CLOSERS) and text != "end":
+                levels[i] = 2 * (indent // unit) + _blank_bonus(lines, i)
+        prev_indent = indent
+    return levels
+
+
+SPLITTERS: Dict[str, Splitter] = {".py": python_levels}
+for _ext in (".js", ".jsx", ".ts", ".tsx", ".go", ".java", ".kt", ".scala", ".cs", ".c", ".h", ".cpp", ".rs", ".swift", ".php"):
+    SPLITTERS[_ext] = brace_levels
+
+
+def register_splitter(extensions: Iterable[str], splitter: Splitter) -> None:
+    for ext in extensions:
+        SPLITTERS[ext.lower()] = splitter
+
+
+def _splitter_for(path: str) -> Splitter:
+    name = path.rsplit("/", 1)[-1].lower()
+    ext = name[name.rfind(".") :] if "." in name else ""
+    return SPLITTERS.get(ext, indent_levels)
+
+
+class _Packer:
+    def __init__(self, lines: List[str], levels: List[int], tokenizer: Tokenizer, max_tokens: int) -> None:
+        self.levels = levels
+        self.max_tokens = max_tokens
+        self.prefix = [0]
+        for line in lines:
+            self.prefix.append(self.prefix[-1] + tokenizer.count(line))
+        self.top = max((lv for lv in levels if lv != NO_CUT), default=0)
+
+    def tokens(self, start: int, end: int) -> int:
+        return self.prefix[end] - self.prefix[start]
+
+    def pack(self, start: int, end: int, level: int = 0) -> List[Tuple[int, int]]:
+        # Cut at the best boundaries first; greedily merge neighbours that fit together and
+        # only descend a level inside a piece that is still too big on its own
+        if self.tokens(start, end) <= self.max_tokens or end - start == 1:
+            return [(start, end)]
+        if level > self.top:
+            cuts = list(range(start + 1, end))
+        else:
+            cuts = [i for i in range(start + 1, end) if self.levels[i] <= level]
+            if not cuts:
+                return self.pack(start, end, level + 1)
+        spans: List[Tuple[int, int]] = []
+        cur_start = cur_end = start
+        for a, b in zip([start] + cuts, cuts + [end]):
+            if self.tokens(a, b) > self.max_tokens:
+                if cur_end > cur_start:
+                    spans.append((cur_start, cur_end))
+                spans.extend(self.pack(a, b, level + 1))
+                cur_start = cur_end = b
+            elif self.tokens(cur_start, b) > self.max_tokens:
+                spans.append((cur_start, cur_end))
+                cur_start, cur_end = a, b
+            else:
+                cur_end = b
+        if cur_end > cur_start:
+            spans.append((cur_start, cur_end))
+        return spans
+
+    def merge(self, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        # The last piece of a split definition is often tiny: let it share the next chunk
+        out = spans[:1]
+        for start, end in spans[1:]:
+            if self.tokens(out[-1][0], end) <= self.max_tokens:
+                out[-1] = (out[-1][0], end)
+            else:
+                out.append((start, end))
+        return out
+
+    def overlap(self, spans: List[Tuple[int, int]], overlap_tokens: int, max_tokens: int) -> List[Tuple[int, int]]:
+        # Each chunk also starts with the tail lines of the previous one; spans were packed
+        # to max_tokens - overlap_tokens, so there is room for them
+        out = spans[:1]
+        for (prev_start, _), (start, end) in zip(spans, spans[1:]):
+            s = start
+            while s > prev_start and self.tokens(s - 1, start) <= overlap_tokens and self.tokens(s - 1, end) <= max_tokens:
+                s -= 1
+            out.append((s, end))
+        return out
+
+
+def _header_end(lines: List[str]) -> int:
+    # Leading comment block (license, generated-file banner): chunked on its own so the
+    # copies at the top of many files are identical chunks
+    i = 0
+    while i < len(lines) and (not lines[i].strip() or lines[i].lstrip().startswith(_COMMENT_PREFIXES[:4])):
+        i += 1
+    return i if i < len(lines) else 0
+
+
+def chunk_source(
+    text: str,
+    path: str = "",
+    max_tokens: int = 1000,
+    overlap_tokens: int = 0,
+    tokenizer: Optional[Tokenizer] = None,
+) -> List[str]:
+    # A token is at least one byte, so short files are never counted
+    if len(text.encode("utf-8")) <= max_tokens:
+        return [text] if text.strip() else []
+    tokenizer = tokenizer or get_tokenizer(settings.chunk_tokenizer)
+    lines = text.splitlines(keepends=True)
+    splitter = _splitter_for(path)
+    levels = splitter(lines) or indent_levels(lines)
+    packer = _Packer(lines, levels, tokenizer, max(1, max_tokens - max(0, overlap_tokens)))
+    # Source files only: in Markdown a leading "#" is a heading, not a comment
+    head = _header_end(lines) if splitter is not indent_levels else 0
+    spans = packer.merge(packer.pack(0, head)) if head else []
+    spans += packer.merge(packer.pack(head, len(lines)))
+    if overlap_tokens > 0:
+        spans = packer.overlap(spans, overlap_tokens, max_tokens)
+    chunks: List[str] = []
+    for start, end in spans:
+        chunk = "".join(lines[start:end])
+        if not chunk.strip():
+            continue
+        if packer.tokens(start, end) > max_tokens:
+            chunks.extend(tokenizer.split(chunk, max_tokens))  # one very long line
+        else:
+            chunks.append(chunk)
+    return chunks
@@ -5,6 +5,20 @@ from pydantic import Field
 class Settings(BaseSettings):
     gitlab_base_url: str = Field(default="https://gitlab.com/api/v4", alias="GITLAB_BASE_URL")
     gitlab_token: str = Field(default="", alias="GITLAB_TOKEN")
+    # Concurrent file fetches per rebuild and HTTP connections per GitLab host
+    gitlab_fetch_workers: int = Field(default=8, alias="GITLAB_FETCH_WORKERS")
+    gitlab_max_connections: int = Field(default=16, alias="GITLAB_MAX_CONNECTIONS")
+    # Negotiate HTTP/2 with GitLab when the h2 package is installed
+    gitlab_http2: bool = Field(default=True, alias="GITLAB_HTTP2")
+    # Concurrent page requests when listing trees / projects with known X-Total-Pages
+    gitlab_page_workers: int = Field(default=8, alias="GITLAB_PAGE_WORKERS")
+    # Full rebuilds with at least this many selected files download one repository archive
+    # instead of one request per file (0 disables archive mode)
+    archive_ingest_threshold: int = Field(default=500, alias="ARCHIVE_INGEST_THRESHOLD")
+    # Longest wait for the next bytes of the archive; a stalled download falls back to per-file
+    archive_read_timeout_seconds: float = Field(default=60.0, alias="ARCHIVE_READ_TIMEOUT_SECONDS")
+    # Pause requests until RateLimit-Reset once RateLimit-Remaining drops to this value
+    gitlab_rate_limit_low_watermark: int = Field(default=5, alias="GITLAB_RATE_LIMIT_LOW_WATERMARK")
 
     # Chat LLM (OpenAI-compatible, e.g. vLLM)
     llm_api_key: str = Field(default="", alias="LLM_API_KEY")
@@ -16,12 +30,91 @@ class Settings(BaseSettings):
     embedding_api_key: str = Field(default="", alias="EMBEDDING_API_KEY")
     embedding_base_url: str | None = Field(default=None, alias="EMBEDDING_BASE_URL")
     embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")
+    # Content-addressed cache of chunk embeddings; defaults to {CACHE_DIR}/embeddings.sqlite
+    embedding_cache_enabled: bool = Field(default=True, alias="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_path: str | None = Field(default=None, alias="EMBEDDING_CACHE_PATH")
+    # Embedding request scheduling: inputs per request, concurrent requests, tokens/minute (0 = unlimited)
+    embedding_batch_size: int = Field(default=128, alias="EMBEDDING_BATCH_SIZE")
+    embedding_max_in_flight: int = Field(default=4, alias="EMBEDDING_MAX_IN_FLIGHT")
+    embedding_tpm_limit: int = Field(default=0, alias="EMBEDDING_TPM_LIMIT")
+    embedding_max_retries: int = Field(default=5, alias="EMBEDDING_MAX_RETRIES")
+    # Chunks per ingest step (embed -> index add -> chunk store append); bounds rebuild memory
+    ingest_batch_size: int = Field(default=512, alias="INGEST_BATCH_SIZE")
+    # Chunk size in tokens of CHUNK_TOKENIZER ("" = the embedding model's encoding, "approx" = estimate),
+    # tokens repeated from the previous chunk, and skipping chunks already seen in the same file
+    chunk_max_tokens: int = Field(default=1000, alias="CHUNK_MAX_TOKENS")
+    chunk_overlap_tokens: int = Field(default=0, alias="CHUNK_OVERLAP_TOKENS")
+    chunk_tokenizer: str = Field(default="", alias="CHUNK_TOKENIZER")
+    chunk_dedupe: bool = Field(default=False, alias="CHUNK_DEDUPE")
+    # Retrieved chunks offered to the context assembler, the prompt context budget in tokens and
+    # the MMR trade-off between relevance (1.0) and diversity (0.0)
+    context_candidates: int = Field(default=12, alias="CONTEXT_CANDIDATES")
+    context_max_tokens: int = Field(default=3000, alias="CONTEXT_MAX_TOKENS")
+    context_mmr_lambda: float = Field(default=0.7, alias="CONTEXT_MMR_LAMBDA")
 
     cache_dir: str = Field(default="./data", alias="CACHE_DIR")
     cache_ttl_seconds: int = Field(default=86400, alias="CACHE_TTL_SECONDS")
+    # GitLab response cache budget (0 = unlimited), eviction policy (lru | lfu) and expiry sweep period
+    cache_max_bytes: int = Field(default=2 * 1024**3, alias="CACHE_MAX_BYTES")
+    cache_max_entries: int = Field(default=500_000, alias="CACHE_MAX_ENTRIES")
+    cache_eviction_policy: str = Field(default="lru", alias="CACHE_EVICTION_POLICY")
+    cache_sweep_interval_seconds: int = Field(default=600, alias="CACHE_SWEEP_INTERVAL_SECONDS")
+    cache_compress_min_bytes: int = Field(default=1024, alias="CACHE_COMPRESS_MIN_BYTES")
+    # Trees and file bodies are pinned to commit/blob SHAs and never go stale; only the
+    # ref -> commit lookup expires
+    cache_ref_ttl_seconds: int = Field(default=30, alias="CACHE_REF_TTL_SECONDS")
+    cache_immutable_ttl_seconds: int = Field(default=30 * 86400, alias="CACHE_IMMUTABLE_TTL_SECONDS")
+    # Shared Redis tier for multi-worker deployments: per-process L1 in front, disk cache
+    # as fallback while Redis is unreachable
     redis_url: str | None = Field(default=None, alias="REDIS_URL")
+    redis_timeout_seconds: float = Field(default=0.5, alias="REDIS_TIMEOUT_SECONDS")
+    cache_l1_max_entries: int = Field(default=4096, alias="CACHE_L1_MAX_ENTRIES")
+    cache_l1_ttl_seconds: int = Field(default=60, alias="CACHE_L1_TTL_SECONDS")
 
     index_dir: str = Field(default="./indices", alias="INDEX_DIR")
+    # Index generations kept on disk per project (the current one included)
+    index_keep_generations: int = Field(default=2, alias="INDEX_KEEP_GENERATIONS")
+    # Vector index type: auto | flat | hnsw | ivf | ivfpq; INDEX_TYPES overrides per project
+    # as CSV "group/repo=hnsw,group/other=ivfpq"
+    index_type: str = Field(default="auto", alias="INDEX_TYPE")
+    index_types: str = Field(default="", alias="INDEX_TYPES")
+    # Vector storage of flat/IVF indexes: float32 | sq8 | fp16 (new builds only). With
+    # INDEX_MMAP generations are opened memory-mapped and shared through the page cache.
+    index_storage: str = Field(default="float32", alias="INDEX_STORAGE")
+    index_mmap: bool = Field(default=True, alias="INDEX_MMAP")
+    # auto: flat below ANN_MIN_VECTORS, IVF below IVFPQ_MIN_VECTORS, IVF-PQ above
+    ann_min_vectors: int = Field(default=50_000, alias="ANN_MIN_VECTORS")
+    ivfpq_min_vectors: int = Field(default=1_000_000, alias="IVFPQ_MIN_VECTORS")
+    hnsw_m: int = Field(default=32, alias="HNSW_M")
+    hnsw_ef_construction: int = Field(default=80, alias="HNSW_EF_CONSTRUCTION")
+    # Query-time knobs
+    faiss_nprobe: int = Field(default=16, alias="FAISS_NPROBE")
+    faiss_ef_search: int = Field(default=64, alias="FAISS_EF_SEARCH")
+    # Hybrid retrieval: BM25 over the same chunks fused with vector hits by reciprocal rank
+    # (score 1 / (RRF_K + rank)); identifier-like questions are answered from BM25 alone
+    retrieval_mode: str = Field(default="hybrid", alias="RETRIEVAL_MODE")  # hybrid | vector | lexical
+    rrf_k: int = Field(default=60, alias="RRF_K")
+    bm25_k1: float = Field(default=1.2, alias="BM25_K1")
+    bm25_b: float = Field(default=0.75, alias="BM25_B")
+    # Query path: LRU of question embeddings; concurrent questions arriving within the
+    # window share one embeddings request and one batched index search (0 disables batching)
+    query_embedding_cache_size: int = Field(default=4096, alias="QUERY_EMBEDDING_CACHE_SIZE")
+    query_embedding_cache_ttl_seconds: int = Field(default=3600, alias="QUERY_EMBEDDING_CACHE_TTL_SECONDS")
+    query_batch_window_ms: float = Field(default=3.0, alias="QUERY_BATCH_WINDOW_MS")
+    query_batch_max_size: int = Field(default=64, alias="QUERY_BATCH_MAX_SIZE")
+    # Parallel per-project searches for cross-project questions
+    federated_max_workers: int = Field(default=8, alias="FEDERATED_MAX_WORKERS")
+    # Answer cache in front of /ask: exact question or query-embedding cosine >= similarity
+    answer_cache_enabled: bool = Field(default=True, alias="ANSWER_CACHE_ENABLED")
+    answer_cache_max_entries: int = Field(default=1024, alias="ANSWER_CACHE_MAX_ENTRIES")
+    answer_cache_ttl_seconds: int = Field(default=3600, alias="ANSWER_CACHE_TTL_SECONDS")
+    answer_cache_similarity: float = Field(default=0.97, alias="ANSWER_CACHE_SIMILARITY")
+    # Resident index registry (per-process LRU of loaded FAISS indexes)
+    index_cache_max_entries: int = Field(default=16, alias="INDEX_CACHE_MAX_ENTRIES")
+    index_cache_max_bytes: int = Field(default=2 * 1024**3, alias="INDEX_CACHE_MAX_BYTES")
+
+    # Background rebuild jobs running at once (rebuilds of the same project are coalesced)
+    rebuild_workers: int = Field(default=2, alias="REBUILD_WORKERS")
 
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
 
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .chunking import Tokenizer, get_tokenizer
+from .config import settings
+from .lexical_index import text_hashes
+
+
+# Hashed bag-of-terms width used to compare candidate chunks with each other
+_DIM = 1 << 12
+
+
+def context_tokenizer() -> Tokenizer:
+    return get_tokenizer(settings.chunk_tokenizer, model=settings.llm_model)
+
+
+def _join(a: str, b: str) -> str:
+    # b continues a; drop the lines they share (CHUNK_OVERLAP_TOKENS repeats a's tail)
+    a_lines, b_lines = a.splitlines(keepends=True), b.splitlines(keepends=True)
+    for k in range(min(len(a_lines), len(b_lines), 200), 0, -1):
+        if a_lines[-k:] == b_lines[:k]:
+            return a + "".join(b_lines[k:])
+    return a + ("" if a.endswith("\n") else "\n") + b
+
+
+def merge_neighbours(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Hits from one file with consecutive chunk ids become one block scored by its best hit;
+    # a block whose text is already inside another one is dropped. When hits carry their
+    # position in the file ("pos"), that must be consecutive too: a deduplicated chunk
+    # between two stored ones is a gap in the text, not in the ids.
+    by_file: Dict[tuple, List[Dict[str, Any]]] = {}
+    for h in hits:
+        by_file.setdefault((h.get("project"), h["path"]), []).append(h)
+    blocks: List[Dict[str, Any]] = []
+    for group in by_file.values():
+        group.sort(key=lambda h: h.get("id", 0))
+        for h in group:
+            last = blocks[-1] if blocks else None
+            if (
+                last is not None
+                and "id" in h
+                and (last.get("project"), last["path"]) == (h.get("project"), h["path"])
+                and h["id"] - last["ids"][-1] <= 1
+                and ("pos" not in h or "pos" not in last or h["pos"] - last["pos"] == h["id"] - last["ids"][-1])
+            ):
+                if h["id"] != last["ids"][-1]:
+                    last["text"] = _join(last["text"], h["text"])
+                    last["ids"].append(h["id"])
+                    # The block's "pos" tracks its last chunk
+                    if "pos" in h:
+                        last["pos"] = h["pos"]
+                last["score"] = max(last["score"], h["score"])
+            else:
+                blocks.append({**h, "ids": [h.get("id", -1)]})
+    blocks.sort(key=lambda b: len(b["text"]), reverse=True)
+    kept: List[Dict[str, Any]] = []
+    for b in blocks:
+        if not any(b["text"].strip() in k["text"] for k in kept):
+            kept.append(b)
+    return kept
+
+
+def _term_matrix(texts: List[str]) -> np.ndarray:
+    cols = [np.asarray(text_hashes(t), dtype="int64") % _DIM for t in texts]
+    rows = np.repeat(np.arange(len(texts)), [len(c) for c in cols])
+    mat = np.zeros((len(texts), _DIM), dtype="float32")
+    np.add.at(mat, (rows, np.concatenate(cols) if cols else rows), 1.0)
+    return mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-9)
+
+
+def mmr_order(scores: np.ndarray, sims: np.ndarray, lam: float) -> List[int]:
+    # Maximal marginal relevance: next is argmax lam * relevance - (1 - lam) * similarity
+    # to the closest block already taken; relevance is the retrieval score over the best one
+    n = len(scores)
+    top = float(scores.max())
+    rel = np.clip(scores / top, 0, 1) if top > 0 else np.ones(n, dtype="float32")
+    taken = np.zeros(n, dtype=bool)
+    closest = np.zeros(n, dtype="float32")
+    order: List[int] = []
+    for _ in range(n):
+        gain = np.where(taken, -np.inf, lam * rel - (1 - lam) * closest)
+        best = int(np.argmax(gain))
+        order.append(best)
+        taken[best] = True
+        closest = np.maximum(closest, sims[best])
+    return order
+
+
+def assemble_context(
+    hits: List[Dict[str, Any]],
+    max_tokens: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+    tokenizer: Optional[Tokenizer] = None,
+) -> List[Dict[str, Any]]:
+    # Retrieved hits -> prompt blocks: neighbours merged, picked in MMR order while they fit
+    # CONTEXT_MAX_TOKENS, returned best score first. Each block gets a "tokens" count.
+    budget = settings.context_max_tokens if max_tokens is None else max_tokens
+    lam = settings.context_mmr_lambda if mmr_lambda is None else mmr_lambda
+    tokenizer = tokenizer or context_tokenizer()
+    blocks = merge_neighbours(hits)
+    if not blocks:
+        return []
+    mat = _term_matrix([b["text"] for b in blocks])
+    order = mmr_order(np.array([b["score"] for b in blocks], dtype="float32"), mat @ mat.T, lam)
+    picked: List[Dict[str, Any]] = []
+    used = 0
+    for i in order:
+        block = blocks[i]
+        tokens = tokenizer.count(block["text"])
+        if used + tokens > budget:
+            if picked:
+                continue
+            # Even the best block alone is over budget: keep its head
+            block = {**block, "text": tokenizer.split(block["text"], budget)[0]}
+            tokens = tokenizer.count(block["text"])
+        picked.append({**block, "tokens": tokens})
+        used += tokens
+    picked.sort(key=lambda b: b["score"], reverse=True)
+    return picked
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    dim INTEGER NOT NULL,
+    vec BLOB NOT NULL,
+    PRIMARY KEY (model, digest)
+) WITHOUT ROWID
+"""
+
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds
+_LOOKUP_BATCH = 500
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    requested: int = 0
+    hits: int = 0
+    misses: int = 0
+    bytes_saved: int = 0  # UTF-8 bytes of chunk text not sent to the embeddings API
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requested if self.requested else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 4)}
+
+
+# Persistent (model, sha256(text)) -> float32 vector store in a single SQLite file
+class EmbeddingCache:
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, digests: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        keys = list(dict.fromkeys(digests))
+        found: Dict[bytes, np.ndarray] = {}
+        conn = self._conn()
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[start : start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT digest, dim, vec FROM embeddings WHERE model = ? AND digest IN ({placeholders})",
+                (model, *batch),
+            )
+            for digest, dim, vec in rows:
+                arr = np.frombuffer(vec, dtype="<f4")
+                if arr.shape[0] == dim:
+                    found[bytes(digest)] = arr
+        return found
+
+    def put_many(self, model: str, items: Iterable[Tuple[bytes, np.ndarray]]) -> None:
+        rows = []
+        for digest, vec in items:
+            arr = np.asarray(vec, dtype="<f4")
+            rows.append((model, digest, int(arr.shape[0]), arr.tobytes()))
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, dim, vec) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def __len__(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+
+
+def lookup(
+    cache: EmbeddingCache,
+    model: str,
+    texts: List[str],
+    stats: Optional[EmbeddingCacheStats] = None,
+) -> Tuple[List[Optional[np.ndarray]], List[int], List[bytes]]:
+    # Returns (vectors with None for misses, indexes of unique misses, digests)
+    digests = [text_digest(t) for t in texts]
+    found = cache.get_many(model, digests)
+    vectors: List[Optional[np.ndarray]] = []
+    missing: List[int] = []
+    seen: set[bytes] = set()
+    for i, d in enumerate(digests):
+        vec = found.get(d)
+        vectors.append(vec)
+        if vec is None:
+            if d not in seen:
+                missing.append(i)
+                seen.add(d)
+        elif stats is not None:
+            stats.hits += 1
+            stats.bytes_saved += len(texts[i].encode("utf-8"))
+    if stats is not None:
+        stats.requested += len(texts)
+        stats.misses += len(texts) - sum(1 for v in vectors if v is not None)
+    return vectors, missing, digests
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import openai
+
+from .config import settings
+from .utils import setup_logger
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+# (texts) -> (vectors, response headers)
+BatchFn = Callable[[List[str]], Tuple[List[List[float]], Mapping[str, str]]]
+
+
+class ThrottledError(Exception):
+    def __init__(self, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"rate limited (retry_after={retry_after})")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars/token: only sizes requests against EMBEDDING_TPM_LIMIT, where running the
+    # chunker's tokenizer over every batch again would cost more than the error is worth
+    return len(text) // 4 + 1
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    # Accepts "1.5", "20ms", "6m0s", "1s"
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    num = ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            num += ch
+        elif value.startswith("ms", i):
+            total += float(num or 0) / 1000
+            num = ""
+            i += 1
+        elif ch in "hms":
+            total += float(num or 0) * {"h": 3600, "m": 60, "s": 1}[ch]
+            num = ""
+        i += 1
+    return total or None
+
+
+class TokenBucket:
+    def __init__(self, tokens_per_minute: int = 0) -> None:
+        self.capacity = float(tokens_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def acquire(self, tokens: int) -> None:
+        if not self.enabled:
+            return
+        # A single batch larger than the whole budget is let through once the bucket is full
+        need = min(float(tokens), self.capacity)
+        with self._cond:
+            while True:
+                self._refill_locked()
+                if self._tokens >= need:
+                    self._tokens -= need
+                    return
+                wait = (need - self._tokens) * 60.0 / self.capacity
+                self._cond.wait(timeout=min(wait, 5.0))
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        # Align with the server's view of the budget when it reports one
+        limit = headers.get("x-ratelimit-limit-tokens")
+        remaining = headers.get("x-ratelimit-remaining-tokens")
+        with self._cond:
+            if limit and not self.enabled:
+                try:
+                    self.capacity = float(limit)
+                    self._tokens = self.capacity
+                    self._updated = time.monotonic()
+                except ValueError:
+                    return
+            if remaining and self.enabled:
+                try:
+                    self._refill_locked()
+                    self._tokens = min(self._tokens, float(remaining))
+                except ValueError:
+                    pass
+
+    def drain(self) -> None:
+        with self._cond:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+class AdaptiveLimiter:
+    # AIMD cap on in-flight requests: halve on 429, grow by one after a run of successes
+    def __init__(self, max_in_flight: int) -> None:
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = self.max_in_flight
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self) -> "AdaptiveLimiter":
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_in_flight and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+@lru_cache(maxsize=8)
+def _client(api_key: str, base_url: Optional[str]) -> openai.OpenAI:
+    # Retries are handled per batch by the pipeline
+    return openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+def openai_batch_fn(model: Optional[str] = None) -> BatchFn:
+    api_key = settings.embedding_api_key or settings.openai_api_key or settings.llm_api_key
+    base_url = settings.embedding_base_url or settings.llm_base_url
+    client = _client(api_key, base_url)
+    model = model or settings.embedding_model
+
+    def call(texts: List[str]) -> Tuple[List[List[float]], Mapping[str, str]]:
+        try:
+            raw = client.embeddings.with_raw_response.create(model=model, input=texts, encoding_format="float")
+        except openai.RateLimitError as e:
+            raise ThrottledError(_parse_duration(e.response.headers.get("retry-after"))) from e
+        data = sorted(raw.parse().data, key=lambda d: d.index)
+        return [d.embedding for d in data], raw.headers
+
+    return call
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        batch_fn: Optional[BatchFn] = None,
+        batch_size: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ) -> None:
+        self.batch_fn = batch_fn or openai_batch_fn()
+        self.batch_size = max(1, batch_size or settings.embedding_batch_size)
+        self.limiter = AdaptiveLimiter(max_in_flight or settings.embedding_max_in_flight)
+        tpm = settings.embedding_tpm_limit if tokens_per_minute is None else tokens_per_minute
+        self.bucket = TokenBucket(tpm)
+        self.max_retries = settings.embedding_max_retries if max_retries is None else max_retries
+        self.stats: Dict[str, int] = {"batches": 0, "throttled": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _run_batch(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(t) for t in texts)
+        attempt = 0
+        while True:
+            self.bucket.acquire(tokens)
+            try:
+                with self.limiter:
+                    vectors, headers = self.batch_fn(texts)
+            except ThrottledError as e:
+                self._count("throttled")
+                self.limiter.on_throttle()
+                self.bucket.drain()
+                delay = e.retry_after
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                logger.warning("Embedding batch failed: %s", e)
+                delay = None
+            else:
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"Embeddings API returned {len(vectors)} vectors for {len(texts)} inputs")
+                self.limiter.on_success()
+                self.bucket.observe(headers)
+                self._count("batches")
+                return vectors
+            attempt += 1
+            if attempt > self.max_retries:
+                raise RuntimeError(f"Embedding batch of {len(texts)} texts failed after {attempt} attempts")
+            self._count("retries")
+            if delay is None:
+                delay = min(30.0, 0.5 * 2 ** (attempt - 1)) * (0.5 + random.random())
+            time.sleep(delay)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._run_batch(batches[0])
+        out: List[List[float]] = []
+        with ThreadPoolExecutor(max_workers=self.limiter.max_in_flight) as ex:
+            # map keeps input order; only a failing batch is retried, inside _run_batch
+            for vectors in ex.map(self._run_batch, batches):
+                out.extend(vectors)
+        return out
+
+
+_default_pipeline: Optional[EmbeddingPipeline] = None
+_default_lock = threading.Lock()
+
+
+def get_pipeline() -> EmbeddingPipeline:
+    global _default_pipeline
+    with _default_lock:
+        if _default_pipeline is None:
+            _default_pipeline = EmbeddingPipeline()
+        return _default_pipeline
+
+
+def reset_pipeline() -> None:
+    # Settings changed (e.g. /setup/save): rebuild the client on next use
+    global _default_pipeline
+    with _default_lock:
+        _default_pipeline = None
+    _client.cache_clear()
@@ -1,105 +1,715 @@
 from __future__ import annotations
 
+import asyncio
 import base64
-from typing import Any, Dict, List, Optional
+import importlib.util
+import io
+import itertools
+import re
+import tarfile
+import threading
+import time
+import weakref
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
 from urllib.parse import quote
 
 import httpx
 
 from .config import settings
-from .utils import TTLFileCache, retryable, setup_logger
+from .shared_cache import make_cache
+from .utils import retryable, setup_logger
 
 
 logger = setup_logger(__name__, settings.log_level)
-cache = TTLFileCache(settings.cache_dir, settings.cache_ttl_seconds)
+cache = make_cache()
+
+
+_CACHE_LOOKUP_BATCH = 256
+_SHA_RE = re.compile(r"[0-9a-f]{40}")
+
+
+class RevalidationStats:
+    # How often SHA pinning let us skip GitLab: reused trees/blobs vs. actual fetches
+    def __init__(self) -> None:
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["revalidations_avoided"] = counts.get("trees_reused", 0) + counts.get("blobs_reused", 0)
+        return counts
+
+
+revalidation_stats = RevalidationStats()
 
 
 def _cache_key(prefix: str, *parts: str) -> str:
     return ":".join([prefix, *parts])
 
 
-class GitLabAPI:
+# Keyset pagination parameters for endpoints that support it (used when totals are omitted)
+class _Keyset(NamedTuple):
+    # Query parameters of a keyset walk, and the one that resumes it after an item's "id".
+    # Offset pages are requested in the same order, so a walk can pick up after page 1.
+    params: Dict[str, Any]
+    cursor: str
+
+    @property
+    def order(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.params.items() if k != "pagination"}
+
+    def resume(self, params: Dict[str, Any], last: Dict[str, Any], per_page: int) -> Dict[str, Any]:
+        return {**params, **self.params, self.cursor: last["id"], "per_page": per_page}
+
+
+_PROJECTS_KEYSET = _Keyset({"pagination": "keyset", "order_by": "id", "sort": "asc"}, "id_after")
+# page_token is the tree record id to continue after
+_TREE_KEYSET = _Keyset({"pagination": "keyset"}, "page_token")
+
+
+def _total_pages(resp: httpx.Response) -> Optional[int]:
+    # GitLab drops X-Total / X-Total-Pages for collections over 10k entries
+    try:
+        return int(resp.headers["X-Total-Pages"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _next_page(resp: httpx.Response, page: int, count: int, per_page: int) -> Optional[int]:
+    next_page = resp.headers.get("X-Next-Page")
+    if next_page:
+        return int(next_page)
+    if "X-Next-Page" in resp.headers or count < per_page:
+        return None
+    return page + 1
+
+
+def _chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _ByteStream(io.RawIOBase):
+    # Read-only file object over an iterator of byte chunks (for tarfile stream mode)
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buf = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:  # type: ignore[override]
+        while not self._buf:
+            try:
+                self._buf = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+class RateLimitGate:
+    # Pauses new requests when GitLab reports an exhausted budget (429 / RateLimit-* headers)
+    def __init__(self, low_watermark: int = 5) -> None:
+        self.low_watermark = low_watermark
+        self._until = 0.0
+        self._lock = threading.Lock()
+        self.pauses = 0
+
+    def wait(self) -> None:
+        delay = self._until - time.time()
+        if delay > 0:
+            time.sleep(min(delay, 60.0))
+
+    async def wait_async(self) -> None:
+        delay = self._until - time.time()
+        if delay > 0:
+            await asyncio.sleep(min(delay, 60.0))
+
+    def block_until(self, ts: float) -> None:
+        with self._lock:
+            if ts > self._until:
+                self._until = ts
+                self.pauses += 1
+
+    def observe(self, resp: httpx.Response) -> None:
+        headers = resp.headers
+        try:
+            if resp.status_code == 429:
+                self.block_until(time.time() + float(headers.get("Retry-After") or 1))
+                return
+            remaining = headers.get("RateLimit-Remaining")
+            reset = headers.get("RateLimit-Reset")
+            if remaining is not None and reset and int(remaining) <= self.low_watermark:
+                self.block_until(float(reset))
+        except ValueError:
+            pass
+
+
+def _headers(token: str) -> Dict[str, str]:
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["PRIVATE-TOKEN"] = token
+    return headers
+
+
+def _client_kwargs(token: str, timeout: float) -> Dict[str, Any]:
+    limits = httpx.Limits(
+        max_connections=settings.gitlab_max_connections,
+        max_keepalive_connections=settings.gitlab_max_connections,
+    )
+    # HTTP/2 multiplexes concurrent fetches over one TLS connection; needs the h2 package
+    http2 = settings.gitlab_http2 and importlib.util.find_spec("h2") is not None
+    return {"timeout": timeout, "headers": _headers(token), "limits": limits, "http2": http2}
+
+
+# One pooled client (and rate-limit gate) per GitLab host and token for the life of the
+# process, so requests reuse TCP/TLS connections instead of opening new ones
+_clients_lock = threading.Lock()
+_sync_clients: Dict[tuple, httpx.Client] = {}
+# AsyncClient connections belong to the event loop that opened them: one client per loop,
+# dropped together with the loop if it ends without aclose_clients()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+_gates: Dict[tuple, RateLimitGate] = {}
+
+
+def shared_client(base_url: str, token: str, timeout: float = 15.0) -> httpx.Client:
+    key = (base_url, token, timeout)
+    with _clients_lock:
+        client = _sync_clients.get(key)
+        if client is None or client.is_closed:
+            client = _sync_clients[key] = httpx.Client(**_client_kwargs(token, timeout))
+        return client
+
+
+def shared_async_client(base_url: str, token: str, timeout: float = 15.0) -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    key = (base_url, token, timeout)
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None or client.is_closed:
+            client = clients[key] = httpx.AsyncClient(**_client_kwargs(token, timeout))
+        return client
+
+
+def _shared_gate(base_url: str, token: str) -> RateLimitGate:
+    with _clients_lock:
+        gate = _gates.get((base_url, token))
+        if gate is None:
+            gate = _gates[(base_url, token)] = RateLimitGate(settings.gitlab_rate_limit_low_watermark)
+        return gate
+
+
+async def aclose_clients() -> None:
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        sync_clients = list(_sync_clients.values())
+        _sync_clients.clear()
+        # Clients of other loops can't be awaited from this one; they stay with their loop
+        async_clients = list(_async_clients.pop(loop, {}).values())
+    for client in sync_clients:
+        client.close()
+    for client in async_clients:
+        await client.aclose()
+
+
+def _decode_file(data: Dict[str, Any], file_path: str) -> str:
+    content_b64 = data.get("content", "")
+    encoding = data.get("encoding", "base64")
+    if encoding != "base64":
+        logger.warning("Unexpected encoding %s for file %s", encoding, file_path)
+    try:
+        return base64.b64decode(content_b64).decode("utf-8", errors="replace")
+    except Exception as e:
+        logger.error("Failed to decode content for %s: %s", file_path, e)
+        return ""
+
+
+class _GitLabBase:
+    # Connection settings plus the per-client ref -> SHA and path -> blob SHA memo
     def __init__(self, base_url: str | None = None, token: str | None = None, timeout: float = 15.0) -> None:
         self.base_url = (base_url or settings.gitlab_base_url).rstrip("/")
         self.token = token or settings.gitlab_token
         self.timeout = timeout
-        self._client = httpx.Client(timeout=self.timeout, headers=self._headers())
+        self._gate = _shared_gate(self.base_url, self.token)
+        self._lock = threading.Lock()
+        self._resolved: Dict[tuple, str] = {}
+        self._blob_ids: Dict[tuple, Dict[str, str]] = {}
+
+    def _remember_ref(self, project_id: str, ref: str, sha: str) -> None:
+        with self._lock:
+            self._resolved[(project_id, ref)] = sha
+
+    def _remember_blobs(self, project_id: str, sha: str, items: List[Dict[str, Any]]) -> None:
+        blob_ids = {it["path"]: it["id"] for it in items if it.get("type") == "blob" and it.get("id")}
+        with self._lock:
+            self._blob_ids[(project_id, sha)] = blob_ids
+
+    def _blob_id(self, project_id: str, sha: str, path: str) -> Optional[str]:
+        # Only known once this client has listed the tree at `sha`
+        with self._lock:
+            return self._blob_ids.get((project_id, sha), {}).get(path)
+
+    @staticmethod
+    def _cached_ref(project_id: str, ref: str) -> Optional[str]:
+        if _SHA_RE.fullmatch(ref):
+            return ref
+        if settings.cache_ref_ttl_seconds <= 0:
+            return None
+        sha = cache.get(_cache_key("ref_sha", project_id, ref))
+        if sha is not None:
+            revalidation_stats.incr("ref_cache_hits")
+        return sha
+
+    @staticmethod
+    def _store_ref(project_id: str, ref: str, sha: str) -> None:
+        revalidation_stats.incr("ref_lookups")
+        if settings.cache_ref_ttl_seconds > 0:
+            cache.set(_cache_key("ref_sha", project_id, ref), sha, ttl_seconds=settings.cache_ref_ttl_seconds)
+
+    @staticmethod
+    def _store_blob(project_id: str, blob_id: Optional[str], content: str) -> None:
+        revalidation_stats.incr("blobs_fetched")
+        if blob_id:
+            cache.set(_cache_key("blob", project_id, blob_id), content, ttl_seconds=settings.cache_immutable_ttl_seconds)
 
-    def _headers(self) -> Dict[str, str]:
-        headers = {"Accept": "application/json"}
-        if self.token:
-            headers["PRIVATE-TOKEN"] = self.token
-        return headers
+
+class GitLabAPI(_GitLabBase):
+    def __init__(self, base_url: str | None = None, token: str | None = None, timeout: float = 15.0) -> None:
+        super().__init__(base_url, token, timeout)
+        self._client = shared_client(self.base_url, self.token, self.timeout)
 
     @retryable()
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
-        url = f"{self.base_url}{path}"
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
         logger.debug("GET %s params=%s", url, params)
+        self._gate.wait()
         resp = self._client.get(url, params=params)
+        self._gate.observe(resp)
         resp.raise_for_status()
         return resp
 
-    def list_projects(self, search: Optional[str] = None, membership: bool = True, per_page: int = 100) -> List[Dict[str, Any]]:
-        items: List[Dict[str, Any]] = []
+    def _iter_pages(
+        self, path: str, params: Dict[str, Any], per_page: int = 100, keyset: Optional[_Keyset] = None
+    ) -> Iterator[Dict[str, Any]]:
+        # Page 1 tells how many pages there are; the rest are fetched concurrently and yielded
+        # in order as they arrive, at most 2 * GITLAB_PAGE_WORKERS pages ahead of the consumer.
+        # Without totals the walk goes on by keyset after page 1, or page by page.
+        if keyset is not None:
+            params = {**params, **keyset.order}
+        first = self._get(path, params={**params, "page": 1, "per_page": per_page})
+        total_pages = _total_pages(first)
+        chunk = first.json()
+        yield from chunk
+        if total_pages is None:
+            if keyset is None:
+                yield from self._iter_next_pages(path, params, per_page, first, len(chunk))
+            elif chunk and _next_page(first, 1, len(chunk), per_page) is not None:
+                yield from self._iter_keyset(path, keyset.resume(params, chunk[-1], per_page))
+            return
+        if total_pages < 2:
+            return
+        pages = iter(range(2, total_pages + 1))
+        workers = max(1, min(settings.gitlab_page_workers, total_pages - 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gitlab-pages") as ex:
+
+            def submit(page: int) -> Future:
+                return ex.submit(self._get, path, {**params, "page": page, "per_page": per_page})
+
+            window = deque(submit(page) for page in itertools.islice(pages, 2 * workers))
+            try:
+                while window:
+                    resp = window.popleft().result()
+                    page = next(pages, None)
+                    if page is not None:
+                        window.append(submit(page))
+                    yield from resp.json()
+            finally:
+                for fut in window:
+                    fut.cancel()
+
+    def _iter_keyset(self, path: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        # GitLab omits totals for very large collections; keyset pages link to the next one
+        url: str = path
+        query: Optional[Dict[str, Any]] = params
+        while True:
+            resp = self._get(url, params=query)
+            yield from resp.json()
+            url = resp.links.get("next", {}).get("url")
+            if not url:
+                return
+            query = None
+
+    def _iter_next_pages(
+        self, path: str, params: Dict[str, Any], per_page: int, resp: httpx.Response, count: int
+    ) -> Iterator[Dict[str, Any]]:
         page = 1
         while True:
-            params: Dict[str, Any] = {"page": page, "per_page": per_page}
-            if search:
-                params["search"] = search
-            if membership:
-                params["membership"] = True
-            resp = self._get("/projects", params=params)
+            next_page = _next_page(resp, page, count, per_page)
+            if next_page is None:
+                return
+            page = next_page
+            resp = self._get(path, params={**params, "page": page, "per_page": per_page})
             chunk = resp.json()
-            if not chunk:
-                break
-            items.extend(chunk)
-            if len(chunk) < per_page:
-                break
-            page += 1
-        return items
+            count = len(chunk)
+            yield from chunk
 
-    def get_repository_tree(self, project_id: str, ref: str = "HEAD") -> List[Dict[str, Any]]:
-        key = _cache_key("repo_tree", project_id, ref)
+    def iter_projects(self, search: Optional[str] = None, membership: bool = True, per_page: int = 100) -> Iterator[Dict[str, Any]]:
+        params: Dict[str, Any] = {}
+        if search:
+            params["search"] = search
+        if membership:
+            params["membership"] = True
+        return self._iter_pages("/projects", params, per_page, keyset=_PROJECTS_KEYSET)
+
+    def list_projects(self, search: Optional[str] = None, membership: bool = True, per_page: int = 100) -> List[Dict[str, Any]]:
+        return list(self.iter_projects(search, membership, per_page))
+
+    def list_group_projects(self, group: str, include_subgroups: bool = True, per_page: int = 100) -> List[Dict[str, Any]]:
+        return list(
+            self._iter_pages(
+                f"/groups/{quote(group, safe='')}/projects",
+                {"include_subgroups": include_subgroups, "archived": False},
+                per_page,
+            )
+        )
+
+    def resolve_ref(self, project_id: str, ref: str = "HEAD") -> str:
+        # Branch/tag -> commit SHA: the only lookup that is not immutable, memoised for
+        # CACHE_REF_TTL_SECONDS so one rebuild or a burst of questions costs one request
+        sha = self._cached_ref(project_id, ref)
+        if sha is None:
+            sha = self.get_commit_sha(project_id, ref)
+            self._store_ref(project_id, ref, sha)
+        self._remember_ref(project_id, ref, sha)
+        return sha
+
+    def iter_repository_tree(self, project_id: str, ref: str = "HEAD") -> Iterator[Dict[str, Any]]:
+        # Pinned to the commit SHA: a listing never changes, so it is cached until evicted.
+        # Streams entries as pages arrive; the cache is filled once the listing completes.
+        sha = self.resolve_ref(project_id, ref)
+        key = _cache_key("repo_tree", project_id, sha)
         cached = cache.get(key)
         if cached is not None:
-            return cached
+            revalidation_stats.incr("trees_reused")
+            self._remember_blobs(project_id, sha, cached)
+            yield from cached
+            return
         items: List[Dict[str, Any]] = []
-        page = 1
-        per_page = 100
-        while True:
-            resp = self._get(
-                f"/projects/{quote(project_id, safe='')}/repository/tree",
-                params={"ref": ref, "per_page": per_page, "page": page, "recursive": True},
-            )
-            chunk = resp.json()
-            if not chunk:
-                break
-            items.extend(chunk)
-            if len(chunk) < per_page:
-                break
-            page += 1
-        cache.set(key, items)
-        return items
+        for item in self._iter_pages(
+            f"/projects/{quote(project_id, safe='')}/repository/tree",
+            {"ref": sha, "recursive": True},
+            keyset=_TREE_KEYSET,
+        ):
+            items.append(item)
+            yield item
+        revalidation_stats.incr("trees_fetched")
+        cache.set(key, items, ttl_seconds=settings.cache_immutable_ttl_seconds)
+        self._remember_blobs(project_id, sha, items)
 
-    def get_file_raw(self, project_id: str, file_path: str, ref: str = "HEAD") -> str:
-        key = _cache_key("file_raw", project_id, ref, file_path)
+    def get_repository_tree(self, project_id: str, ref: str = "HEAD") -> List[Dict[str, Any]]:
+        return list(self.iter_repository_tree(project_id, ref))
+
+    def get_commit_sha(self, project_id: str, ref: str = "HEAD") -> str:
+        resp = self._get(f"/projects/{quote(project_id, safe='')}/repository/commits/{quote(ref, safe='')}")
+        return resp.json()["id"]
+
+    def compare(self, project_id: str, from_sha: str, to_sha: str) -> Dict[str, Any]:
+        # Both ends are commit SHAs, so the result is immutable and safe to cache
+        key = _cache_key("compare", project_id, from_sha, to_sha)
         cached = cache.get(key)
         if cached is not None:
             return cached
         resp = self._get(
-            f"/projects/{quote(project_id, safe='')}/repository/files/{quote(file_path, safe='')}",
-            params={"ref": ref},
+            f"/projects/{quote(project_id, safe='')}/repository/compare",
+            params={"from": from_sha, "to": to_sha},
         )
         data = resp.json()
-        content_b64 = data.get("content", "")
-        encoding = data.get("encoding", "base64")
-        if encoding != "base64":
-            logger.warning("Unexpected encoding %s for file %s", encoding, file_path)
-        try:
-            content = base64.b64decode(content_b64).decode("utf-8", errors="replace")
-        except Exception as e:
-            logger.error("Failed to decode content for %s: %s", file_path, e)
-            content = ""
-        cache.set(key, content)
+        if not data.get("compare_timeout"):
+            cache.set(key, data)
+        return data
+
+    def get_file_raw(self, project_id: str, file_path: str, ref: str = "HEAD") -> str:
+        # Bodies are keyed by blob SHA: a file unchanged between commits is never refetched
+        sha = self.resolve_ref(project_id, ref)
+        blob_id = self._blob_id(project_id, sha, file_path)
+        if blob_id:
+            cached = cache.get(_cache_key("blob", project_id, blob_id))
+            if cached is not None:
+                revalidation_stats.incr("blobs_reused")
+                return cached
+            resp = self._get(f"/projects/{quote(project_id, safe='')}/repository/blobs/{blob_id}/raw")
+            content = resp.content.decode("utf-8", errors="replace")
+        else:
+            resp = self._get(
+                f"/projects/{quote(project_id, safe='')}/repository/files/{quote(file_path, safe='')}",
+                params={"ref": sha},
+            )
+            data = resp.json()
+            blob_id = data.get("blob_id")
+            content = _decode_file(data, file_path)
+        self._store_blob(project_id, blob_id, content)
         return content
 
+    def iter_files(
+        self, project_id: str, paths: Iterable[str], ref: str = "HEAD", workers: int | None = None
+    ) -> Iterator[Dict[str, str]]:
+        # Yields {"path", "content"} in completion order. Cached bodies are looked up in bulk
+        # (one Redis round trip per batch) and yielded first; at most 2 * workers fetches are
+        # outstanding, so a slow consumer throttles the producer instead of buffering bodies.
+        workers = max(1, workers or settings.gitlab_fetch_workers)
+        with self._lock:
+            sha = ref if _SHA_RE.fullmatch(ref) else self._resolved.get((project_id, ref))
+        pending: set[Future] = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gitlab-fetch") as ex:
+
+            def drain(block_until: int) -> Iterator[Dict[str, str]]:
+                nonlocal pending
+                while len(pending) > block_until:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        path = fut.path  # type: ignore[attr-defined]
+                        try:
+                            yield {"path": path, "content": fut.result()}
+                        except Exception as e:
+                            logger.warning("Failed to fetch %s: %s", path, e)
+
+            try:
+                for batch in _chunked(paths, _CACHE_LOOKUP_BATCH):
+                    keys = {}
+                    if sha:
+                        for p in batch:
+                            blob_id = self._blob_id(project_id, sha, p)
+                            if blob_id:
+                                keys[p] = _cache_key("blob", project_id, blob_id)
+                    cached = cache.get_many(list(keys.values())) if keys else {}
+                    for p in batch:
+                        content = cached.get(keys.get(p, ""))
+                        if content is not None:
+                            revalidation_stats.incr("blobs_reused")
+                            yield {"path": p, "content": content}
+                            continue
+                        fut = ex.submit(self.get_file_raw, project_id, p, sha or ref)
+                        fut.path = p  # type: ignore[attr-defined]
+                        pending.add(fut)
+                        yield from drain(2 * workers - 1)
+                yield from drain(0)
+            finally:
+                for fut in pending:
+                    fut.cancel()
+
+    def iter_archive_files(
+        self, project_id: str, ref: str = "HEAD", include: Callable[[str], bool] | None = None
+    ) -> Iterator[Dict[str, str]]:
+        # One request for the whole tree: the tar.gz is decompressed and walked as it
+        # downloads, nothing is extracted to disk, and excluded members are never decoded
+        url = f"{self.base_url}/projects/{quote(project_id, safe='')}/repository/archive.tar.gz"
+        # No overall deadline (a big archive takes a while), but every read must make progress
+        timeout = httpx.Timeout(
+            connect=self.timeout, read=settings.archive_read_timeout_seconds, write=self.timeout, pool=self.timeout
+        )
+        self._gate.wait()
+        with self._client.stream("GET", url, params={"sha": ref}, timeout=timeout) as resp:
+            self._gate.observe(resp)
+            resp.raise_for_status()
+            stream = io.BufferedReader(_ByteStream(resp.iter_bytes()), buffer_size=1 << 16)
+            with tarfile.open(fileobj=stream, mode="r|gz") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    # Members are prefixed with "<project>-<sha>/"
+                    path = member.name.split("/", 1)[1] if "/" in member.name else member.name
+                    if include is not None and not include(path):
+                        continue
+                    f = tar.extractfile(member)
+                    if f is None:
+                        continue
+                    yield {"path": path, "content": f.read().decode("utf-8", errors="replace")}
+
+    def iter_repository_files(
+        self, project_id: str, paths: Iterable[str], ref: str = "HEAD", include: Callable[[str], bool] | None = None
+    ) -> Iterator[Dict[str, str]]:
+        # Archive first; if the download fails or stalls part way, the files it has not
+        # delivered yet are fetched one by one (with the per-file retries and cache)
+        wanted = set(paths)
+        seen: set[str] = set()
+        try:
+            for f in self.iter_archive_files(project_id, ref=ref, include=include):
+                seen.add(f["path"])
+                yield f
+            return
+        except (httpx.HTTPError, tarfile.TarError, EOFError, OSError, zlib.error) as e:
+            logger.warning(
+                "Archive download for %s failed after %d files (%s); fetching the rest per file", project_id, len(seen), e
+            )
+        yield from self.iter_files(project_id, sorted(wanted - seen), ref=ref)
+
+
+class AsyncGitLabAPI(_GitLabBase):
+    # Async counterpart of GitLabAPI for request handlers: same caching, retries and
+    # rate-limit gate, sharing one pooled AsyncClient per host and token
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        return shared_async_client(self.base_url, self.token, self.timeout)
+
+    @retryable()
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+        logger.debug("GET %s params=%s", url, params)
+        await self._gate.wait_async()
+        resp = await self._client.get(url, params=params)
+        self._gate.observe(resp)
+        resp.raise_for_status()
+        return resp
+
+    async def _aiter_pages(
+        self, path: str, params: Dict[str, Any], per_page: int = 100, keyset: Optional[_Keyset] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Same walk as GitLabAPI._iter_pages, streaming items as their pages arrive in order
+        if keyset is not None:
+            params = {**params, **keyset.order}
+        first = await self._get(path, params={**params, "page": 1, "per_page": per_page})
+        total_pages = _total_pages(first)
+        chunk = first.json()
+        for item in chunk:
+            yield item
+        if total_pages is None:
+            if keyset is not None:
+                if not chunk or _next_page(first, 1, len(chunk), per_page) is None:
+                    return
+                url: Optional[str] = path
+                query: Optional[Dict[str, Any]] = keyset.resume(params, chunk[-1], per_page)
+                while url:
+                    resp = await self._get(url, params=query)
+                    for item in resp.json():
+                        yield item
+                    url, query = resp.links.get("next", {}).get("url"), None
+                return
+            resp, page, count = first, 1, len(chunk)
+            while True:
+                next_page = _next_page(resp, page, count, per_page)
+                if next_page is None:
+                    return
+                page = next_page
+                resp = await self._get(path, params={**params, "page": page, "per_page": per_page})
+                chunk = resp.json()
+                count = len(chunk)
+                for item in chunk:
+                    yield item
+        if total_pages < 2:
+            return
+        workers = max(1, min(settings.gitlab_page_workers, total_pages - 1))
+        limit = asyncio.Semaphore(workers)
+
+        async def fetch(page: int) -> List[Dict[str, Any]]:
+            async with limit:
+                resp = await self._get(path, params={**params, "page": page, "per_page": per_page})
+                return resp.json()
+
+        pages = iter(range(2, total_pages + 1))
+        window = deque(asyncio.ensure_future(fetch(page)) for page in itertools.islice(pages, 2 * workers))
+        try:
+            while window:
+                chunk = await window.popleft()
+                page = next(pages, None)
+                if page is not None:
+                    window.append(asyncio.ensure_future(fetch(page)))
+                for item in chunk:
+                    yield item
+        finally:
+            for task in window:
+                task.cancel()
+
+    def iter_projects(
+        self, search: Optional[str] = None, membership: bool = True, per_page: int = 100
+    ) -> AsyncIterator[Dict[str, Any]]:
+        params: Dict[str, Any] = {}
+        if search:
+            params["search"] = search
+        if membership:
+            params["membership"] = True
+        return self._aiter_pages("/projects", params, per_page, keyset=_PROJECTS_KEYSET)
+
+    async def list_projects(self, search: Optional[str] = None, membership: bool = True, per_page: int = 100) -> List[Dict[str, Any]]:
+        return [p async for p in self.iter_projects(search, membership, per_page)]
+
+    async def list_group_projects(self, group: str, include_subgroups: bool = True, per_page: int = 100) -> List[Dict[str, Any]]:
+        pages = self._aiter_pages(
+            f"/groups/{quote(group, safe='')}/projects",
+            {"include_subgroups": include_subgroups, "archived": False},
+            per_page,
+        )
+        return [p async for p in pages]
+
+    async def get_commit_sha(self, project_id: str, ref: str = "HEAD") -> str:
+        resp = await self._get(f"/projects/{quote(project_id, safe='')}/repository/commits/{quote(ref, safe='')}")
+        return resp.json()["id"]
+
+    # The cache does disk I/O or Redis round trips: its calls run in worker threads, never
+    # on the event loop
+    async def resolve_ref(self, project_id: str, ref: str = "HEAD") -> str:
+        sha = await asyncio.to_thread(self._cached_ref, project_id, ref)
+        if sha is None:
+            sha = await self.get_commit_sha(project_id, ref)
+            await asyncio.to_thread(self._store_ref, project_id, ref, sha)
+        self._remember_ref(project_id, ref, sha)
+        return sha
+
+    async def get_repository_tree(self, project_id: str, ref: str = "HEAD") -> List[Dict[str, Any]]:
+        sha = await self.resolve_ref(project_id, ref)
+        key = _cache_key("repo_tree", project_id, sha)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            revalidation_stats.incr("trees_reused")
+            self._remember_blobs(project_id, sha, cached)
+            return cached
+        pages = self._aiter_pages(
+            f"/projects/{quote(project_id, safe='')}/repository/tree",
+            {"ref": sha, "recursive": True},
+            keyset=_TREE_KEYSET,
+        )
+        items = [item async for item in pages]
+        revalidation_stats.incr("trees_fetched")
+        await asyncio.to_thread(cache.set, key, items, ttl_seconds=settings.cache_immutable_ttl_seconds)
+        self._remember_blobs(project_id, sha, items)
+        return items
+
+    async def get_file_raw(self, project_id: str, file_path: str, ref: str = "HEAD") -> str:
+        sha = await self.resolve_ref(project_id, ref)
+        blob_id = self._blob_id(project_id, sha, file_path)
+        if blob_id:
+            cached = await asyncio.to_thread(cache.get, _cache_key("blob", project_id, blob_id))
+            if cached is not None:
+                revalidation_stats.incr("blobs_reused")
+                return cached
+            resp = await self._get(f"/projects/{quote(project_id, safe='')}/repository/blobs/{blob_id}/raw")
+            content = resp.content.decode("utf-8", errors="replace")
+        else:
+            resp = await self._get(
+                f"/projects/{quote(project_id, safe='')}/repository/files/{quote(file_path, safe='')}",
+                params={"ref": sha},
+            )
+            data = resp.json()
+            blob_id = data.get("blob_id")
+            content = _decode_file(data, file_path)
+        await asyncio.to_thread(self._store_blob, project_id, blob_id, content)
+        return content
@@ -1,12 +1,30 @@
 from __future__ import annotations
 
+import json
 import os
+import shutil
+import time
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Set, Tuple
 
 import faiss
+import numpy as np
 
+from .chunk_store import ChunkStore
 from .config import settings
+from .embedding_cache import EmbeddingCacheStats
+from .index_factory import (
+    REMOVABLE_TYPES,
+    create_index,
+    index_kind,
+    mmap_flags,
+    resolve_index_type,
+    resolve_storage,
+    search_params,
+    train,
+)
+from .lexical_index import BM25Builder, BM25Index
+from .query_batcher import query_embedder
 from .utils import setup_logger
 from .vectorizer import embed_texts
 
@@ -14,75 +32,433 @@ from .vectorizer import embed_texts
 logger = setup_logger(__name__, settings.log_level)
 
 
+def index_path_for(project_id: str, ref: str = "HEAD") -> str:
+    name = project_id.replace("/", "_")
+    if ref and ref != "HEAD":
+        name = f"{name}@{ref.replace('/', '_')}"
+    return f"{settings.index_dir}/{name}.faiss"
+
+
+def _batched(items: Iterable[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    batch: List[Dict[str, str]] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# The manifest maps each path to runs of consecutive chunk ids, [start, count]: a file's
+# chunks are stored together, so it stays one entry per file however many chunks there are
+Runs = List[List[int]]
+
+
+def _add_id(runs: Runs, i: int) -> None:
+    if runs and runs[-1][0] + runs[-1][1] == i:
+        runs[-1][1] += 1
+    else:
+        runs.append([i, 1])
+
+
+def _run_ids(runs: Runs) -> Iterator[int]:
+    for start, count in runs:
+        yield from range(start, start + count)
+
+
+def path_runs(state: Dict[str, Any]) -> Dict[str, Runs]:
+    # A private copy of the manifest's paths; manifests from before runs listed every id
+    out: Dict[str, Runs] = {}
+    for path, value in state.get("paths", {}).items():
+        if value and isinstance(value[0], int):
+            runs: Runs = []
+            for i in value:
+                _add_id(runs, i)
+            out[path] = runs
+        else:
+            out[path] = [list(r) for r in value]
+    return out
+
+
+def live_chunks(state: Dict[str, Any]) -> int:
+    return sum(count for runs in path_runs(state).values() for _, count in runs)
+
+
 class FaissIndex:
+    # Each build or update writes an immutable generation directory
+    #   <INDEX_DIR>/<name>/gen-<time>-<sha>/{index.faiss, index.chunks.bin, index.chunks.idx, index.bm25/, manifest.json}
+    # and then atomically repoints <INDEX_DIR>/<name>/CURRENT at it. A loaded instance keeps
+    # its generation (index and chunk store mmapped, see INDEX_MMAP) until it is dropped,
+    # so a rebuild never changes what an in-flight query reads. Flat <name>.faiss files from
+    # before generations are still served until the first build replaces them.
     def __init__(self, index_path: str) -> None:
         self.index_path = Path(index_path)
         self.index_path.parent.mkdir(parents=True, exist_ok=True)
-        self.id_to_meta: List[Dict[str, str]] = []
-        self._index: faiss.IndexFlatIP | None = None
+        self.root = self.index_path.with_suffix("")
+        self._pointer = self.root / "CURRENT"
+        self._index: faiss.Index | None = None
         self._meta_path = self.index_path.with_suffix(".meta.json")
+        self.chunks = ChunkStore(self.index_path)
+        self.gen_dir: Path | None = None
+        self.generation: Hashable | None = None
+        self._state: Dict[str, Any] | None = None
+        self._nbytes = 0
+        self._mapped = False
+        self.kind = "flat"
+        self.lexical: BM25Index | None = None
 
-    def _load_or_create(self, dim: int) -> faiss.IndexFlatIP:
-        if self.index_path.exists():
-            logger.info("Loading FAISS index from %s", self.index_path)
-            return faiss.read_index(str(self.index_path))  # type: ignore[return-value]
-        logger.info("Creating new FAISS index with dim=%d", dim)
-        return faiss.IndexFlatIP(dim)
-
-    def build(self, docs: List[Dict[str, str]]) -> None:
-        texts = [d["text"] for d in docs]
-        vectors = embed_texts(texts)
-        if not vectors:
-            logger.warning("No vectors to index")
-            return
-        dim = len(vectors[0])
-        index = self._load_or_create(dim)
-        import numpy as np
+    def current_generation(self) -> str | None:
+        try:
+            return self._pointer.read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
 
-        mat = np.array(vectors, dtype="float32")
-        faiss.normalize_L2(mat)
-        index.add(mat)
-        import json
-        self.id_to_meta = [
-            {"path": d["path"], "chunk_id": d["chunk_id"], "text": d["text"]}
-            for d in docs
-        ]
-        faiss.write_index(index, str(self.index_path))
-        with self._meta_path.open("w", encoding="utf-8") as f:
-            json.dump(self.id_to_meta, f, ensure_ascii=False)
-        self._index = index
-        logger.info("Indexed %d vectors", len(vectors))
+    def signature(self) -> Hashable | None:
+        # Name of the current generation; (mtime_ns, size) for a legacy flat index
+        name = self.current_generation()
+        if name is not None:
+            return name
+        try:
+            st = self.index_path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def exists(self) -> bool:
+        return self.current_generation() is not None or self.index_path.exists()
 
-    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+    def load(self) -> "FaissIndex":
         if self._index is None:
-            if self.index_path.exists():
-                self._index = faiss.read_index(str(self.index_path))
+            for _ in range(3):
+                name = self.current_generation()
+                if name is None:
+                    self._load_legacy()
+                    break
+                try:
+                    self._load_generation(name)
+                    break
+                except FileNotFoundError:
+                    # Collected between reading CURRENT and opening it: re-read the pointer
+                    continue
             else:
-                raise RuntimeError("Index not built")
-        from .vectorizer import embed_texts
-        import numpy as np
-
-        vec = embed_texts([query])[0]
-        mat = np.array([vec], dtype="float32")
-        faiss.normalize_L2(mat)
-        scores, idxs = self._index.search(mat, k)
-        result: List[Tuple[int, float]] = []
-        for i, score in zip(idxs[0], scores[0]):
-            if i == -1:
+                raise RuntimeError("Index generation disappeared while loading")
+        return self
+
+    def _load_generation(self, name: str) -> None:
+        gen_dir = self.root / name
+        with (gen_dir / "manifest.json").open("r", encoding="utf-8") as f:
+            state = json.load(f)
+        self._adopt(name, *self._read_index(gen_dir, state), state)
+
+    @staticmethod
+    def _read_index(gen_dir: Path, state: Dict[str, Any]) -> Tuple[faiss.Index, bool]:
+        flags = mmap_flags(state.get("index_type", "flat")) if settings.index_mmap else 0
+        return faiss.read_index(str(gen_dir / "index.faiss"), flags), bool(flags)
+
+    def _adopt(self, name: str, index: faiss.Index, mapped: bool, state: Dict[str, Any]) -> None:
+        gen_dir = self.root / name
+        chunks = ChunkStore(gen_dir / "index.faiss").open()
+        lexical = BM25Index.load(gen_dir / "index.bm25")
+        self.chunks.close()
+        self.gen_dir, self.generation, self._state = gen_dir, name, state
+        self._index, self.chunks, self.kind = index, chunks, index_kind(index)
+        self._mapped = mapped
+        self.lexical = lexical
+        self._nbytes = sum(p.stat().st_size for p in gen_dir.rglob("*") if p.is_file())
+
+    def _load_legacy(self) -> None:
+        if not self.index_path.exists():
+            raise RuntimeError("Index not built")
+        self.generation = self.signature()
+        self._index = faiss.read_index(str(self.index_path))
+        self._mapped = False
+        self.kind = index_kind(self._index)
+        self._nbytes = self.index_path.stat().st_size
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    @property
+    def _state_path(self) -> Path:
+        return self.index_path.with_suffix(".state.json")
+
+    def load_state(self) -> Dict[str, Any] | None:
+        # {"commit_sha", "embedding_model", "dim", "index_type", "storage", "total_chunks",
+        #  "paths": {path: [[first_id, count], ...]}}
+        # of the loaded generation, else of the current one
+        if self._state is not None:
+            return dict(self._state)
+        name = self.current_generation()
+        path = self.root / name / "manifest.json" if name else self._state_path
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _stage(self, commit_sha: str | None) -> Tuple[str, Path]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        name = f"gen-{time.time_ns():016x}-{(commit_sha or 'nocommit')[:8]}"
+        staging = self.root / f".{name}.tmp"
+        staging.mkdir()
+        return name, staging
+
+    def _publish(self, name: str, staging: Path, index: faiss.Index, state: Dict[str, Any]) -> None:
+        # Everything is written into the staging dir, renamed into place, and only then
+        # made current by replacing the pointer file
+        faiss.write_index(index, str(staging / "index.faiss"))
+        manifest = {**state, "generation": name, "created_at": time.time()}
+        with (staging / "manifest.json").open("w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.rename(staging, self.root / name)
+        tmp = self._pointer.with_name(f"CURRENT.tmp{os.getpid()}")
+        tmp.write_text(name, encoding="utf-8")
+        os.replace(tmp, self._pointer)
+        self._drop_legacy()
+        if settings.index_mmap:
+            # Serve the published file like any other worker would, not the private copy
+            self._adopt(name, *self._read_index(self.root / name, manifest), manifest)
+        else:
+            self._adopt(name, index, False, manifest)
+        self.gc()
+
+    def _drop_legacy(self) -> None:
+        for path in (self.index_path, self._state_path, self._meta_path, self.index_path.with_suffix(".chunks.bin"),
+                     self.index_path.with_suffix(".chunks.idx")):
+            path.unlink(missing_ok=True)
+
+    def gc(self, keep: int | None = None) -> List[str]:
+        # Keep the current generation plus the newest `keep - 1` others; readers that still
+        # hold a collected generation keep their open index and mmapped chunks
+        keep = max(1, keep or settings.index_keep_generations)
+        current = self.current_generation()
+        removed: List[str] = []
+        if not self.root.is_dir():
+            return removed
+        gens = sorted((p for p in self.root.iterdir() if p.is_dir() and p.name.startswith("gen-")), reverse=True)
+        kept = 1
+        for gen in gens:
+            if gen.name == current:
+                continue
+            if kept < keep:
+                kept += 1
                 continue
-            result.append((int(i), float(score)))
-        return result
+            shutil.rmtree(gen, ignore_errors=True)
+            removed.append(gen.name)
+        # Staging dirs of builds that crashed
+        for tmp in self.root.glob(".gen-*.tmp"):
+            if time.time() - tmp.stat().st_mtime > 3600:
+                shutil.rmtree(tmp, ignore_errors=True)
+        if removed:
+            logger.info("Collected %d old index generations in %s", len(removed), self.root)
+        return removed
 
-    def get_chunk_text(self, chunk_id: int) -> str:
-        import json
-        if not self._meta_path.exists():
-            return ""
+    def _embed(self, docs: List[Dict[str, str]], stats: EmbeddingCacheStats | None) -> np.ndarray:
+        vectors = embed_texts([d["text"] for d in docs], stats=stats)
+        mat = np.array(vectors, dtype="float32")
+        if len(mat):
+            faiss.normalize_L2(mat)
+        return mat
+
+    @staticmethod
+    def _lexical_text(doc: Dict[str, str]) -> str:
+        # The path is indexed with the text so "README" or "settings.py" finds the file itself
+        return f"{doc.get('path', '')}\n{doc.get('text', '')}"
+
+    def supports_incremental(self) -> bool:
+        state = self.load_state()
+        if not state or not state.get("commit_sha") or not self.exists():
+            return False
+        if state.get("index_type", "flat") not in REMOVABLE_TYPES:
+            return False
+        return state.get("embedding_model") == settings.embedding_model
+
+    def build(
+        self,
+        docs: Iterable[Dict[str, str]],
+        stats: EmbeddingCacheStats | None = None,
+        commit_sha: str | None = None,
+        index_type: str | None = None,
+    ) -> int:
+        # Streaming: each batch of INGEST_BATCH_SIZE chunks is embedded, its vectors spooled
+        # to a file in the staging dir and its records appended to the chunk store and
+        # postings, then dropped. Only once the count is known (it picks the index type and
+        # IVF list count) is the index trained on a bounded sample and filled batch by
+        # batch from the spool, so memory does not grow with the number of files.
+        batch_size = max(1, settings.ingest_batch_size)
+        name, staging = self._stage(commit_sha)
+        chunks = ChunkStore(staging / "index.faiss")
+        chunks.write([])
+        lexical = BM25Builder(staging / "index.bm25")
+        paths: Dict[str, Runs] = {}
+        spool_path = staging / "vectors.f32"
+        total, dim = 0, 0
+        with spool_path.open("wb") as spool:
+            for batch in _batched(docs, batch_size):
+                mat = self._embed(batch, stats)
+                dim = mat.shape[1]
+                spool.write(mat.tobytes())
+                start = chunks.append(batch)
+                for i, d in enumerate(batch, start):
+                    _add_id(paths.setdefault(d["path"], []), i)
+                    lexical.add(i, self._lexical_text(d))
+                total += len(batch)
+        chunks.close()
+        if not total:
+            shutil.rmtree(staging, ignore_errors=True)
+            logger.warning("No vectors to index")
+            return 0
+        # Always start from an empty index: ids are positions in the chunk store
+        kind = resolve_index_type(index_type, total)
+        storage = resolve_storage()
+        index = create_index(kind, dim, total, storage)
+        if not index.is_trained:
+            train(index, np.memmap(spool_path, dtype="float32", mode="r", shape=(total, dim)))
+        with spool_path.open("rb") as spool:
+            for start in range(0, total, batch_size):
+                mat = np.fromfile(spool, dtype="float32", count=min(batch_size, total - start) * dim).reshape(-1, dim)
+                index.add_with_ids(mat, np.arange(start, start + len(mat), dtype="int64"))
+        spool_path.unlink()
+        lexical.finish(k1=settings.bm25_k1, b=settings.bm25_b)
+        self._publish(
+            name,
+            staging,
+            index,
+            {
+                "commit_sha": commit_sha,
+                "embedding_model": settings.embedding_model,
+                "dim": dim,
+                "index_type": kind,
+                "storage": storage,
+                "total_chunks": total,
+                "paths": paths,
+            },
+        )
+        logger.info("Indexed %d vectors (%s) into %s", total, kind, name)
+        return total
+
+    def update(
+        self,
+        docs: Iterable[Dict[str, str]],
+        removed_paths: Iterable[str],
+        stats: EmbeddingCacheStats | None = None,
+        commit_sha: str | None = None,
+    ) -> Dict[str, int]:
+        # Replace all chunks of the paths in `docs`, drop `removed_paths`, keep everything
+        # else. The loaded generation is copied forward, never modified in place. `docs`
+        # is consumed in batches like build(); a path loses its old chunks when first seen.
+        self.load()
+        assert self._index is not None
+        state = self.load_state() or {}
+        # A memory-mapped index is read-only and cannot be cloned: re-read a private copy
+        if self._mapped and self.gen_dir is not None:
+            index = faiss.read_index(str(self.gen_dir / "index.faiss"))
+        else:
+            index = faiss.clone_index(self._index)
+        paths = path_runs(state)
+        stale = [i for p in set(removed_paths) for i in _run_ids(paths.pop(p, []))]
+        name, staging = self._stage(commit_sha)
+        chunks = ChunkStore(staging / "index.faiss")
+        try:
+            if self.chunks.exists():
+                chunks.link_from(self.chunks)
+            first_new = len(chunks)
+            # The previous postings are merged forward and only the new chunks are tokenized;
+            # generations written before tf and lengths were kept are re-tokenized once
+            base = self.lexical if self.lexical is not None and self.lexical.mergeable else None
+            lexical = BM25Builder(staging / "index.bm25", base=base)
+            added = 0
+            seen: Set[str] = set()
+            for batch in _batched(docs, max(1, settings.ingest_batch_size)):
+                for d in batch:
+                    if d["path"] not in seen:
+                        seen.add(d["path"])
+                        stale.extend(_run_ids(paths.pop(d["path"], [])))
+                mat = self._embed(batch, stats)
+                start = chunks.append(batch)
+                index.add_with_ids(mat, np.arange(start, start + len(batch), dtype="int64"))
+                for i, d in enumerate(batch, start):
+                    _add_id(paths.setdefault(d["path"], []), i)
+                    lexical.add(i, self._lexical_text(d))
+                added += len(batch)
+            if stale:
+                index.remove_ids(np.array(stale, dtype="int64"))
+            total = len(chunks)
+            if base is not None:
+                lexical.drop(stale)
+            else:
+                for i in sorted(i for runs in paths.values() for i in _run_ids(runs) if i < first_new):
+                    lexical.add(i, self._lexical_text(chunks.get(i) or {}))
+            # idf and lengths are corpus-wide: impacts are recomputed for every posting from
+            # the stored tf and doc lengths, which is cheap next to tokenizing
+            lexical.finish(k1=settings.bm25_k1, b=settings.bm25_b)
+            chunks.close()
+            state.pop("generation", None)
+            state.pop("created_at", None)
+            state.update({"commit_sha": commit_sha, "total_chunks": total, "paths": paths})
+            self._publish(name, staging, index, state)
+        except BaseException:
+            if staging.exists():
+                # Nothing is published: CURRENT and its commit SHA stay as they were, and the
+                # records appended to the shared blob are cut off again
+                chunks.rollback()
+                shutil.rmtree(staging, ignore_errors=True)
+            raise
+        finally:
+            chunks.release()
+        logger.info("Updated index: +%d / -%d vectors into %s", added, len(stale), name)
+        return {"added": added, "removed": len(stale)}
+
+    @staticmethod
+    def embed_query(query: str) -> np.ndarray:
+        # Cached per question; concurrent misses are batched into one embeddings request
+        return query_embedder.embed(query)
+
+    def search_vectors(
+        self, mat: np.ndarray, k: int = 5, nprobe: int | None = None, ef_search: int | None = None
+    ) -> List[List[Tuple[int, float]]]:
+        # Scores are inner products of L2-normalised vectors, i.e. cosine similarity,
+        # so they are comparable across indexes built with the same embedding model
+        self.load()
+        assert self._index is not None
+        params = search_params(self.kind, nprobe=nprobe, ef_search=ef_search)
+        scores, idxs = self._index.search(mat, k, params=params)
+        return [
+            [(int(i), float(score)) for i, score in zip(row_ids, row_scores) if i != -1]
+            for row_ids, row_scores in zip(idxs, scores)
+        ]
+
+    def search_vector(
+        self, mat: np.ndarray, k: int = 5, nprobe: int | None = None, ef_search: int | None = None
+    ) -> List[Tuple[int, float]]:
+        return self.search_vectors(mat[:1], k, nprobe=nprobe, ef_search=ef_search)[0]
+
+    def search(
+        self, query: str, k: int = 5, nprobe: int | None = None, ef_search: int | None = None
+    ) -> List[Tuple[int, float]]:
+        self.load()
+        return self.search_vector(self.embed_query(query), k, nprobe=nprobe, ef_search=ef_search)
+
+    def search_lexical(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        # BM25 scores; empty for generations built before the lexical index existed
+        self.load()
+        return self.lexical.search(query, k) if self.lexical is not None else []
+
+    def _ensure_chunks(self) -> ChunkStore:
+        if not self.chunks.exists() and self._meta_path.exists():
+            logger.info("Migrating %s to chunk store", self._meta_path)
+            self.chunks.migrate_from_json(self._meta_path)
+        return self.chunks
+
+    def get_chunk(self, chunk_id: int) -> Dict[str, str] | None:
         try:
-            with self._meta_path.open("r", encoding="utf-8") as f:
-                meta = json.load(f)
-            if 0 <= chunk_id < len(meta):
-                return meta[chunk_id].get("text", "")
-        except Exception:
-            return ""
-        return ""
+            return self._ensure_chunks().get(chunk_id)
+        except Exception as e:
+            logger.warning("Failed to read chunk %d: %s", chunk_id, e)
+            return None
 
+    def get_chunk_text(self, chunk_id: int) -> str:
+        rec = self.get_chunk(chunk_id)
+        return rec.get("text", "") if rec else ""
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from .config import settings
+from .utils import setup_logger
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+# How flat and IVF indexes store vectors: 4, 1 or 2 bytes per dimension
+INDEX_STORAGES = ("float32", "sq8", "fp16")
+_SQ_TYPES = {"sq8": faiss.ScalarQuantizer.QT_8bit, "fp16": faiss.ScalarQuantizer.QT_fp16}
+# Index types whose vectors can be removed in place (needed for incremental updates)
+REMOVABLE_TYPES = {"flat", "ivf", "ivfpq"}
+
+# IVF k-means wants ~39 points per centroid; PQ codebooks want 256 per sub-quantizer
+_MIN_POINTS_PER_LIST = 39
+_PQ_MIN_TRAIN = 256 * 39
+# Past these faiss subsamples the training set itself: 256 points per k-means centroid,
+# and 256 codes * 256 points for PQ / scalar quantizer codebooks
+_MAX_POINTS_PER_LIST = 256
+_CODEBOOK_TRAIN = 256 * 256
+
+
+def _parse_overrides(value: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for item in value.split(","):
+        if "=" in item:
+            project, kind = item.rsplit("=", 1)
+            out[project.strip()] = kind.strip().lower()
+    return out
+
+
+def project_index_type(project_id: str) -> str:
+    return _parse_overrides(settings.index_types).get(project_id, settings.index_type.lower())
+
+
+def auto_index_type(n_vectors: int) -> str:
+    # HNSW is only picked explicitly: it cannot remove vectors, which would turn every
+    # incremental update into a full rebuild
+    if n_vectors < settings.ann_min_vectors:
+        return "flat"
+    if n_vectors < settings.ivfpq_min_vectors:
+        return "ivf"
+    return "ivfpq"
+
+
+def _nlist(n_vectors: int) -> int:
+    nlist = int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // _MIN_POINTS_PER_LIST))
+
+
+def _pq_m(dim: int) -> int:
+    # Largest sub-quantizer count dividing dim with >= 8 dims per sub-vector
+    for m in (96, 64, 48, 32, 24, 16, 8, 4, 2, 1):
+        if dim % m == 0 and dim // m >= 8:
+            return m
+    return 1
+
+
+def resolve_index_type(requested: Optional[str], n_vectors: int) -> str:
+    kind = (requested or "auto").lower()
+    if kind == "auto":
+        kind = auto_index_type(n_vectors)
+    if kind not in INDEX_TYPES:
+        logger.warning("Unknown index type %r, using flat", kind)
+        return "flat"
+    # Fall back when there is not enough data to train the quantizers
+    if kind == "ivfpq" and n_vectors < _PQ_MIN_TRAIN:
+        kind = "ivf"
+    if kind == "ivf" and n_vectors < 2 * _MIN_POINTS_PER_LIST:
+        kind = "flat"
+    return kind
+
+
+def resolve_storage(requested: Optional[str] = None) -> str:
+    storage = (requested or settings.index_storage).lower()
+    if storage not in INDEX_STORAGES:
+        logger.warning("Unknown index storage %r, using float32", storage)
+        return "float32"
+    return storage
+
+
+def create_index(kind: str, dim: int, n_vectors: int, storage: str = "float32") -> faiss.Index:
+    # storage applies to flat and IVF; IVF-PQ codes are compressed already and HNSW is
+    # always float32
+    metric = faiss.METRIC_INNER_PRODUCT
+    qtype = _SQ_TYPES.get(storage)
+    if kind == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, settings.hnsw_m, metric)
+        inner.hnsw.efConstruction = settings.hnsw_ef_construction
+    elif kind in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlatIP(dim)
+        nlist = _nlist(n_vectors)
+        # IVF stores ids in its inverted lists and removes them in place. Wrapping it in
+        # IndexIDMap would desync ids after remove_ids, which compacts only the id map.
+        if kind == "ivfpq":
+            return faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), 8, metric)
+        if qtype is not None:
+            return faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, metric)
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+    elif qtype is not None:
+        inner = faiss.IndexScalarQuantizer(dim, qtype, metric)
+    else:
+        inner = faiss.IndexFlatIP(dim)
+    # faiss' Python wrappers keep the quantizer / inner index referenced. Plain IndexIDMap:
+    # IDMap2's reverse map is rebuilt in private memory on every load and nothing here
+    # reconstructs vectors by id.
+    return faiss.IndexIDMap(inner)
+
+
+def train_size(index: faiss.Index, n_vectors: int, dim: int, max_bytes: int = 256 << 20) -> int:
+    # Rows worth training on: what faiss would use at most, capped at max_bytes of float32
+    # but never under k-means' minimum of 39 points per list
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        need, floor = _CODEBOOK_TRAIN, 1
+    else:
+        need, floor = ivf.nlist * _MAX_POINTS_PER_LIST, ivf.nlist * _MIN_POINTS_PER_LIST
+        if not isinstance(ivf, faiss.IndexIVFFlat):
+            need = max(need, _CODEBOOK_TRAIN)
+    return min(n_vectors, max(floor, min(need, max_bytes // (4 * dim))))
+
+
+def train(index: faiss.Index, mat: np.ndarray, max_bytes: int = 256 << 20) -> None:
+    # `mat` may be a memmap of the on-disk spool: only the sampled rows are read, in order
+    if index.is_trained:
+        return
+    size = train_size(index, len(mat), mat.shape[1], max_bytes)
+    sample = mat
+    if size < len(mat):
+        rows = np.random.default_rng(0).choice(len(mat), size=size, replace=False)
+        sample = mat[np.sort(rows)]
+    index.train(np.ascontiguousarray(sample, dtype="float32"))
+
+
+def index_kind(index: faiss.Index) -> str:
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def mmap_flags(kind: str) -> int:
+    # read_index flags that map the vectors from the file instead of copying them, so
+    # every worker serving a generation shares one copy in the page cache. Such an index
+    # is read-only: adding to it (or to a clone_index of it) is not supported.
+    if kind in ("ivf", "ivfpq"):
+        return faiss.IO_FLAG_MMAP
+    return faiss.IO_FLAG_MMAP_IFC
+
+
+def search_params(
+    kind: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+) -> Optional[faiss.SearchParameters]:
+    # Per-call parameters, so concurrent queries on a shared index don't race on knobs
+    if kind in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(nprobe=nprobe or settings.faiss_nprobe)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search or settings.faiss_ef_search)
+    return None
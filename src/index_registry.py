@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from .config import settings
+from .index_builder import FaissIndex, index_path_for
+from .utils import setup_logger
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+
+# Process-wide LRU of loaded FAISS indexes keyed by (project_id, ref)
+class IndexRegistry:
+    def __init__(self, max_entries: int = 16, max_bytes: int = 0) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], FaissIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, project_id: str, ref: str = "HEAD") -> FaissIndex:
+        key = (project_id, ref)
+        path = index_path_for(project_id, ref)
+        with self._lock:
+            idx = self._entries.get(key)
+            if idx is not None and idx.generation == idx.signature():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return idx
+            if idx is not None:
+                self.reloads += 1
+                del self._entries[key]
+            else:
+                self.misses += 1
+
+        # Load outside the lock so a large index does not stall hits on other projects
+        fresh = FaissIndex(path).load()
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.generation == fresh.generation:
+                self._entries.move_to_end(key)
+                return current
+            self._entries[key] = fresh
+            self._entries.move_to_end(key)
+            self._evict_locked()
+        logger.info("Loaded index for %s@%s (%d bytes)", project_id, ref, fresh.nbytes)
+        return fresh
+
+    def invalidate(self, project_id: str, ref: str = "HEAD") -> None:
+        with self._lock:
+            self._entries.pop((project_id, ref), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _total_bytes_locked(self) -> int:
+        return sum(idx.nbytes for idx in self._entries.values())
+
+    def _evict_locked(self) -> None:
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            (self.max_entries and len(self._entries) > self.max_entries)
+            or (self.max_bytes and self._total_bytes_locked() > self.max_bytes)
+        ):
+            (project_id, ref), _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            logger.info("Evicted index for %s@%s", project_id, ref)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes_locked(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
+
+
+registry = IndexRegistry(settings.index_cache_max_entries, settings.index_cache_max_bytes)
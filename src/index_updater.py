@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+from .answer_cache import answer_cache
 from .gitlab_api_handler import GitLabAPI
 from .structure_parser import parse_tree
-from .partial_file_loader import prepare_documents
-from .index_builder import FaissIndex
+from .partial_file_loader import iter_documents, should_skip
+from .embedding_cache import EmbeddingCacheStats
+from .index_builder import FaissIndex, index_path_for, live_chunks
+from .index_factory import project_index_type
 from .utils import setup_logger
 from .config import settings
 
@@ -13,22 +16,164 @@ from .config import settings
 logger = setup_logger(__name__, settings.log_level)
 
 
-def rebuild_index_for_project(project_id: str, ref: str = "HEAD") -> None:
-    api = GitLabAPI()
-    tree = api.get_repository_tree(project_id, ref=ref)
+def _select_paths(tree: Iterable[Dict[str, Any]]) -> Set[str]:
     parsed = parse_tree(tree)
-    key_paths = set(parsed["key_files"]) | set(parsed["configs"]) | set(parsed["modules"])  # prioritize
-
-    files: List[Dict[str, str]] = []
-    for p in key_paths:
-        try:
-            content = api.get_file_raw(project_id, p, ref=ref)
-        except Exception as e:
-            logger.warning("Failed to fetch %s: %s", p, e)
+    return set(parsed["key_files"]) | set(parsed["configs"]) | set(parsed["modules"])  # prioritize
+
+
+def _is_selected(path: str) -> bool:
+    # Same rules as _select_paths, applied to one path while streaming an archive
+    return not should_skip(path) and bool(_select_paths([{"type": "blob", "path": path}]))
+
+
+def _diff_paths(diffs: List[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
+    # (paths to (re)index, paths whose old chunks must go)
+    changed: Set[str] = set()
+    removed: Set[str] = set()
+    for d in diffs:
+        if d.get("deleted_file"):
+            removed.add(d.get("old_path") or d.get("new_path", ""))
             continue
-        files.append({"path": p, "content": content})
+        if d.get("renamed_file") and d.get("old_path"):
+            removed.add(d["old_path"])
+        if d.get("new_path"):
+            changed.add(d["new_path"])
+    return changed, removed
+
+
+Progress = Callable[..., None]
+
+
+def _noop_progress(stage: str, **info: Any) -> None:
+    pass
+
+
+def _counted(items: Iterable[Dict[str, Any]], report: Callable[[int], None], every: int = 50) -> Iterator[Dict[str, Any]]:
+    n = 0
+    for item in items:
+        n += 1
+        if n % every == 0:
+            report(n)
+        yield item
+    report(n)
+
+
+def _incremental_update(
+    api: GitLabAPI,
+    index: FaissIndex,
+    project_id: str,
+    old_sha: str,
+    new_sha: str,
+    stats: EmbeddingCacheStats,
+    progress: Progress = _noop_progress,
+) -> Dict[str, Any] | None:
+    progress("compare", from_sha=old_sha, to_sha=new_sha)
+    comparison = api.compare(project_id, old_sha, new_sha)
+    if comparison.get("compare_timeout"):
+        logger.info("Compare %s..%s timed out; falling back to full rebuild", old_sha[:8], new_sha[:8])
+        return None
+    changed, removed = _diff_paths(comparison.get("diffs") or [])
+    # Classification is per path, so the same rules apply to a synthetic one-file tree
+    selected = _select_paths([{"type": "blob", "path": p} for p in changed])
+    removed |= changed - selected
+    progress("fetch", files_total=len(selected), files_removed=len(removed))
+    fetched: Dict[str, int] = {"files": 0}
+    got: Set[str] = set()
+    indexed: Set[str] = set()
+
+    def on_fetch(n: int) -> None:
+        fetched["files"] = n
+        progress("fetch", files=n)
+
+    def files() -> Iterator[Dict[str, str]]:
+        for f in api.iter_files(project_id, sorted(selected), ref=new_sha):
+            got.add(f["path"])
+            yield f
+
+    def docs() -> Iterator[Dict[str, str]]:
+        for doc in iter_documents(_counted(files(), on_fetch)):
+            indexed.add(doc["path"])
+            yield doc
+        # iter_files logs and skips files it could not fetch. Publishing now would record
+        # new_sha without them (their old chunks are already dropped), and the next diff
+        # would never bring them back: fail instead, so the next run retries the whole diff.
+        missing = selected - got
+        if missing:
+            raise RuntimeError(
+                f"{len(missing)} changed files could not be fetched (e.g. {sorted(missing)[0]}); "
+                f"index left at {old_sha[:8]}"
+            )
+
+    # Files stream through chunking into batched embedding; every selected path gives up its
+    # old chunks, so a changed file the loader now skips does not keep stale ones
+    result = index.update(
+        _counted(docs(), lambda n: progress("fetch", chunks=n)), removed | selected, stats=stats, commit_sha=new_sha
+    )
+    removed |= selected - indexed
+    return {
+        "mode": "incremental",
+        "chunks": result["added"],
+        "files_changed": fetched["files"],
+        "files_removed": len(removed),
+        "vectors_removed": result["removed"],
+    }
+
+
+def rebuild_index_for_project(
+    project_id: str, ref: str = "HEAD", full: bool = False, progress: Optional[Progress] = None
+) -> Dict[str, Any]:
+    # progress(stage, **counters) is called as the rebuild moves through
+    # resolve -> compare/tree -> fetch -> index
+    progress = progress or _noop_progress
+    api = GitLabAPI()
+    index = FaissIndex(index_path_for(project_id, ref))
+    stats = EmbeddingCacheStats()
+    progress("resolve", ref=ref)
+    try:
+        sha: str | None = api.get_commit_sha(project_id, ref)
+    except Exception as e:
+        logger.warning("Failed to resolve %s@%s to a commit: %s", project_id, ref, e)
+        sha = None
+
+    result: Dict[str, Any] | None = None
+    state = index.load_state() if sha and not full and index.supports_incremental() else None
+    if state:
+        live = live_chunks(state)
+        if state["commit_sha"] == sha:
+            result = {"mode": "noop", "chunks": 0}
+        elif live * 2 < state.get("total_chunks", 0):
+            logger.info("Chunk store for %s is mostly tombstones; doing a full rebuild", project_id)
+        else:
+            result = _incremental_update(api, index, project_id, state["commit_sha"], sha, stats, progress)
 
-    docs = prepare_documents(files)
-    index_path = f"{settings.index_dir}/{project_id.replace('/', '_')}.faiss"
-    FaissIndex(index_path).build(docs)
+    if result is None:
+        # Pin the fetch to the resolved commit so tree and files are consistent
+        fetch_ref = sha or ref
+        progress("tree", commit_sha=sha)
+        # Tree pages are classified as they arrive; files then stream from the fetch pool
+        # straight into chunking and batched embedding
+        selected = _select_paths(api.iter_repository_tree(project_id, ref=fetch_ref))
+        threshold = settings.archive_ingest_threshold
+        if threshold and len(selected) >= threshold:
+            ingest = "archive"
+            files = api.iter_repository_files(project_id, selected, ref=fetch_ref, include=_is_selected)
+        else:
+            ingest = "files"
+            files = api.iter_files(project_id, sorted(selected), ref=fetch_ref)
+        progress("fetch", files_total=len(selected), ingest=ingest)
+        docs = _counted(
+            iter_documents(_counted(files, lambda n: progress("fetch", files=n))),
+            lambda n: progress("fetch", chunks=n),
+        )
+        chunks = index.build(docs, stats=stats, commit_sha=sha, index_type=project_index_type(project_id))
+        result = {"mode": "full", "ingest": ingest, "index_type": index.kind, "chunks": chunks}
 
+    if result["mode"] != "noop":
+        # Entries are keyed by index generation already; this just frees them early
+        answer_cache.invalidate(project_id, ref)
+    logger.info(
+        "Rebuilt %s@%s (%s, %s): %d chunks, embedding cache hit rate %.1f%% (%d hits, %d bytes not re-sent)",
+        project_id, ref, result["mode"], (sha or "?")[:8], result["chunks"],
+        stats.hit_rate * 100, stats.hits, stats.bytes_saved,
+    )
+    return {**result, "commit_sha": sha, "embedding_cache": stats.as_dict()}
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .index_updater import rebuild_index_for_project
+from .utils import setup_logger
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+ACTIVE_STATES = ("queued", "running")
+
+
+@dataclass
+class Job:
+    id: str
+    project_id: str
+    ref: str = "HEAD"
+    full: bool = False
+    status: str = "queued"  # queued | running | done | failed
+    stage: str = "queued"
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def report(self, stage: str, **info: Any) -> None:
+        self.stage = stage
+        self.progress.update(info)
+
+    def as_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "project_id": self.project_id,
+            "ref": self.ref,
+            "full": self.full,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": round(end - self.started_at, 3) if self.started_at else None,
+        }
+
+
+# Bounded pool of rebuild workers, one writer per (project, ref) index. A rebuild requested
+# while one is queued joins it (upgraded to full if either asked for it). One requested
+# while a job is running gets a single follow-up job, started when the running one ends:
+# the running job resolved its commit before the request, so it may miss a newer push.
+class JobScheduler:
+    def __init__(self, runner: Callable[..., Dict[str, Any]], max_workers: int = 2, max_history: int = 1000) -> None:
+        self.runner = runner
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="rebuild")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[Tuple[str, str], Job] = {}
+        self._followups: Dict[Tuple[str, str], Job] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def submit(self, project_id: str, ref: str = "HEAD", full: bool = False) -> Job:
+        key = (project_id, ref)
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None and active.status == "running":
+                active = self._followups.get(key)
+                if active is None:
+                    job = self._followups[key] = self._new_job_locked(project_id, ref, full)
+                    return job
+            if active is not None:
+                self.coalesced += 1
+                active.full = active.full or full
+                return active
+            job = self._active[key] = self._new_job_locked(project_id, ref, full)
+        self._executor.submit(self._run, job)
+        return job
+
+    def _new_job_locked(self, project_id: str, ref: str, full: bool) -> Job:
+        job = Job(id=uuid.uuid4().hex, project_id=project_id, ref=ref, full=full)
+        self._jobs[job.id] = job
+        self._trim_locked()
+        return job
+
+    def _trim_locked(self) -> None:
+        # Oldest finished jobs go first; queued and running ones are skipped, not waited for
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.status not in ACTIVE_STATES][:excess]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        with self._lock:
+            job.status = "running"
+            job.started_at = time.time()
+        job.report("starting")
+        try:
+            job.result = self.runner(job.project_id, ref=job.ref, full=job.full, progress=job.report)
+            job.status = "done"
+            job.report("done")
+        except Exception as e:
+            logger.exception("Rebuild of %s@%s failed", job.project_id, job.ref)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            key = (job.project_id, job.ref)
+            with self._lock:
+                followup = self._followups.pop(key, None)
+                if followup is not None:
+                    self._active[key] = followup
+                elif self._active.get(key) is job:
+                    del self._active[key]
+            if followup is not None:
+                self._executor.submit(self._run, followup)
+            job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, project_id: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in jobs if project_id is None or j.project_id == project_id]
+
+    def wait(self, jobs: List[Job], timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.time() + timeout
+        for job in jobs:
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            if not job.done.wait(remaining):
+                return False
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            counts["coalesced"] = self.coalesced
+            return counts
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+scheduler = JobScheduler(rebuild_index_for_project, settings.rebuild_workers)
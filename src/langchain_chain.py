@@ -1,23 +1,19 @@
 from __future__ import annotations
 
-from typing import List
+import threading
+from typing import Iterator, List, Optional
 
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
 from .config import settings
+from .context_assembler import context_tokenizer
 
 
-def make_chain() -> ChatOpenAI:
-    api_key = settings.llm_api_key or settings.openai_api_key
-    base_url = settings.llm_base_url
-    model = settings.llm_model
-    return ChatOpenAI(api_key=api_key, base_url=base_url, model=model, temperature=0.1)
-
-
-def generate_answer(question: str, context_chunks: List[str]) -> str:
-    prompt = ChatPromptTemplate.from_template(
-        """
+PROMPT = ChatPromptTemplate.from_template(
+    """
 You are a helpful software assistant answering questions about one or more GitLab repositories.
 Use the provided context to answer concisely in Russian. If the answer is not in the context, say you don't have enough information.
 
@@ -29,10 +25,56 @@ Context:
 
 Answer in Russian.
         """
-    )
-    chain = make_chain()
-    context = "\n\n".join(context_chunks[:8])
-    msg = prompt.format_messages(question=question, context=context)
-    out = chain.invoke(msg)
+)
+
+
+def make_chain() -> BaseChatModel:
+    api_key = settings.llm_api_key or settings.openai_api_key
+    base_url = settings.llm_base_url
+    model = settings.llm_model
+    return ChatOpenAI(api_key=api_key, base_url=base_url, model=model, temperature=0.1)
+
+
+_chat_model: Optional[BaseChatModel] = None
+_chat_lock = threading.Lock()
+
+
+def get_chat_model() -> BaseChatModel:
+    # One long-lived client: its HTTP connection pool is reused across answers instead of
+    # paying client construction and a new TLS handshake per question
+    global _chat_model
+    with _chat_lock:
+        if _chat_model is None:
+            _chat_model = make_chain()
+        return _chat_model
+
+
+def reset_chat_model() -> None:
+    # Settings changed (e.g. /setup/save): rebuild the client on next use
+    global _chat_model
+    with _chat_lock:
+        _chat_model = None
+
+
+def build_messages(question: str, context_chunks: List[str]) -> List[BaseMessage]:
+    context = "\n\n".join(context_chunks)
+    return PROMPT.format_messages(question=question, context=context)
+
+
+def count_prompt_tokens(question: str, context_chunks: List[str]) -> int:
+    # Counted with the LLM's encoding (estimated when it is unavailable), plus the few
+    # tokens of chat framing per message
+    tokenizer = context_tokenizer()
+    return sum(tokenizer.count(str(m.content)) + 4 for m in build_messages(question, context_chunks))
+
+
+def generate_answer(question: str, context_chunks: List[str]) -> str:
+    out = get_chat_model().invoke(build_messages(question, context_chunks))
     return out.content.strip()
 
+
+def stream_answer(question: str, context_chunks: List[str]) -> Iterator[str]:
+    # Yields completion text as the model produces it
+    for chunk in get_chat_model().stream(build_messages(question, context_chunks)):
+        if chunk.content:
+            yield chunk.content
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import json
+import re
+import shutil
+from array import array
+from collections import Counter
+from functools import lru_cache
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+# Something a user would only type when looking for an exact symbol
+_IDENT_RE = re.compile(r"^[A-Za-z_][\w.]*$")
+
+
+@lru_cache(maxsize=4096)
+def _word_tokens(word: str) -> Tuple[str, ...]:
+    lower = word.lower()
+    tokens = [lower] if len(lower) > 1 else []
+    if word.isascii():
+        parts = [p.lower() for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1)
+    return tuple(tokens)
+
+
+def tokenize(text: str) -> List[str]:
+    # Code-aware: an identifier yields itself plus its snake_case / camelCase parts,
+    # so "getUserName", "get_user_name" and "user name" all meet on "user" and "name"
+    tokens: List[str] = []
+    for word in _WORD_RE.findall(text):
+        tokens.extend(_word_tokens(word))
+    return tokens
+
+
+def is_identifier_query(query: str) -> bool:
+    # "MAX_RETRIES", "getUserName", "settings.redis_url": exact lookups where lexical
+    # search alone is enough and the embedding round trip can be skipped
+    words = query.strip().split()
+    if not words or len(words) > 3:
+        return False
+    for w in words:
+        # Sentence punctuation too: "Hello." must not pass as a dotted name
+        w = w.strip("`'\"?!.,:;()")
+        if not _IDENT_RE.match(w):
+            return False
+        if not ("_" in w or "." in w or (any(c.isupper() for c in w[1:]) and any(c.islower() for c in w))):
+            return False
+    return True
+
+
+def term_hash(token: str) -> int:
+    # Terms are stored as stable 64-bit hashes: no vocabulary of strings is held while
+    # building or serving, and collisions are negligible at repository scale
+    return int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+@lru_cache(maxsize=4096)
+def _word_hashes(word: str) -> Tuple[int, ...]:
+    return tuple(term_hash(t) for t in _word_tokens(word))
+
+
+def text_hashes(text: str) -> List[int]:
+    hashes: List[int] = []
+    for word in _WORD_RE.findall(text):
+        hashes.extend(_word_hashes(word))
+    return hashes
+
+
+# One posting while building: term hash, chunk id, term frequency
+_POSTING = np.dtype([("term", "<i8"), ("doc", "<i4"), ("tf", "<i4")])
+_ARRAYS = (("terms", "<i8"), ("offsets", "<i8"), ("doc_ids", "<i4"), ("impacts", "<f4"))
+# Kept so the next generation can merge postings instead of re-tokenizing every chunk: tf per
+# posting and token count per doc id (-1 for ids that are not in the index)
+_MERGE_ARRAYS = (("tfs", "<i4"), ("doc_lens", "<i4"))
+
+
+# BM25 over chunk ids with precomputed per-posting impacts (idf * saturated tf), stored in a
+# directory of .npy files that are memory-mapped, not read: the term with the i-th smallest
+# hash owns doc_ids/impacts[offsets[i]:offsets[i + 1]]. A query is a binary search per term
+# plus a few vectorised adds into a score array.
+class BM25Index:
+    def __init__(
+        self,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        impacts: np.ndarray,
+        n_docs: int,
+        tfs: Optional[np.ndarray] = None,
+        doc_lens: Optional[np.ndarray] = None,
+    ) -> None:
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.impacts = impacts
+        self.n_docs = n_docs
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+
+    @property
+    def mergeable(self) -> bool:
+        # False for indexes written before tf and lengths were kept
+        return self.tfs is not None and self.doc_lens is not None
+
+    @classmethod
+    def build(cls, path: Path, docs: Iterable[Tuple[int, str]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        builder = BM25Builder(path)
+        for doc_id, text in docs:
+            builder.add(doc_id, text)
+        return builder.finish(k1, b)
+
+    def _rows(self, query: str) -> List[int]:
+        hashes = np.fromiter(dict.fromkeys(text_hashes(query)), dtype="int64")
+        rows = np.searchsorted(self.terms, hashes)
+        found = rows < len(self.terms)
+        found[found] = self.terms[rows[found]] == hashes[found]
+        return rows[found].tolist()
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        rows = self._rows(query)
+        if not rows or not self.n_docs:
+            return []
+        scores = np.zeros(self.n_docs, dtype="float32")
+        for row in rows:
+            start, end = self.offsets[row], self.offsets[row + 1]
+            scores[self.doc_ids[start:end]] += self.impacts[start:end]
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        path = Path(path)
+        try:
+            with (path / "meta.json").open("r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = [np.load(path / f"{name}.npy", mmap_mode="r") for name, _ in _ARRAYS]
+        except FileNotFoundError:
+            return None
+        extra = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r")
+            for name, _ in _MERGE_ARRAYS
+            if (path / f"{name}.npy").exists()
+        }
+        return cls(*arrays, n_docs=int(meta["n_docs"]), **extra)
+
+
+class _NpyAppender:
+    # Writes a 1-d .npy whose length is only known at the end: raw data is appended to a
+    # side file and the header is put in front once, by a streaming copy
+    def __init__(self, path: Path, dtype: str) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._raw_path = path.with_name(path.name + ".raw")
+        self._raw = self._raw_path.open("wb")
+        self.count = 0
+
+    def write(self, values: np.ndarray) -> None:
+        self._raw.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.count += len(values)
+
+    def close(self) -> None:
+        self._raw.close()
+        with self.path.open("wb") as out, self._raw_path.open("rb") as raw:
+            header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (self.count,)}
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out, 1 << 20)
+        self._raw_path.unlink()
+
+
+class BM25Builder:
+    # Postings are spilled as documents stream in, partitioned by the top bits of the term
+    # hash. finish() then sorts one partition at a time (all postings of a term share a
+    # partition, and partitions are in hash order) and appends it to the output files, so
+    # memory stays at one spill buffer plus one partition however large the corpus is.
+    # With a `base` index (incremental updates) its postings are merged in partition by
+    # partition, minus the dropped doc ids: only added docs are tokenized, and impacts are
+    # recomputed from the stored tf, df and lengths, so they match a full rebuild.
+    def __init__(
+        self,
+        path: Path,
+        spill_postings: int = 1 << 18,
+        partition_bits: int = 6,
+        base: Optional[BM25Index] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.spill_postings = spill_postings
+        self.partition_bits = partition_bits
+        if base is not None and not base.mergeable:
+            raise ValueError("base index has no tf / doc lengths to merge")
+        self.base = base
+        self._cols = (array("q"), array("i"), array("i"))
+        self._len_doc = array("i")
+        self._len_val = array("i")
+        self._dropped = array("i")
+
+    def _spool(self, part: int) -> Path:
+        return self.path / f"postings.{part:03d}.spool"
+
+    def _partition(self, terms: np.ndarray) -> np.ndarray:
+        # Signed hashes: shifting maps them to partitions 0..2**bits-1 in hash order
+        return (terms >> (64 - self.partition_bits)) + (1 << (self.partition_bits - 1))
+
+    def _spill(self) -> None:
+        terms, docs, tfs = self._cols
+        if not terms:
+            return
+        rows = np.empty(len(terms), dtype=_POSTING)
+        rows["term"] = np.frombuffer(terms, dtype="int64")
+        rows["doc"] = np.frombuffer(docs, dtype="int32")
+        rows["tf"] = np.frombuffer(tfs, dtype="int32")
+        parts = self._partition(rows["term"])
+        for part in np.unique(parts):
+            with self._spool(int(part)).open("ab") as f:
+                rows[parts == part].tofile(f)
+        for col in self._cols:
+            del col[:]
+
+    def add(self, doc_id: int, text: str) -> None:
+        hashes = text_hashes(text)
+        self._len_doc.append(doc_id)
+        self._len_val.append(len(hashes))
+        terms, docs, tfs = self._cols
+        for h, count in Counter(hashes).items():
+            terms.append(h)
+            docs.append(doc_id)
+            tfs.append(count)
+        if len(terms) >= self.spill_postings:
+            self._spill()
+
+    def drop(self, doc_ids: Iterable[int]) -> None:
+        # Base docs that are not carried over (their chunks were replaced or removed)
+        self._dropped.extend(doc_ids)
+
+    def _base_rows(self, part: int, parts: np.ndarray, doc_len: np.ndarray) -> np.ndarray:
+        base = self.base
+        assert base is not None and base.tfs is not None
+        lo, hi = np.searchsorted(parts, [part, part + 1])
+        start, end = int(base.offsets[lo]), int(base.offsets[hi])
+        rows = np.empty(end - start, dtype=_POSTING)
+        rows["term"] = np.repeat(np.asarray(base.terms[lo:hi]), np.diff(base.offsets[lo : hi + 1]))
+        rows["doc"] = base.doc_ids[start:end]
+        rows["tf"] = base.tfs[start:end]
+        return rows[doc_len[rows["doc"]] >= 0]
+
+    def finish(self, k1: float = 1.2, b: float = 0.75) -> BM25Index:
+        self._spill()
+        len_doc = np.frombuffer(self._len_doc, dtype="int32")
+        n_docs = int(len_doc.max()) + 1 if len(len_doc) else 0
+        base_parts = None
+        if self.base is not None:
+            n_docs = max(n_docs, self.base.n_docs)
+        doc_len = np.full(n_docs, -1, dtype="int32")
+        if self.base is not None:
+            doc_len[: self.base.n_docs] = self.base.doc_lens
+            dropped = np.frombuffer(self._dropped, dtype="int32")
+            doc_len[dropped[dropped < n_docs]] = -1
+            base_parts = self._partition(np.asarray(self.base.terms))
+        doc_len[len_doc] = np.frombuffer(self._len_val, dtype="int32")
+        is_live = doc_len >= 0
+        live = max(1, int(is_live.sum()))
+        avgdl = float(doc_len[is_live].sum()) / live or 1.0
+        lengths = np.maximum(doc_len, 0).astype("float32")
+        out = {name: _NpyAppender(self.path / f"{name}.npy", dtype) for name, dtype in _ARRAYS + _MERGE_ARRAYS}
+        for part in range(1 << self.partition_bits):
+            spool = self._spool(part)
+            chunks = []
+            if spool.exists():
+                chunks.append(np.fromfile(spool, dtype=_POSTING))
+                spool.unlink()
+            if base_parts is not None:
+                chunks.append(self._base_rows(part, base_parts, doc_len))
+            rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=_POSTING)
+            if not len(rows):
+                continue
+            rows = rows[np.argsort(rows["term"], kind="stable")]
+            terms, starts, counts = np.unique(rows["term"], return_index=True, return_counts=True)
+            df = np.repeat(counts.astype("float32"), counts)
+            tf = rows["tf"].astype("float32")
+            idf = np.log1p((live - df + 0.5) / (df + 0.5))
+            impacts = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows["doc"]] / avgdl))
+            out["offsets"].write(starts + out["doc_ids"].count)
+            out["terms"].write(terms)
+            out["doc_ids"].write(rows["doc"])
+            out["impacts"].write(impacts)
+            out["tfs"].write(rows["tf"])
+        out["offsets"].write(np.array([out["doc_ids"].count]))
+        out["doc_lens"].write(doc_len)
+        for appender in out.values():
+            appender.close()
+        with (self.path / "meta.json").open("w", encoding="utf-8") as f:
+            json.dump({"n_docs": n_docs, "postings": out["doc_ids"].count, "k1": k1, "b": b}, f)
+        index = BM25Index.load(self.path)
+        assert index is not None
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
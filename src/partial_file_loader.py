@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Dict
+from hashlib import blake2b
+from typing import Iterable, Iterator, List, Dict, Set
+
+from .chunking import chunk_source
+from .config import settings
 
 
 EXCLUDE_EXTENSIONS = {
@@ -23,45 +27,40 @@ def should_skip(path: str) -> bool:
     return False
 
 
-def chunk_text(text: str, max_tokens: int = 1000, token_chars: int = 4) -> List[str]:
-    # Approximate token length by characters; default ~4 chars per token
-    max_chars = max_tokens * token_chars
-    if len(text) <= max_chars:
-        return [text]
-    paragraphs = text.split("\n\n")
-    chunks: List[str] = []
-    current: List[str] = []
-    current_len = 0
-    for para in paragraphs:
-        para_len = len(para) + 2  # account for the two newlines we will re-insert
-        if current_len + para_len > max_chars and current:
-            chunks.append("\n\n".join(current))
-            current = [para]
-            current_len = para_len
-        else:
-            current.append(para)
-            current_len += para_len
-    if current:
-        chunks.append("\n\n".join(current))
-    # If still too large (very long contiguous text), hard-split by chars
-    final: List[str] = []
-    for c in chunks:
-        if len(c) <= max_chars:
-            final.append(c)
-        else:
-            for i in range(0, len(c), max_chars):
-                final.append(c[i : i + max_chars])
-    return final
+def chunk_text(text: str, max_tokens: int | None = None, path: str = "") -> List[str]:
+    # Token-counted chunks cut at syntax boundaries picked by the file's extension
+    return chunk_source(
+        text,
+        path=path,
+        max_tokens=max_tokens or settings.chunk_max_tokens,
+        overlap_tokens=settings.chunk_overlap_tokens,
+    )
+
 
+def _fingerprint(chunk: str) -> int:
+    # Whitespace-insensitive, so re-indented copies of a license header match too
+    digest = blake2b(" ".join(chunk.split()).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
 
-def prepare_documents(files: Iterable[Dict[str, str]], max_tokens: int = 1000) -> List[Dict[str, str]]:
-    docs: List[Dict[str, str]] = []
+
+def iter_documents(files: Iterable[Dict[str, str]], max_tokens: int | None = None) -> Iterator[Dict[str, str]]:
+    # With CHUNK_DEDUPE, a chunk repeated inside one file (generated tables, copied blocks) is
+    # embedded once. Never across files: a chunk stored under one path would vanish for the
+    # others when that path changes, and incremental updates only ever see the diff.
+    # chunk_id is the chunk's position in the file, so a skipped copy leaves a gap in it.
     for f in files:
         path = f.get("path", "")
         if should_skip(path):
             continue
-        content = f.get("content", "")
-        for idx, chunk in enumerate(chunk_text(content, max_tokens=max_tokens)):
-            docs.append({"path": path, "chunk_id": str(idx), "text": chunk})
-    return docs
+        seen: Set[int] = set()
+        for n, chunk in enumerate(chunk_text(f.get("content", ""), max_tokens=max_tokens, path=path)):
+            if settings.chunk_dedupe:
+                key = _fingerprint(chunk)
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield {"path": path, "chunk_id": str(n), "text": chunk}
+
 
+def prepare_documents(files: Iterable[Dict[str, str]], max_tokens: int | None = None) -> List[Dict[str, str]]:
+    return list(iter_documents(files, max_tokens=max_tokens))
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from .config import settings
+from .shared_cache import MemoryCache
+from .utils import setup_logger
+from .vectorizer import embed_texts
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+
+# Collects calls that arrive within `window_ms` of the first one (up to `max_batch`) and
+# runs them as one `fn(items) -> results` call; each caller waits on its own future. A new
+# batch is only opened when one of `workers` slots is free, so while every slot is busy
+# requests keep piling into the next batch instead of queueing as singletons.
+class MicroBatcher:
+    def __init__(
+        self, fn: Callable[[List[Any]], Sequence[Any]], window_ms: float, max_batch: int = 64, workers: int = 1, name: str = "batch"
+    ) -> None:
+        self.fn = fn
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.workers = max(1, workers)
+        self.name = name
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._slots = threading.Semaphore(self.workers)
+        self._pool: ThreadPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def __call__(self, item: Any) -> Any:
+        if not self.enabled:
+            return self.fn([item])[0]
+        return self.submit(item).result()
+
+    def submit(self, item: Any) -> Future:
+        self._start()
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+                self._thread = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> None:
+        assert self._pool is not None
+        while True:
+            batch = [self._queue.get()]
+            self._slots.acquire()
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[Any, Future]]) -> None:
+        try:
+            results = self.fn([item for item, _ in batch])
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(result)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_seen = max(self.max_seen, len(batch))
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_seen,
+            }
+
+
+def _embed_batch(queries: List[str]) -> List[np.ndarray]:
+    # One embeddings request per batch; repeated questions inside a window are sent once
+    unique = list(dict.fromkeys(queries))
+    mat = np.array(embed_texts(unique, use_cache=False), dtype="float32")
+    faiss.normalize_L2(mat)
+    rows = {q: mat[i : i + 1] for i, q in enumerate(unique)}
+    return [rows[q] for q in queries]
+
+
+def _search_batch(items: List[Tuple[Any, np.ndarray, int]]) -> List[List[Tuple[int, float]]]:
+    # One index.search per loaded index with all its query rows stacked
+    groups: Dict[int, List[int]] = {}
+    for pos, (idx, _, _) in enumerate(items):
+        groups.setdefault(id(idx), []).append(pos)
+    out: List[List[Tuple[int, float]]] = [[] for _ in items]
+    for positions in groups.values():
+        idx = items[positions[0]][0]
+        k = max(items[p][2] for p in positions)
+        results = idx.search_vectors(np.vstack([items[p][1] for p in positions]), k)
+        for p, hits in zip(positions, results):
+            out[p] = hits[: items[p][2]]
+    return out
+
+
+class QueryEmbedder:
+    # LRU of normalised query vectors keyed by (model, question) in front of the batcher
+    def __init__(self, cache_size: int, ttl_seconds: int, batcher: MicroBatcher) -> None:
+        self.cache = MemoryCache(cache_size, ttl_seconds) if cache_size > 0 else None
+        self.batcher = batcher
+
+    def embed(self, query: str) -> np.ndarray:
+        key = f"{settings.embedding_model}\0{query}"
+        if self.cache is not None:
+            vec = self.cache.get(key)
+            if vec is not None:
+                return vec
+        vec = self.batcher(query)
+        if self.cache is not None:
+            self.cache.set(key, vec)
+        return vec
+
+    def clear(self) -> None:
+        if self.cache is not None:
+            self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": self.cache.stats() if self.cache is not None else None, "batching": self.batcher.stats()}
+
+
+query_embedder = QueryEmbedder(
+    settings.query_embedding_cache_size,
+    settings.query_embedding_cache_ttl_seconds,
+    MicroBatcher(
+        _embed_batch,
+        settings.query_batch_window_ms,
+        settings.query_batch_max_size,
+        workers=settings.embedding_max_in_flight,
+        name="query-embed",
+    ),
+)
+search_batcher = MicroBatcher(
+    _search_batch, settings.query_batch_window_ms, settings.query_batch_max_size, workers=2, name="query-search"
+)
+
+
+def batched_search(idx: Any, query_vec: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    return search_batcher((idx, query_vec, k))
@@ -1,50 +1,186 @@
 from __future__ import annotations
 
-from typing import Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
 
+import numpy as np
+
+from .answer_cache import answer_cache
 from .config import settings
-from .gitlab_api_handler import GitLabAPI
-from .structure_parser import parse_tree
 from .index_builder import FaissIndex
-from .langchain_chain import generate_answer
-from .utils import setup_logger
+from .index_registry import registry
+from .context_assembler import assemble_context
+from .langchain_chain import count_prompt_tokens, generate_answer, stream_answer
+from .lexical_index import is_identifier_query, reciprocal_rank_fusion
+from .query_batcher import batched_search
+from .utils import LatencyRecorder, setup_logger
 
 
 logger = setup_logger(__name__, settings.log_level)
+ttfb_recorder = LatencyRecorder()
+llm_recorder = LatencyRecorder()
+
+
+def _hits(idx: FaissIndex, project_id: str, ranked: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    hits: List[Dict[str, Any]] = []
+    for i, score in ranked:
+        rec = idx.get_chunk(i)
+        if rec and rec.get("text"):
+            hit = {"project": project_id, "path": rec.get("path", ""), "score": score, "text": rec["text"], "id": i}
+            if str(rec.get("chunk_id", "")).isdigit():
+                hit["pos"] = int(rec["chunk_id"])
+            hits.append(hit)
+    return hits
+
+
+def _search_project(project_id: str, query_vec: np.ndarray, k: int, ref: str) -> List[Dict[str, Any]]:
+    # Federated searches hit different indexes in parallel, so there is nothing to batch
+    idx = registry.get(project_id, ref)
+    return _hits(idx, project_id, idx.search_vector(query_vec, k=k))
+
+
+def _lexical_only(question: str) -> bool:
+    mode = settings.retrieval_mode
+    return mode == "lexical" or (mode == "hybrid" and is_identifier_query(question))
+
+
+def _hybrid_search(
+    project_id: str, question: str, k: int, ref: str, query_vec: np.ndarray | None = None
+) -> List[Dict[str, Any]]:
+    # BM25 and vector rankings fused by reciprocal rank; identifier lookups stop after BM25
+    # and never touch the embedding API. Falls back to vector-only when BM25 finds nothing
+    # or the generation predates the lexical index.
+    idx = registry.get(project_id, ref)
+    lexical = idx.search_lexical(question, k=2 * k) if settings.retrieval_mode != "vector" else []
+    if lexical and _lexical_only(question):
+        return _hits(idx, project_id, lexical[:k])
+    if query_vec is None:
+        query_vec = FaissIndex.embed_query(question)
+    vector = batched_search(idx, query_vec, 2 * k if lexical else k)
+    if not lexical:
+        return _hits(idx, project_id, vector[:k])
+    fused = reciprocal_rank_fusion([[i for i, _ in vector], [i for i, _ in lexical]], k=settings.rrf_k)
+    return _hits(idx, project_id, fused[:k])
+
+
+def _sources(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{"project": h["project"], "path": h["path"], "score": round(h["score"], 4)} for h in hits]
+
 
+def _context(hits: List[Dict[str, Any]], with_project: bool = False) -> List[Dict[str, Any]]:
+    # Neighbouring/overlapping chunks merged, MMR-picked within CONTEXT_MAX_TOKENS; each
+    # block is labelled with its file so the model can cite it
+    blocks = assemble_context(hits)
+    for b in blocks:
+        label = f"[{b['project']}] {b['path']}" if with_project else b["path"]
+        b["context"] = f"{label}\n{b['text']}"
+    return blocks
 
-def _collect_context_from_index(project_id: str, question: str, k: int = 6) -> List[str]:
-    index_path = f"{settings.index_dir}/{project_id.replace('/', '_')}.faiss"
-    idx = FaissIndex(index_path)
-    hits = idx.search(question, k=k)
-    chunks: List[str] = []
-    for i, score in hits:
-        text = idx.get_chunk_text(i)
-        if text:
-            chunks.append(text)
-    return chunks
-
-
-def answer_question(project_id: str, question: str, ref: str = "HEAD") -> Dict[str, str]:
-    api = GitLabAPI()
-    tree = api.get_repository_tree(project_id, ref=ref)
-    parsed = parse_tree(tree)
-
-    # Heuristic quick hits from structure
-    structure_hits: List[str] = []
-    if "readme" in question.lower():
-        structure_hits.extend(parsed.get("key_files", []))
-    if "конфигурац" in question.lower() or "config" in question.lower():
-        structure_hits.extend(parsed.get("configs", []))
-
-    # Vector index search
-    index_context = []
+
+def _retrieve(
+    project_id: str, question: str, ref: str = "HEAD", k: int | None = None, query_vec: np.ndarray | None = None
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    hits: List[Dict[str, Any]] = []
     try:
-        index_context = _collect_context_from_index(project_id, question)
+        hits = _hybrid_search(project_id, question, k or settings.context_candidates, ref, query_vec=query_vec)
     except Exception as e:
         logger.warning("Index search failed: %s", e)
+    blocks = _context(hits)
+    return [b["context"] for b in blocks], _sources(blocks)
+
 
-    context_chunks = [*(f"STRUCT: {p}" for p in structure_hits[:10]), *index_context]
+def _generate(question: str, context_chunks: List[str], retrieval_ms: float) -> Tuple[str, Dict[str, Any]]:
+    start = time.perf_counter()
     answer = generate_answer(question, context_chunks)
-    return {"answer": answer}
+    llm_ms = (time.perf_counter() - start) * 1000
+    llm_recorder.record(llm_ms)
+    usage = {
+        "prompt_tokens": count_prompt_tokens(question, context_chunks),
+        "context_chunks": len(context_chunks),
+        "retrieval_ms": round(retrieval_ms, 2),
+        "llm_ms": round(llm_ms, 2),
+    }
+    return answer, usage
+
+
+def answer_question(project_id: str, question: str, ref: str = "HEAD") -> Dict[str, Any]:
+    generation = None
+    query_vec = None
+    if settings.answer_cache_enabled:
+        try:
+            generation = registry.get(project_id, ref).generation
+        except Exception:
+            generation = None  # no index yet: nothing to key the cache on
+    if generation is not None:
+        cached = answer_cache.get(project_id, ref, generation, question)
+        if cached is not None:
+            return {**cached, "cached": "exact"}
+        if not _lexical_only(question):
+            try:
+                query_vec = FaissIndex.embed_query(question)
+            except Exception as e:
+                logger.warning("Query embedding failed: %s", e)
+        if query_vec is not None:
+            cached = answer_cache.get_similar(project_id, ref, generation, query_vec)
+            if cached is not None:
+                return {**cached, "cached": "semantic"}
+
+    start = time.perf_counter()
+    context_chunks, sources = _retrieve(project_id, question, ref=ref, query_vec=query_vec)
+    answer, usage = _generate(question, context_chunks, (time.perf_counter() - start) * 1000)
+    result = {"answer": answer, "sources": sources}
+    if generation is not None:
+        answer_cache.put(project_id, ref, generation, question, result, query_vec)
+    return {**result, "cached": False, "usage": usage}
+
+
+def stream_answer_events(project_id: str, question: str, ref: str = "HEAD") -> Iterator[Dict[str, Any]]:
+    # meta (sources) -> token* -> done (timings); ttfb is measured from the start of retrieval
+    start = time.perf_counter()
+    context_chunks, sources = _retrieve(project_id, question, ref=ref)
+    yield {"event": "meta", "data": {"project": project_id, "sources": sources}}
+    ttfb_ms: float | None = None
+    try:
+        for token in stream_answer(question, context_chunks):
+            if ttfb_ms is None:
+                ttfb_ms = (time.perf_counter() - start) * 1000
+                ttfb_recorder.record(ttfb_ms)
+            yield {"event": "token", "data": token}
+    except Exception as e:
+        logger.error("Streaming answer failed: %s", e)
+        yield {"event": "error", "data": {"error": str(e)}}
+    total_ms = (time.perf_counter() - start) * 1000
+    yield {
+        "event": "done",
+        "data": {
+            "ttfb_ms": round(ttfb_ms, 2) if ttfb_ms is not None else None,
+            "total_ms": round(total_ms, 2),
+            "prompt_tokens": count_prompt_tokens(question, context_chunks),
+        },
+    }
+
+
+def answer_question_multi(project_ids: List[str], question: str, k: int = 8, ref: str = "HEAD") -> Dict[str, Any]:
+    # One query embedding, per-project searches in parallel (FAISS releases the GIL),
+    # then a global top-k by cosine score
+    projects = list(dict.fromkeys(project_ids))
+    hits: List[Dict[str, Any]] = []
+    searched: List[str] = []
+    start = time.perf_counter()
+    if projects:
+        query_vec = FaissIndex.embed_query(question)
+        workers = max(1, min(len(projects), settings.federated_max_workers))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [(p, ex.submit(_search_project, p, query_vec, k, ref)) for p in projects]
+            for p, fut in futures:
+                try:
+                    hits.extend(fut.result())
+                    searched.append(p)
+                except Exception as e:
+                    logger.warning("Index search failed for %s: %s", p, e)
 
+    blocks = _context(sorted(hits, key=lambda h: h["score"], reverse=True)[:k], with_project=True)
+    context_chunks = [b["context"] for b in blocks]
+    answer, usage = _generate(question, context_chunks, (time.perf_counter() - start) * 1000)
+    return {"answer": answer, "projects": searched, "sources": _sources(blocks), "usage": usage}
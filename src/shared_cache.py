@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from .config import settings
+from .utils import CacheBackend, TTLFileCache, pack_cache_entry, setup_logger, unpack_cache_value
+
+
+logger = setup_logger(__name__, settings.log_level)
+
+
+class MemoryCache(CacheBackend):
+    # Per-process LRU with TTL; the L1 in front of Redis
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 60) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() > entry[0]:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache(CacheBackend):
+    # Values use the same compact encoding as the disk cache; expiry is left to Redis.
+    # Connection errors propagate so TieredCache can fail over.
+    def __init__(
+        self,
+        client: "redis.Redis",
+        default_ttl_seconds: int = 86400,
+        prefix: str = "gitlab-rag:",
+        compress_min_bytes: int = 1024,
+        batch_size: int = 500,
+    ) -> None:
+        self.client = client
+        self.default_ttl_seconds = default_ttl_seconds
+        self.prefix = prefix
+        self.compress_min_bytes = compress_min_bytes
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def _decode(self, data: Optional[bytes]) -> Optional[Any]:
+        if data is None:
+            self.misses += 1
+            return None
+        try:
+            value = unpack_cache_value(data)
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._decode(self.client.get(self.prefix + key))
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds
+        data = pack_cache_entry(value, time.time() + ttl, self.compress_min_bytes)
+        self.client.set(self.prefix + key, data, ex=max(1, int(ttl)))
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        # One round trip per batch instead of one per key
+        out: Dict[str, Any] = {}
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i : i + self.batch_size]
+            pipe = self.client.pipeline(transaction=False)
+            for key in batch:
+                pipe.get(self.prefix + key)
+            for key, data in zip(batch, pipe.execute()):
+                value = self._decode(data)
+                if value is not None:
+                    out[key] = value
+        return out
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class TieredCache(CacheBackend):
+    # L1 memory -> L2 Redis shared by all workers; while Redis is unreachable reads and
+    # writes go to the local disk cache and Redis is retried after `retry_seconds`
+    def __init__(
+        self, l1: MemoryCache, l2: RedisCache, fallback: TTLFileCache, retry_seconds: float = 30
+    ) -> None:
+        self.l1 = l1
+        self.l2 = l2
+        self.fallback = fallback
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+        self.redis_errors = 0
+
+    @property
+    def redis_available(self) -> bool:
+        return time.time() >= self._down_until
+
+    def _redis_failed(self, e: Exception) -> None:
+        if self.redis_available:
+            logger.warning("Redis cache unavailable, using disk cache: %s", e)
+        self.redis_errors += 1
+        self._down_until = time.time() + self.retry_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+        if self.redis_available:
+            try:
+                value = self.l2.get(key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+                value = self.fallback.get(key)
+        else:
+            value = self.fallback.get(key)
+        if value is not None:
+            self.l1.set(key, value)
+        return value
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self.l1.get(key)
+            if value is not None:
+                out[key] = value
+            else:
+                missing.append(key)
+        if not missing:
+            return out
+        found: Dict[str, Any] = {}
+        if self.redis_available:
+            try:
+                found = self.l2.get_many(missing)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+                found = self.fallback.get_many(missing)
+        else:
+            found = self.fallback.get_many(missing)
+        for key, value in found.items():
+            self.l1.set(key, value)
+        out.update(found)
+        return out
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        self.l1.set(key, value, ttl_seconds)
+        if self.redis_available:
+            try:
+                self.l2.set(key, value, ttl_seconds)
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        self.fallback.set(key, value, ttl_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "redis_available": self.redis_available,
+            "redis_errors": self.redis_errors,
+            "l1": self.l1.stats(),
+            "l2": self.l2.stats(),
+            "disk": self.fallback.stats(),
+        }
+
+    def close(self) -> None:
+        self.fallback.close()
+
+
+def make_cache() -> CacheBackend:
+    disk = TTLFileCache(
+        settings.cache_dir,
+        settings.cache_ttl_seconds,
+        max_bytes=settings.cache_max_bytes,
+        max_entries=settings.cache_max_entries,
+        policy=settings.cache_eviction_policy,
+        sweep_interval_seconds=settings.cache_sweep_interval_seconds,
+        compress_min_bytes=settings.cache_compress_min_bytes,
+    )
+    if not settings.redis_url:
+        return disk
+    client = redis.Redis.from_url(
+        settings.redis_url, socket_timeout=settings.redis_timeout_seconds, socket_connect_timeout=settings.redis_timeout_seconds
+    )
+    return TieredCache(
+        MemoryCache(settings.cache_l1_max_entries, settings.cache_l1_ttl_seconds),
+        RedisCache(client, settings.cache_ttl_seconds, compress_min_bytes=settings.cache_compress_min_bytes),
+        disk,
+    )
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List
 
 
 KEY_FILENAMES = {
@@ -19,7 +19,7 @@ KEY_FILENAMES = {
 CONFIG_PATTERNS = ("config", "settings", "application.yml", "application.yaml", "application.properties")
 
 
-def parse_tree(tree_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+def parse_tree(tree_items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
     key_files: List[str] = []
     modules: List[str] = []
     configs: List[str] = []
@@ -2,9 +2,13 @@ import hashlib
 import json
 import logging
 import os
+import struct
+import threading
 import time
+import zlib
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
@@ -26,43 +30,353 @@ def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
     return logger
 
 
-class TTLFileCache:
-    def __init__(self, base_dir: str, default_ttl_seconds: int = 86400) -> None:
+_CACHE_MAGIC = b"TTC1"
+_CACHE_HEADER = struct.Struct("<4sBd")  # magic, flags, expires_at
+_FLAG_ZLIB = 1
+
+
+def pack_cache_entry(value: Any, expires_at: float, compress_min_bytes: int = 1024) -> bytes:
+    # Header (magic, flags, expires_at) + JSON, zlib-compressed when that pays off
+    payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    flags = 0
+    if len(payload) >= compress_min_bytes:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload = compressed
+            flags |= _FLAG_ZLIB
+    return _CACHE_HEADER.pack(_CACHE_MAGIC, flags, expires_at) + payload
+
+
+def unpack_cache_expiry(data: bytes) -> float:
+    magic, _, expires_at = _CACHE_HEADER.unpack_from(data)
+    if magic != _CACHE_MAGIC:
+        raise ValueError("bad cache header")
+    return expires_at
+
+
+def unpack_cache_value(data: bytes) -> Any:
+    _, flags, _ = _CACHE_HEADER.unpack_from(data)
+    payload = data[_CACHE_HEADER.size :]
+    if flags & _FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class CacheBackend:
+    # get/set interface shared by the disk, memory, Redis and tiered caches
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                out[key] = value
+        return out
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+class TTLFileCache(CacheBackend):
+    # Values live in <base>/<h[:2]>/<h[2:4]>/<h>.bin: a small binary header followed by JSON,
+    # zlib-compressed when large. An in-process LRU/LFU index enforces entry and byte budgets;
+    # a daemon sweeper drops expired entries so they don't wait for a read. Background work
+    # starts on first use, not at construction, so importing a module-level cache (tests,
+    # the CLI) spawns no thread; the directory is indexed there too, never in a request.
+    def __init__(
+        self,
+        base_dir: str,
+        default_ttl_seconds: int = 86400,
+        max_bytes: int = 0,
+        max_entries: int = 0,
+        policy: str = "lru",
+        sweep_interval_seconds: float = 0,
+        compress_min_bytes: int = 1024,
+    ) -> None:
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
         self.default_ttl_seconds = default_ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = policy.lower()
+        self.compress_min_bytes = compress_min_bytes
+        # hashed key -> [size, expires_at, hits]; order is recency for LRU
+        self._index: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+        self._scanned = False
+        self._scan_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._indexed = threading.Event()
+        self._stop = threading.Event()
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._sweeper: Optional[threading.Thread] = None
+        self._started = False
+
+    def _start_background(self) -> None:
+        # The sweeper's first pass indexes the directory. Without a sweeper, a budget still
+        # needs that index: a one-off thread builds it and then enforces the budget.
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            if self.sweep_interval_seconds > 0:
+                target, args, name = self._sweep_loop, (self.sweep_interval_seconds,), "ttl-cache-sweeper"
+            elif self.max_bytes or self.max_entries:
+                target, args, name = self._index_and_enforce, (), "ttl-cache-index"
+            else:
+                return
+            self._sweeper = threading.Thread(target=target, args=args, name=name, daemon=True)
+            self._sweeper.start()
+
+    @staticmethod
+    def _hash(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _hash_to_path(self, hashed: str) -> Path:
+        return self.base_dir / hashed[:2] / hashed[2:4] / f"{hashed}.bin"
 
     def _key_to_path(self, key: str) -> Path:
-        hashed = hashlib.sha256(key.encode("utf-8")).hexdigest()
-        return self.base_dir / f"{hashed}.json"
+        return self._hash_to_path(self._hash(key))
+
+    def _forget_locked(self, hashed: str) -> None:
+        entry = self._index.pop(hashed, None)
+        if entry is not None:
+            self._bytes -= entry[0]
+
+    def _remove(self, hashed: str) -> None:
+        with self._lock:
+            self._forget_locked(hashed)
+        try:
+            self._hash_to_path(hashed).unlink(missing_ok=True)
+        except OSError:
+            pass
 
     def get(self, key: str) -> Optional[Any]:
-        path = self._key_to_path(key)
-        if not path.exists():
+        self._start_background()
+        hashed = self._hash(key)
+        try:
+            with self._hash_to_path(hashed).open("rb") as f:
+                data = f.read()
+            expires_at = unpack_cache_expiry(data)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._forget_locked(hashed)
+            return None
+        except Exception:
+            self._remove(hashed)
+            with self._lock:
+                self.misses += 1
+            return None
+        if time.time() > expires_at:
+            self._remove(hashed)
+            with self._lock:
+                self.expired += 1
+                self.misses += 1
             return None
         try:
-            with path.open("r", encoding="utf-8") as f:
-                payload = json.load(f)
-            expires_at = payload.get("expires_at", 0)
-            if time.time() > expires_at:
-                # expired
-                try:
-                    path.unlink(missing_ok=True)
-                except Exception:
-                    pass
-                return None
-            return payload.get("value")
+            value = unpack_cache_value(data)
         except Exception:
+            self._remove(hashed)
+            with self._lock:
+                self.misses += 1
             return None
+        with self._lock:
+            self.hits += 1
+            entry = self._index.get(hashed)
+            if entry is None:
+                entry = [len(data), expires_at, 0]
+                self._index[hashed] = entry
+                self._bytes += len(data)
+            entry[2] += 1
+            self._index.move_to_end(hashed)
+        return value
 
     def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
         ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds
-        path = self._key_to_path(key)
-        payload = {"value": value, "expires_at": time.time() + ttl}
-        tmp_path = path.with_suffix(".tmp")
-        with tmp_path.open("w", encoding="utf-8") as f:
-            json.dump(payload, f)
+        expires_at = time.time() + ttl
+        data = pack_cache_entry(value, expires_at, self.compress_min_bytes)
+
+        hashed = self._hash(key)
+        path = self._hash_to_path(hashed)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open("wb") as f:
+            f.write(data)
         os.replace(tmp_path, path)
+        # The budget counts what is already on disk: until the background index is built,
+        # entries are only recorded and the budget is enforced once it is
+        self._start_background()
+        with self._lock:
+            self._forget_locked(hashed)
+            self._index[hashed] = [len(data), expires_at, 0]
+            self._bytes += len(data)
+            if self._scanned:
+                self._enforce_budget_locked()
+
+    def _over_budget_locked(self, slack: float = 1.0) -> bool:
+        return bool(
+            (self.max_entries and len(self._index) > self.max_entries * slack)
+            or (self.max_bytes and self._bytes > self.max_bytes * slack)
+        )
+
+    def _enforce_budget_locked(self) -> None:
+        if not self._over_budget_locked():
+            return
+        # Evict down to 90% so eviction is amortised over many sets
+        victims: List[str] = []
+        if self.policy == "lfu":
+            ordered = sorted(self._index.items(), key=lambda kv: kv[1][2])
+            candidates = iter(h for h, _ in ordered)
+        else:
+            candidates = iter(list(self._index.keys()))
+        for hashed in candidates:
+            if not self._over_budget_locked(0.9):
+                break
+            victims.append(hashed)
+            self._forget_locked(hashed)
+            self.evictions += 1
+        for hashed in victims:
+            try:
+                self._hash_to_path(hashed).unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def _scan(self) -> None:
+        # Build the index from disk once: order by mtime so LRU starts from write order
+        found: List[tuple] = []
+        for shard in self.base_dir.iterdir():
+            if shard.is_file():
+                # flat "<sha256>.json" files from the previous cache layout
+                if shard.suffix in (".json", ".tmp") and len(shard.stem) == 64:
+                    shard.unlink(missing_ok=True)
+                continue
+            if len(shard.name) != 2:
+                continue
+            for sub in shard.iterdir():
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub):
+                    if not entry.name.endswith(".bin"):
+                        continue
+                    try:
+                        st = entry.stat()
+                        with open(entry.path, "rb") as f:
+                            _, _, expires_at = _CACHE_HEADER.unpack(f.read(_CACHE_HEADER.size))
+                    except Exception:
+                        continue
+                    found.append((st.st_mtime, entry.name[:-4], st.st_size, expires_at))
+        found.sort()
+        with self._lock:
+            known = self._index
+            self._index = OrderedDict()
+            self._bytes = 0
+            for _, hashed, size, expires_at in found:
+                if hashed not in known:
+                    self._index[hashed] = [size, expires_at, 0]
+                    self._bytes += size
+            for hashed, entry in known.items():  # touched since start: most recent
+                self._index[hashed] = entry
+                self._bytes += entry[0]
+            self._scanned = True
+
+    def _ensure_scanned(self) -> None:
+        if self._scanned:
+            return
+        with self._scan_lock:
+            if not self._scanned:
+                self._scan()
+
+    def _index_and_enforce(self) -> None:
+        try:
+            self._ensure_scanned()
+        except Exception:
+            logging.getLogger(__name__).exception("Cache index scan failed")
+            return
+        with self._lock:
+            self._enforce_budget_locked()
+        self._indexed.set()
+
+    def wait_indexed(self, timeout: Optional[float] = None) -> bool:
+        # True once the directory is indexed and the budget applied to it
+        return self._indexed.wait(timeout)
+
+    def sweep(self) -> int:
+        self._ensure_scanned()
+        now = time.time()
+        with self._lock:
+            expired = [h for h, e in self._index.items() if e[1] < now]
+        for hashed in expired:
+            self._remove(hashed)
+        with self._lock:
+            self.expired += len(expired)
+            self._enforce_budget_locked()
+        self._indexed.set()
+        return len(expired)
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception:
+                logging.getLogger(__name__).exception("Cache sweep failed")
+            self._stop.wait(interval)
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "indexed": self._scanned,
+            }
+
+
+class LatencyRecorder:
+    # Rolling window of latencies (ms) with percentile summary for /stats
+    def __init__(self, maxlen: int = 1000) -> None:
+        self._values: deque[float] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self._values.append(ms)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            values = sorted(self._values)
+            count = self.count
+        if not values:
+            return {"count": count}
+
+        def pct(p: float) -> float:
+            return round(values[min(len(values) - 1, int(p * len(values)))], 2)
+
+        return {"count": count, "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(values[-1], 2)}
 
 
 def json_dumps(obj: Any) -> str:
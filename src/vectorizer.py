@@ -1,19 +1,45 @@
 from __future__ import annotations
 
-from typing import List
-
-from langchain_openai import OpenAIEmbeddings
+from functools import lru_cache
+from typing import List, Optional
 
 from .config import settings
+from .embedding_cache import EmbeddingCache, EmbeddingCacheStats, lookup
+from .embedding_pipeline import get_pipeline
+
+
+@lru_cache(maxsize=4)
+def _cache_for(path: str) -> EmbeddingCache:
+    return EmbeddingCache(path)
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    if not settings.embedding_cache_enabled:
+        return None
+    return _cache_for(settings.embedding_cache_path or f"{settings.cache_dir}/embeddings.sqlite")
 
 
-def get_embeddings() -> OpenAIEmbeddings:
-    api_key = settings.embedding_api_key or settings.openai_api_key or settings.llm_api_key
-    base_url = settings.embedding_base_url or settings.llm_base_url
-    return OpenAIEmbeddings(api_key=api_key, base_url=base_url, model=settings.embedding_model)
+def _embed_uncached(texts: List[str]) -> List[List[float]]:
+    return get_pipeline().embed(texts)
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    embeddings = get_embeddings()
-    return embeddings.embed_documents(texts)
+def embed_texts(
+    texts: List[str],
+    stats: Optional[EmbeddingCacheStats] = None,
+    use_cache: bool = True,
+) -> List[List[float]]:
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None or not texts:
+        return _embed_uncached(texts) if texts else []
 
+    model = settings.embedding_model
+    vectors, missing, digests = lookup(cache, model, texts, stats)
+    if missing:
+        fresh = _embed_uncached([texts[i] for i in missing])
+        cache.put_many(model, ((digests[i], vec) for i, vec in zip(missing, fresh)))
+        by_digest = {digests[i]: vec for i, vec in zip(missing, fresh)}
+        return [
+            v.tolist() if v is not None else list(by_digest[d])
+            for v, d in zip(vectors, digests)
+        ]
+    return [v.tolist() for v in vectors]  # type: ignore[union-attr]
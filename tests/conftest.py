@@ -1,7 +1,31 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(autouse=True)
+def _fresh_query_embeddings():
+    # Tests swap the embedding backend; a question embedded by one must not leak into another
+    from src.query_batcher import query_embedder
+
+    query_embedder.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def _offline_chat_and_tokenizer(monkeypatch):
+    # Token counts use the regex estimate (tiktoken would download its BPE file), and a
+    # client cached by one test must not outlive the make_chain it was patched with
+    from src import langchain_chain
+    from src.config import settings
+
+    monkeypatch.setattr(settings, "chunk_tokenizer", "approx")
+    langchain_chain.reset_chat_model()
+    yield
+    langchain_chain.reset_chat_model()
@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.answer_cache import AnswerCache
+
+
+def _unit(*values):
+    v = np.array(values, dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+def test_exact_semantic_and_generation_keys():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.95)
+    cache.put("g/p", "HEAD", 1, "How to run?", {"answer": "make run"}, _unit(1, 0, 0))
+
+    assert cache.get("g/p", "HEAD", 1, "  how TO run? ") == {"answer": "make run"}
+    assert cache.get_similar("g/p", "HEAD", 1, _unit(1, 0.1, 0)) == {"answer": "make run"}
+    assert cache.get_similar("g/p", "HEAD", 1, _unit(0, 1, 0)) is None
+    # a rebuilt index has a new generation, so old answers never match
+    assert cache.get("g/p", "HEAD", 2, "How to run?") is None
+    assert cache.get_similar("g/p", "HEAD", 2, _unit(1, 0, 0)) is None
+
+    cache.put("g/p", "HEAD", 1, "q2", {"answer": "2"})
+    cache.put("g/p", "HEAD", 1, "q3", {"answer": "3"})
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["exact_hits"] == 1 and stats["semantic_hits"] == 1
+
+
+def test_ttl_expiry_and_invalidate():
+    cache = AnswerCache(ttl_seconds=-1)
+    cache.put("g/p", "HEAD", 1, "q", {"answer": "a"})
+    assert cache.get("g/p", "HEAD", 1, "q") is None
+    cache = AnswerCache()
+    cache.put("g/p", "HEAD", 1, "q", {"answer": "a"})
+    cache.invalidate("g/p")
+    assert cache.stats()["entries"] == 0
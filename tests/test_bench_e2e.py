@@ -0,0 +1,30 @@
+from benchmarks.bench_e2e import compare, measure
+
+
+def _stage(p50=10.0, p99=20.0, throughput=100.0, peak_mb=200.0):
+    return {"n": 10, "throughput": throughput, "p50_ms": p50, "p95_ms": p99, "p99_ms": p99, "peak_mb": peak_mb}
+
+
+def test_compare_flags_only_regressions_past_threshold_and_noise_floor():
+    baseline = {"stages": {"ask": _stage(), "rebuild": _stage(p50=900.0, p99=1000.0), "gone": _stage()}}
+    results = {
+        "stages": {
+            # +50% but only 1 ms slower: noise
+            "ask": _stage(p50=0.5, p99=21.0, throughput=90.0),
+            "rebuild": _stage(p50=1200.0, p99=1100.0, throughput=60.0, peak_mb=260.0),
+        }
+    }
+    assert compare(results, baseline, threshold=0.25) == [
+        "rebuild.p50_ms: 900.0 -> 1200.0",
+        "rebuild.peak_mb: 200.0 -> 260.0",
+        "rebuild.throughput: 100.0 -> 60.0",
+        "gone: missing from this run",
+    ]
+    assert compare(results, {"stages": {"ask": _stage()}}, threshold=0.25) == []
+
+
+def test_measure_reports_latency_percentiles_and_throughput():
+    stage = measure(lambda x: sum(range(x)), [1000] * 20, clients=2, units=3)
+    assert stage["n"] == 20
+    assert 0 <= stage["p50_ms"] <= stage["p95_ms"] <= stage["p99_ms"]
+    assert stage["throughput"] > 0 and stage["peak_mb"] > 0
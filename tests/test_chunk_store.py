@@ -0,0 +1,23 @@
+import json
+
+from src.chunk_store import ChunkStore
+from src.index_builder import FaissIndex
+
+
+def test_chunk_store_roundtrip(tmp_path):
+    store = ChunkStore(tmp_path / "p.faiss")
+    docs = [{"path": f"f{i}.py", "chunk_id": "0", "text": f"текст {i}"} for i in range(3)]
+    assert store.write(docs) == 3
+    assert len(store) == 3
+    assert store.get(1) == docs[1]
+    assert store.get_text(2) == "текст 2"
+    assert store.get(3) is None
+
+
+def test_legacy_meta_json_is_migrated(tmp_path):
+    meta_path = tmp_path / "p.meta.json"
+    meta_path.write_text(json.dumps([{"path": "a.py", "chunk_id": "0", "text": "hello"}]), encoding="utf-8")
+    idx = FaissIndex(str(tmp_path / "p.faiss"))
+    assert idx.get_chunk_text(0) == "hello"
+    assert not meta_path.exists()
+    assert idx.chunks.exists()
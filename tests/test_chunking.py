@@ -0,0 +1,76 @@
+from src.chunking import Tokenizer, chunk_source, get_tokenizer
+from src.config import settings
+from src.partial_file_loader import iter_documents
+
+
+APPROX = Tokenizer()
+
+
+def _py_module(n: int) -> str:
+    methods = "".join(
+        f"    # handler {i}\n    @route('/r{i}')\n    def handle_{i}(self, request):\n"
+        f"        value = request.args.get('v{i}')\n        if value is None:\n"
+        f"            return None\n        return value * {i}\n\n"
+        for i in range(n)
+    )
+    return f"import os\n\n\nclass Handlers:\n    prefix = '/api'\n\n{methods}\ndef main():\n    return Handlers()\n"
+
+
+def test_python_chunks_cut_between_definitions():
+    text = _py_module(12)
+    chunks = chunk_source(text, "app/handlers.py", max_tokens=120, tokenizer=APPROX)
+    assert "".join(chunks) == text and len(chunks) > 3
+    assert all(APPROX.count(c) <= 120 for c in chunks)
+    for chunk in chunks[1:]:
+        # every cut lands on a method's leading comment or on the module-level def
+        assert chunk.startswith(("    # handler", "def main"))
+
+
+def test_brace_chunks_keep_functions_whole():
+    funcs = "".join(
+        f"// Handle{i} serves route {i}.\nfunc Handle{i}(w Writer, id string) {{\n"
+        f"\tif id == \"\" {{\n\t\treturn\n\t}}\n\tw.Write(id + \"{{\")\n}}\n\n"
+        for i in range(10)
+    )
+    text = "package api\n\n" + funcs
+    chunks = chunk_source(text, "api/handlers.go", max_tokens=80, tokenizer=APPROX)
+    assert "".join(chunks) == text
+    for chunk in chunks:
+        assert chunk.count("func ") == chunk.rstrip().count("\n}")
+        assert APPROX.count(chunk) <= 80
+
+
+def test_overlap_repeats_tail_lines_within_budget():
+    text = "".join(f"line {i} of the notes file\n" for i in range(60))
+    plain = chunk_source(text, "notes.txt", max_tokens=50, tokenizer=APPROX)
+    overlapped = chunk_source(text, "notes.txt", max_tokens=50, overlap_tokens=10, tokenizer=APPROX)
+    assert "".join(plain) == text
+    assert len(overlapped) > len(plain)
+    for prev, chunk in zip(overlapped, overlapped[1:]):
+        assert chunk.startswith(prev.splitlines(keepends=True)[-1])
+    assert all(APPROX.count(c) <= 50 for c in overlapped)
+
+
+def test_documents_skip_repeats_within_a_file_only(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_tokenizer", "approx")
+    monkeypatch.setattr(settings, "chunk_dedupe", True)
+    header = "# Copyright (c) Example Corp.\n# Licensed under the Apache License, Version 2.0.\n\n"
+    table = "".join(f"ROW_{i} = {i}\n" for i in range(40)) + "\n\n"
+    files = [
+        {"path": "a.py", "content": header + "".join(f"def a{i}():\n    return {i}\n\n\n" for i in range(20))},
+        {"path": "b.py", "content": header + "".join(f"def b{i}():\n    return {i}\n\n\n" for i in range(20))},
+        {"path": "gen.py", "content": table + "def middle():\n    pass\n\n\n" + table},
+        {"path": "empty.py", "content": "\n\n"},
+    ]
+    docs = list(iter_documents(files, max_tokens=100))
+    # Each file keeps its own header, so changing a.py cannot take it away from b.py
+    assert sum("Copyright" in d["text"] for d in docs) == 2
+    gen = [d for d in docs if d["path"] == "gen.py"]
+    assert len({d["text"] for d in gen}) == len(gen)
+    ids = [int(d["chunk_id"]) for d in gen]
+    assert ids[0] == 0 and ids[-1] > len(ids) - 1
+    assert not any(d["path"] == "empty.py" for d in docs)
+
+
+def test_unknown_tokenizer_falls_back_to_estimate():
+    assert get_tokenizer("no-such-encoding").name == "approx"
@@ -0,0 +1,57 @@
+from src.chunking import Tokenizer
+from src.context_assembler import assemble_context, merge_neighbours
+
+
+APPROX = Tokenizer()
+
+
+def _hit(path, i, score, text, project="p"):
+    return {"project": project, "path": path, "id": i, "score": score, "text": text}
+
+
+def test_neighbours_merge_without_repeating_overlap():
+    hits = [
+        _hit("a.py", 4, 0.5, "    return total\n\ndef tail():\n    pass\n"),
+        _hit("a.py", 3, 0.9, "def head():\n    total = 1\n    return total\n"),
+        _hit("a.py", 3, 0.9, "def head():\n    total = 1\n    return total\n", project="q"),
+        _hit("b.py", 9, 0.7, "def head():\n    total = 1\n"),
+        _hit("a.py", 8, 0.2, "far away\n"),
+    ]
+    blocks = merge_neighbours(hits)
+    merged = next(b for b in blocks if b["ids"] == [3, 4])
+    assert merged["text"] == "def head():\n    total = 1\n    return total\n\ndef tail():\n    pass\n"
+    assert merged["score"] == 0.9
+    # b.py's text is already inside the merged block; the other project's copy is too
+    assert sorted((b["project"], b["path"], b["ids"][0]) for b in blocks) == [("p", "a.py", 3), ("p", "a.py", 8)]
+
+
+def test_a_gap_in_file_positions_is_not_merged():
+    hits = [
+        {**_hit("a.py", 3, 0.9, "first()\n"), "pos": 3},
+        {**_hit("a.py", 4, 0.8, "after_skipped_copy()\n"), "pos": 5},
+        {**_hit("a.py", 5, 0.7, "next()\n"), "pos": 6},
+    ]
+    assert sorted(b["ids"] for b in merge_neighbours(hits)) == [[3], [4, 5]]
+
+
+def test_mmr_prefers_a_different_block_over_a_near_copy():
+    same = "def load_user(user_id):\n    return db.users.get(user_id)\n"
+    hits = [
+        _hit("users.py", 1, 1.0, same),
+        _hit("users_copy.py", 1, 0.95, same.replace("load_user", "load_users")),
+        _hit("orders.py", 7, 0.6, "def save_order(order):\n    queue.publish(order.id)\n"),
+    ]
+    budget = APPROX.count(same) * 2 + 5
+    blocks = assemble_context(hits, max_tokens=budget, mmr_lambda=0.5, tokenizer=APPROX)
+    assert [b["path"] for b in blocks] == ["users.py", "orders.py"]
+    assert sum(b["tokens"] for b in blocks) <= budget
+    # pure relevance keeps the near copy instead
+    blocks = assemble_context(hits, max_tokens=budget, mmr_lambda=1.0, tokenizer=APPROX)
+    assert [b["path"] for b in blocks] == ["users.py", "users_copy.py"]
+
+
+def test_budget_truncates_an_oversized_best_block():
+    long_text = "".join(f"line {i} with several words in it\n" for i in range(200))
+    blocks = assemble_context([_hit("big.md", 0, 1.0, long_text)], max_tokens=50, tokenizer=APPROX)
+    assert len(blocks) == 1 and blocks[0]["tokens"] <= 50
+    assert long_text.startswith(blocks[0]["text"])
@@ -0,0 +1,25 @@
+from src import vectorizer
+from src.config import settings
+from src.embedding_cache import EmbeddingCacheStats
+
+
+def test_embed_texts_only_sends_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_cache_path", str(tmp_path / "emb.sqlite"))
+    sent = []
+
+    def fake_embed(texts):
+        sent.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(vectorizer, "_embed_uncached", fake_embed)
+
+    first = vectorizer.embed_texts(["a", "bb", "a"])
+    assert sent == [["a", "bb"]]
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+
+    stats = EmbeddingCacheStats()
+    second = vectorizer.embed_texts(["bb", "ccc"], stats=stats)
+    assert sent[-1] == ["ccc"]
+    assert second == [[2.0, 1.0], [3.0, 1.0]]
+    assert (stats.hits, stats.misses, stats.bytes_saved) == (1, 1, 2)
+    assert stats.hit_rate == 0.5
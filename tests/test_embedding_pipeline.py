@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from src.embedding_pipeline import EmbeddingPipeline, ThrottledError
+
+
+def test_pipeline_keeps_order_and_retries_only_throttled_batches():
+    calls = []
+    throttled_once = threading.Event()
+
+    def batch_fn(texts):
+        calls.append(tuple(texts))
+        if texts[0] == "t4" and not throttled_once.is_set():
+            throttled_once.set()
+            raise ThrottledError(retry_after=0)
+        return [[float(t[1:])] for t in texts], {}
+
+    pipe = EmbeddingPipeline(batch_fn, batch_size=2, max_in_flight=3, tokens_per_minute=0, max_retries=2)
+    texts = [f"t{i}" for i in range(7)]
+    assert pipe.embed(texts) == [[float(i)] for i in range(7)]
+    assert calls.count(("t4", "t5")) == 2
+    assert all(calls.count(b) == 1 for b in calls if b != ("t4", "t5"))
+    assert pipe.stats["throttled"] == 1
+
+
+def test_pipeline_against_local_stand_in():
+    from benchmarks.fakes import FakeEmbeddingsServer, fake_vector
+    from src.embedding_pipeline import _client
+
+    with FakeEmbeddingsServer(dim=8, latency=0) as server:
+        client = _client("test", server.base_url)
+
+        def batch_fn(texts):
+            raw = client.embeddings.with_raw_response.create(model="fake", input=texts)
+            return [d.embedding for d in raw.parse().data], raw.headers
+
+        pipe = EmbeddingPipeline(batch_fn, batch_size=3, max_in_flight=2, tokens_per_minute=0)
+        out = pipe.embed(["a", "b", "c", "d"])
+    assert len(out) == 4
+    assert out[3] == pytest.approx(fake_vector("d", 8), abs=1e-6)
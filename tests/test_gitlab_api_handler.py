@@ -0,0 +1,262 @@
+import threading
+import time
+
+import httpx
+
+from src.gitlab_api_handler import GitLabAPI, RateLimitGate
+
+
+def test_iter_files_fetches_concurrently_and_skips_failures(monkeypatch):
+    api = GitLabAPI(base_url="http://gitlab.invalid/api/v4", token="t")
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_get_file_raw(project_id, path, ref="HEAD"):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        if path == "bad.py":
+            raise RuntimeError("boom")
+        return f"content of {path}"
+
+    monkeypatch.setattr(api, "get_file_raw", fake_get_file_raw)
+    paths = [f"f{i}.py" for i in range(20)] + ["bad.py"]
+    files = list(api.iter_files("g/p", paths, workers=4))
+    assert sorted(f["path"] for f in files) == sorted(p for p in paths if p != "bad.py")
+    assert 1 < peak <= 4
+
+
+def test_rate_limit_gate_reads_gitlab_headers():
+    gate = RateLimitGate(low_watermark=5)
+    reset = time.time() + 30
+    gate.observe(httpx.Response(200, headers={"RateLimit-Remaining": "3", "RateLimit-Reset": str(int(reset))}))
+    assert gate._until >= int(reset)
+    gate.observe(httpx.Response(429, headers={"Retry-After": "120"}))
+    assert gate._until > time.time() + 100
+    assert gate.pauses == 2
+
+
+def test_archive_ingest_matches_per_file_ingest(tmp_path, monkeypatch):
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src import gitlab_api_handler
+    from src.index_updater import _is_selected, _select_paths
+    from src.utils import TTLFileCache
+
+    monkeypatch.setattr(gitlab_api_handler, "cache", TTLFileCache(str(tmp_path)))
+    repo = synthetic_repo(30, file_size=300)
+    repo["image.png"] = "not really a png"
+    with FakeGitLabServer(repo) as server:
+        api = GitLabAPI(base_url=server.api_url, token="t")
+        tree = api.get_repository_tree("group/app")
+        per_file = {f["path"]: f["content"] for f in api.iter_files("group/app", _select_paths(tree))}
+        archive = {f["path"]: f["content"] for f in api.iter_archive_files("group/app", include=_is_selected)}
+        assert server.requests_by_kind["archive.tar.gz"] == 1
+    assert archive == per_file
+    assert "image.png" not in archive and "README.md" in archive
+
+
+def test_stalled_archive_falls_back_to_per_file(tmp_path, monkeypatch):
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src import gitlab_api_handler
+    from src.config import settings
+    from src.index_updater import _is_selected, _select_paths
+    from src.utils import TTLFileCache
+
+    monkeypatch.setattr(gitlab_api_handler, "cache", TTLFileCache(str(tmp_path)))
+    monkeypatch.setattr(settings, "archive_read_timeout_seconds", 0.3)
+    repo = synthetic_repo(200, file_size=2000)
+    with FakeGitLabServer(repo) as server:
+        server.archive_stalls = True
+        api = GitLabAPI(base_url=server.api_url, token="t")
+        selected = _select_paths(api.get_repository_tree("group/app"))
+        start = time.time()
+        files = list(api.iter_repository_files("group/app", selected, include=_is_selected))
+        assert time.time() - start < 10
+        assert server.requests_by_kind["archive.tar.gz"] == 1
+        # Files from the first half of the archive are not fetched again
+        assert 0 < server.requests_by_kind["blobs"] < len(selected)
+    assert sorted(f["path"] for f in files) == sorted(selected)
+    assert {f["path"]: f["content"] for f in files} == {p: repo[p] for p in selected}
+
+
+def test_cache_is_pinned_to_commit_and_blob_shas(tmp_path, monkeypatch):
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src import gitlab_api_handler
+    from src.config import settings
+    from src.utils import TTLFileCache
+
+    monkeypatch.setattr(gitlab_api_handler, "cache", TTLFileCache(str(tmp_path)))
+    monkeypatch.setattr(settings, "cache_ref_ttl_seconds", 0)
+    repo = synthetic_repo(20, file_size=200)
+    with FakeGitLabServer(repo) as server:
+
+        def ingest():
+            api = GitLabAPI(base_url=server.api_url, token="t")
+            tree = api.get_repository_tree("group/app")
+            return {f["path"]: f["content"] for f in api.iter_files("group/app", [t["path"] for t in tree])}
+
+        assert ingest() == repo
+        first = dict(server.requests_by_kind)
+        assert first["blobs"] == len(repo) and first["tree"] >= 1
+
+        changed = {**repo, "README.md": "# Changed\n"}
+        server.commit(changed, "1" * 40)
+        before = gitlab_api_handler.revalidation_stats.as_dict()["revalidations_avoided"]
+        assert ingest() == changed
+        assert server.requests_by_kind["blobs"] == len(repo) + 1  # only the changed blob
+        assert gitlab_api_handler.revalidation_stats.as_dict()["revalidations_avoided"] - before == len(repo) - 1
+
+        tree_requests = server.requests_by_kind["tree"]
+        assert ingest() == changed  # same commit: the listing comes from cache
+        assert server.requests_by_kind["tree"] == tree_requests
+        assert server.requests_by_kind["blobs"] == len(repo) + 1
+
+
+def test_async_client_matches_sync_and_shares_connection_pool(tmp_path, monkeypatch):
+    import asyncio
+
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src import gitlab_api_handler
+    from src.gitlab_api_handler import AsyncGitLabAPI, aclose_clients
+    from src.utils import TTLFileCache
+
+    monkeypatch.setattr(gitlab_api_handler, "cache", TTLFileCache(str(tmp_path)))
+    repo = synthetic_repo(10, file_size=100)
+    with FakeGitLabServer(repo, projects=("group/app", "group/lib")) as server:
+        assert GitLabAPI(base_url=server.api_url, token="t")._client is GitLabAPI(base_url=server.api_url, token="t")._client
+
+        async def run():
+            a = AsyncGitLabAPI(base_url=server.api_url, token="t")
+            b = AsyncGitLabAPI(base_url=server.api_url, token="t")
+            assert a._client is b._client
+            projects = await a.list_projects()
+            tree = await a.get_repository_tree("group/app")
+            contents = await asyncio.gather(*(b.get_file_raw("group/app", t["path"]) for t in tree))
+            await aclose_clients()
+            return projects, tree, contents
+
+        projects, tree, contents = asyncio.run(run())
+    assert [p["path_with_namespace"] for p in projects] == ["group/app", "group/lib"]
+    assert dict(zip((t["path"] for t in tree), contents)) == repo
+
+
+def test_async_cache_calls_run_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src import gitlab_api_handler
+    from src.config import settings
+    from src.gitlab_api_handler import AsyncGitLabAPI, aclose_clients, shared_async_client
+    from src.utils import TTLFileCache
+
+    threads = []
+
+    class RecordingCache(TTLFileCache):
+        def get(self, key):
+            threads.append(threading.get_ident())
+            return super().get(key)
+
+        def set(self, key, value, ttl_seconds=None):
+            threads.append(threading.get_ident())
+            super().set(key, value, ttl_seconds)
+
+    monkeypatch.setattr(gitlab_api_handler, "cache", RecordingCache(str(tmp_path)))
+    monkeypatch.setattr(settings, "cache_ref_ttl_seconds", 60)
+    repo = synthetic_repo(5, file_size=100)
+    with FakeGitLabServer(repo) as server:
+
+        async def run():
+            api = AsyncGitLabAPI(base_url=server.api_url, token="t")
+            tree = await api.get_repository_tree("group/app")
+            first = await asyncio.gather(*(api.get_file_raw("group/app", t["path"]) for t in tree))
+            # Second pass: ref, tree and blobs all come from the cache
+            again = await asyncio.gather(*(api.get_file_raw("group/app", t["path"]) for t in tree))
+            client = api._client
+            await aclose_clients()
+            return threading.get_ident(), first, again, client
+
+        loop_thread, first, again, client = asyncio.run(run())
+    assert first == again == [repo[p] for p in sorted(repo)]
+    assert threads and loop_thread not in threads
+    assert client.is_closed
+
+    async def grab():
+        return shared_async_client("http://gitlab.invalid/api/v4", "t")
+
+    # Each loop gets its own client instead of replacing (and leaking) another loop's
+    assert asyncio.run(grab()) is not asyncio.run(grab())
+
+
+def test_tree_pages_are_fetched_in_parallel_or_by_keyset(tmp_path, monkeypatch):
+    import asyncio
+
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src import gitlab_api_handler
+    from src.config import settings
+    from src.gitlab_api_handler import AsyncGitLabAPI
+    from src.utils import TTLFileCache
+
+    monkeypatch.setattr(settings, "cache_ref_ttl_seconds", 0)
+    repo = synthetic_repo(1047, file_size=10)
+    for send_totals in (True, False):
+        monkeypatch.setattr(gitlab_api_handler, "cache", TTLFileCache(str(tmp_path / str(send_totals))))
+        with FakeGitLabServer(repo, latency=0.03, send_totals=send_totals) as server:
+            api = GitLabAPI(base_url=server.api_url, token="t")
+            active = peak = 0
+            lock = threading.Lock()
+            get = api._get
+
+            def tracked_get(*args, **kwargs):
+                nonlocal active, peak
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                try:
+                    return get(*args, **kwargs)
+                finally:
+                    with lock:
+                        active -= 1
+
+            monkeypatch.setattr(api, "_get", tracked_get)
+            paths = [item["path"] for item in api.iter_repository_tree("group/app")]
+            assert paths == sorted(repo)
+            if send_totals:
+                assert server.requests_by_kind["tree"] == 11
+                assert peak > 1
+            else:
+                # Offset page 1 is kept and the keyset walk resumes after its last record
+                assert server.requests_by_kind["tree"] == 11
+                assert peak == 1
+
+            monkeypatch.setattr(gitlab_api_handler, "cache", TTLFileCache(str(tmp_path / f"async{send_totals}")))
+            tree = asyncio.run(AsyncGitLabAPI(base_url=server.api_url, token="t").get_repository_tree("group/app"))
+            assert [item["path"] for item in tree] == paths
+            assert server.requests_by_kind["tree"] == 22
+
+
+def test_async_pages_stream_and_keyset_resumes_after_page_one():
+    import asyncio
+
+    from benchmarks.fakes import FakeGitLabServer, synthetic_repo
+    from src.gitlab_api_handler import AsyncGitLabAPI
+
+    names = [f"group/p{i:03d}" for i in range(250)]
+    with FakeGitLabServer(synthetic_repo(1, file_size=10), projects=names, send_totals=False) as server:
+
+        async def run():
+            seen, requests_at_first = [], None
+            async for p in AsyncGitLabAPI(base_url=server.api_url, token="t").iter_projects():
+                if requests_at_first is None:
+                    requests_at_first = server.requests_by_kind["projects"]
+                seen.append(p["path_with_namespace"])
+            return seen, requests_at_first
+
+        seen, requests_at_first = asyncio.run(run())
+    assert seen == names
+    assert requests_at_first == 1
+    assert server.requests_by_kind["projects"] == 3
@@ -0,0 +1,41 @@
+import faiss
+import numpy as np
+
+from src.config import settings
+from src.index_factory import create_index, index_kind, project_index_type, resolve_index_type, search_params, train, train_size
+
+
+def test_resolve_index_type_auto_and_fallbacks(monkeypatch):
+    monkeypatch.setattr(settings, "index_type", "auto")
+    monkeypatch.setattr(settings, "index_types", "g/big=ivfpq, g/fast=hnsw")
+    assert project_index_type("g/big") == "ivfpq"
+    assert project_index_type("g/other") == "auto"
+    assert resolve_index_type("auto", 100) == "flat"
+    assert resolve_index_type("auto", settings.ann_min_vectors) == "ivf"
+    # too few vectors to train PQ codebooks / IVF centroids
+    assert resolve_index_type("ivfpq", 1000) == "ivf"
+    assert resolve_index_type("ivf", 10) == "flat"
+
+
+def test_ivf_index_roundtrip_with_ids():
+    x = np.random.default_rng(0).standard_normal((2000, 16)).astype("float32")
+    faiss.normalize_L2(x)
+    index = create_index("ivf", 16, len(x))
+    train(index, x)
+    index.add_with_ids(x, np.arange(100, 2100, dtype="int64"))
+    index.remove_ids(np.array([100], dtype="int64"))
+    restored = faiss.deserialize_index(faiss.serialize_index(index))
+    assert index_kind(restored) == "ivf"
+    _, ids = restored.search(x[1:2], 1, params=search_params("ivf", nprobe=64))
+    assert ids[0][0] == 101
+
+
+def test_training_sample_is_sized_to_the_index_not_the_corpus():
+    ivf = create_index("ivf", 1536, 1_000_000)
+    nlist = faiss.extract_index_ivf(ivf).nlist
+    # 256 points per list would be ~6 GB at this dim: capped by bytes, not below 39 per list
+    assert train_size(ivf, 1_000_000, 1536) == 39 * nlist
+    narrow = create_index("ivf", 16, 4_000_000)
+    assert train_size(narrow, 4_000_000, 16) == 256 * faiss.extract_index_ivf(narrow).nlist
+    assert train_size(create_index("flat", 1536, 1_000_000, "sq8"), 1_000_000, 1536) == (256 << 20) // (4 * 1536)
+    assert train_size(create_index("flat", 64, 500, "sq8"), 500, 64) == 500
@@ -0,0 +1,189 @@
+import fcntl
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from src import vectorizer
+from src.config import settings
+from src.index_builder import FaissIndex, index_path_for, live_chunks, path_runs
+from src.index_registry import IndexRegistry
+
+
+def _docs(tag, n=3):
+    return [{"path": f"{tag}{i}.py", "chunk_id": "0", "text": f"{tag} chunk {i}"} for i in range(n)]
+
+
+def test_readers_keep_their_generation_across_rebuilds(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[1.0, float(len(t))] for t in texts])
+    path = index_path_for("g/p")
+    registry = IndexRegistry()
+
+    FaissIndex(path).build(_docs("old"), commit_sha="a" * 40)
+    reader = registry.get("g/p")
+    first_gen = reader.generation
+    assert reader.load_state()["commit_sha"] == "a" * 40
+
+    FaissIndex(path).build(_docs("new", 4), commit_sha="b" * 40)
+    FaissIndex(path).build(_docs("newer", 5), commit_sha="c" * 40)
+    # The first generation is collected, but an in-flight reader still sees it whole
+    assert not (reader.root / first_gen).exists()
+    assert reader.get_chunk_text(0) == "old chunk 0"
+    assert len(reader.search_vector(np.array([[1.0, 0.0]], dtype="float32"), k=10)) == 3
+
+    current = registry.get("g/p")
+    assert current is not reader and current.generation != first_gen
+    assert current.get_chunk_text(4) == "newer chunk 4"
+    assert registry.stats()["reloads"] == 1
+    gens = sorted(p.name for p in current.root.iterdir() if p.name.startswith("gen-"))
+    assert len(gens) == settings.index_keep_generations
+
+
+def test_incremental_update_writes_a_new_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[1.0, float(len(t))] for t in texts])
+    idx = FaissIndex(str(tmp_path / "p.faiss"))
+    idx.build(_docs("f"), commit_sha="a" * 40)
+    before = FaissIndex(str(tmp_path / "p.faiss")).load()
+
+    idx.update([{"path": "f1.py", "chunk_id": "0", "text": "f1 changed"}], ["f2.py"], commit_sha="b" * 40)
+    assert before._index.ntotal == 3 and before.get_chunk_text(1) == "f chunk 1"
+    after = FaissIndex(str(tmp_path / "p.faiss")).load()
+    assert after.generation != before.generation
+    assert after._index.ntotal == 2
+    assert after.get_chunk_text(3) == "f1 changed"
+    assert after.load_state()["paths"] == {"f0.py": [[0, 1]], "f1.py": [[3, 1]]}
+
+
+def test_legacy_flat_index_is_replaced_by_first_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[1.0, float(len(t))] for t in texts])
+    legacy = tmp_path / "p.faiss"
+    flat = faiss.IndexFlatIP(2)
+    flat.add(np.ones((2, 2), dtype="float32"))
+    faiss.write_index(flat, str(legacy))
+
+    idx = FaissIndex(str(legacy))
+    assert idx.load()._index.ntotal == 2
+    idx.build(_docs("f"))
+    assert not legacy.exists()
+    assert (tmp_path / "p" / "CURRENT").exists()
+    assert FaissIndex(str(legacy)).load()._index.ntotal == 3
+
+
+def test_streaming_build_and_update_consume_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "ingest_batch_size", 2)
+    batches = []
+
+    def fake_embed(texts):
+        batches.append(len(texts))
+        return [[1.0, float(len(t))] for t in texts]
+
+    monkeypatch.setattr(vectorizer, "_embed_uncached", fake_embed)
+    idx = FaissIndex(index_path_for("g/stream"))
+    assert idx.build(iter(_docs("s", 5)), commit_sha="a" * 40) == 5
+    assert batches == [2, 2, 1]
+    assert sorted(p.name for p in idx.gen_dir.iterdir()) == [
+        "index.bm25", "index.chunks.bin", "index.chunks.idx", "index.faiss", "manifest.json"
+    ]
+    state = idx.load_state()
+    assert state["total_chunks"] == 5 and state["paths"]["s4.py"] == [[4, 1]]
+
+    # s1.py is re-chunked into two records across batches, s3.py is removed
+    update = [{"path": "s1.py", "chunk_id": str(i), "text": f"s1 again {i}"} for i in range(2)]
+    update.append({"path": "t0.py", "chunk_id": "0", "text": "t zero"})
+    result = idx.update(iter(update), ["s3.py"], commit_sha="b" * 40)
+    assert result == {"added": 3, "removed": 2}
+    paths = idx.load_state()["paths"]
+    assert paths["s1.py"] == [[5, 2]] and "s3.py" not in paths
+    assert idx.get_chunk_text(6) == "s1 again 1"
+    assert idx.search_lexical("again")[0][0] in (5, 6)
+
+
+def test_quantized_generations_are_mapped_and_still_updatable(tmp_path, monkeypatch):
+    def embed(texts):
+        return [np.random.default_rng(int(t.split()[-1])).standard_normal(16).tolist() for t in texts]
+
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", embed)
+    docs = [{"path": f"m{i}.py", "chunk_id": "0", "text": f"module {i}"} for i in range(400)]
+    for storage, kind in (("sq8", "flat"), ("fp16", "ivf")):
+        monkeypatch.setattr(settings, "index_storage", storage)
+        idx = FaissIndex(str(tmp_path / f"{storage}.faiss"))
+        idx.build(docs, commit_sha="a" * 40, index_type=kind)
+        reader = FaissIndex(str(tmp_path / f"{storage}.faiss")).load()
+        assert reader._mapped and reader.kind == kind
+        assert reader.load_state()["storage"] == storage
+        query = np.array([embed(["q 7"])[0]], dtype="float32")
+        faiss.normalize_L2(query)
+        assert reader.search_vector(query, k=1, nprobe=64)[0][0] == 7
+
+        reader.update([{"path": "m7.py", "chunk_id": "0", "text": "module 9999"}], ["m8.py"], commit_sha="b" * 40)
+        after = FaissIndex(str(tmp_path / f"{storage}.faiss")).load()
+        assert after._index.ntotal == 399
+        assert after.search_vector(query, k=1, nprobe=64)[0][0] != 7
+
+
+def test_update_shares_the_chunk_blob_with_the_previous_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[1.0, float(len(t))] for t in texts])
+    idx = FaissIndex(str(tmp_path / "p.faiss"))
+    idx.build(_docs("f", 50), commit_sha="a" * 40)
+    before = FaissIndex(str(tmp_path / "p.faiss")).load()
+    old_bin = before.chunks.bin_path
+    old_size = old_bin.stat().st_size
+
+    idx.update([{"path": "f1.py", "chunk_id": "0", "text": "f1 changed"}], [], commit_sha="b" * 40)
+    after = FaissIndex(str(tmp_path / "p.faiss")).load()
+    new_bin = after.chunks.bin_path
+    # One blob, appended to: the update wrote only the changed record
+    assert new_bin != old_bin and new_bin.stat().st_ino == old_bin.stat().st_ino
+    assert old_bin.stat().st_size - old_size < 100
+    assert len(before.chunks) == 50 and len(after.chunks) == 51
+    assert before.get_chunk_text(1) == "f chunk 1" and after.get_chunk_text(50) == "f1 changed"
+
+
+def test_failed_update_leaves_the_live_generation_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "ingest_batch_size", 2)
+
+    def embed(texts):
+        if "g chunk 2" in texts:
+            raise RuntimeError("embeddings API down")
+        return [[1.0, float(len(t))] for t in texts]
+
+    monkeypatch.setattr(vectorizer, "_embed_uncached", embed)
+    idx = FaissIndex(str(tmp_path / "p.faiss"))
+    idx.build(_docs("f", 10), commit_sha="a" * 40)
+    live = FaissIndex(str(tmp_path / "p.faiss")).load()
+    old_bin = live.chunks.bin_path
+    old_size = old_bin.stat().st_size
+
+    with pytest.raises(RuntimeError):
+        idx.update(_docs("g", 6), [], commit_sha="b" * 40)
+    # The first batch was appended to the shared blob, then cut off again
+    assert old_bin.stat().st_size == old_size
+    assert FaissIndex(str(tmp_path / "p.faiss")).load().generation == live.generation
+    assert not [p for p in live.root.iterdir() if p.name.endswith(".tmp")]
+
+    # Another writer holds the blob: this one appends to a private copy instead
+    fd = os.open(old_bin, os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        idx.update(_docs("h", 1), [], commit_sha="c" * 40)
+    finally:
+        os.close(fd)
+    after = FaissIndex(str(tmp_path / "p.faiss")).load()
+    assert after.chunks.bin_path.stat().st_ino != old_bin.stat().st_ino
+    assert old_bin.stat().st_size == old_size
+    assert after.get_chunk_text(10) == "h chunk 0" and after.get_chunk_text(9) == "f chunk 9"
+
+
+def test_manifest_paths_are_id_runs_and_old_id_lists_still_load():
+    assert path_runs({"paths": {"a.py": [3, 4, 5, 9], "b.py": [[0, 3]]}}) == {"a.py": [[3, 3], [9, 1]], "b.py": [[0, 3]]}
+    assert live_chunks({"paths": {"a.py": [3, 4, 5, 9], "b.py": [[0, 3]]}}) == 7
@@ -0,0 +1,40 @@
+import os
+
+import faiss
+import numpy as np
+
+from src.config import settings
+from src.index_builder import index_path_for
+from src.index_registry import IndexRegistry
+
+
+def _write_index(project_id: str, n: int) -> None:
+    index = faiss.IndexFlatIP(4)
+    index.add(np.random.rand(n, 4).astype("float32"))
+    path = index_path_for(project_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    faiss.write_index(index, path)
+
+
+def test_registry_hits_reloads_and_evicts(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    _write_index("group/a", 3)
+    _write_index("group/b", 3)
+    reg = IndexRegistry(max_entries=1)
+
+    first = reg.get("group/a")
+    assert reg.get("group/a") is first
+    assert reg.stats()["hits"] == 1 and reg.stats()["misses"] == 1
+
+    # Rewriting the file changes its signature and forces a reload
+    _write_index("group/a", 5)
+    os.utime(index_path_for("group/a"), ns=(1, 1))
+    reloaded = reg.get("group/a")
+    assert reloaded is not first
+    assert reloaded._index.ntotal == 5
+    assert reg.stats()["reloads"] == 1
+
+    reg.get("group/b")
+    stats = reg.stats()
+    assert stats["entries"] == 1
+    assert stats["evictions"] == 1
@@ -0,0 +1,94 @@
+import pytest
+
+from src import index_updater, vectorizer
+from src.config import settings
+from src.index_builder import FaissIndex, index_path_for
+
+
+class FakeGitLab:
+    def __init__(self):
+        self.sha = "a" * 40
+        self.files = {"README.md": "hello", "app/main.py": "print(1)", "app/old.py": "x = 1"}
+        self.diffs = []
+        self.fetched = []
+        self.broken = set()
+
+    def get_commit_sha(self, project_id, ref="HEAD"):
+        return self.sha
+
+    def iter_repository_tree(self, project_id, ref="HEAD"):
+        return [{"type": "blob", "path": p} for p in self.files]
+
+    def get_file_raw(self, project_id, path, ref="HEAD"):
+        self.fetched.append(path)
+        return self.files[path]
+
+    def iter_files(self, project_id, paths, ref="HEAD"):
+        # Like GitLabAPI.iter_files: a file that cannot be fetched is logged and skipped
+        for p in paths:
+            if p not in self.broken:
+                yield {"path": p, "content": self.get_file_raw(project_id, p, ref)}
+
+    def compare(self, project_id, from_sha, to_sha):
+        return {"diffs": self.diffs}
+
+
+def test_incremental_rebuild_touches_only_the_diff(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[float(len(t)), 1.0] for t in texts])
+    api = FakeGitLab()
+    monkeypatch.setattr(index_updater, "GitLabAPI", lambda: api)
+
+    assert index_updater.rebuild_index_for_project("g/p")["mode"] == "full"
+    assert index_updater.rebuild_index_for_project("g/p")["mode"] == "noop"
+
+    api.sha = "b" * 40
+    api.files["app/main.py"] = "print(2)  # changed"
+    api.files["app/new.py"] = "y = 2"
+    del api.files["app/old.py"]
+    api.diffs = [
+        {"old_path": "app/main.py", "new_path": "app/main.py"},
+        {"old_path": "app/new.py", "new_path": "app/new.py", "new_file": True},
+        {"old_path": "app/old.py", "new_path": "app/old.py", "deleted_file": True},
+    ]
+    api.fetched.clear()
+    result = index_updater.rebuild_index_for_project("g/p")
+    assert result["mode"] == "incremental"
+    assert sorted(api.fetched) == ["app/main.py", "app/new.py"]
+    assert result["vectors_removed"] == 2
+
+    idx = FaissIndex(index_path_for("g/p")).load()
+    state = idx.load_state()
+    assert state["commit_sha"] == "b" * 40
+    assert sorted(state["paths"]) == ["README.md", "app/main.py", "app/new.py"]
+    assert idx._index.ntotal == 3
+    assert idx.get_chunk_text(state["paths"]["app/main.py"][0][0]) == "print(2)  # changed"
+
+
+def test_failed_fetch_leaves_the_index_at_the_old_commit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[float(len(t)), 1.0] for t in texts])
+    api = FakeGitLab()
+    monkeypatch.setattr(index_updater, "GitLabAPI", lambda: api)
+    index_updater.rebuild_index_for_project("g/p")
+    before = FaissIndex(index_path_for("g/p")).current_generation()
+
+    api.sha = "b" * 40
+    api.files["app/main.py"] = "print(2)"
+    api.files["app/old.py"] = "x = 2"
+    api.diffs = [{"old_path": p, "new_path": p} for p in ("app/main.py", "app/old.py")]
+    api.broken = {"app/old.py"}
+    with pytest.raises(RuntimeError, match="could not be fetched"):
+        index_updater.rebuild_index_for_project("g/p")
+    idx = FaissIndex(index_path_for("g/p"))
+    assert idx.current_generation() == before and idx.load_state()["commit_sha"] == "a" * 40
+    assert not list(idx.root.glob(".gen-*.tmp"))
+
+    api.broken.clear()
+    assert index_updater.rebuild_index_for_project("g/p")["mode"] == "incremental"
+    idx = FaissIndex(index_path_for("g/p")).load()
+    assert sorted(idx.get_chunk_text(i) for ((i, _),) in idx.load_state()["paths"].values()) == [
+        "hello", "print(2)", "x = 2"
+    ]
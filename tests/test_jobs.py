@@ -0,0 +1,104 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from src import chat_interface
+from src.config import settings
+from src.jobs import JobScheduler
+
+
+def test_rebuilds_of_the_same_project_are_coalesced():
+    release = threading.Event()
+    calls = []
+
+    def runner(project_id, ref="HEAD", full=False, progress=None):
+        calls.append((project_id, full))
+        progress("fetch", files=1, files_total=2)
+        release.wait(5)
+        if project_id == "bad":
+            raise RuntimeError("boom")
+        return {"mode": "full", "chunks": 3}
+
+    scheduler = JobScheduler(runner, max_workers=2)
+    b = scheduler.submit("b")
+    bad = scheduler.submit("bad")
+    a1 = scheduler.submit("a")
+    a2 = scheduler.submit("a", full=True)
+    assert a1 is a2 and a1.id != b.id and a1.full
+    assert not scheduler.wait([b], timeout=0.05)
+    assert b.stage == "fetch" and b.progress == {"files": 1, "files_total": 2}
+    assert a1.status == "queued"  # two workers, both busy
+
+    release.set()
+    assert scheduler.wait([a1, b, bad], timeout=5)
+    assert a1.status == "done" and a1.result == {"mode": "full", "chunks": 3}
+    assert bad.status == "failed" and bad.error == "boom"
+    assert sorted(p for p, _ in calls) == ["a", "b", "bad"]
+    assert scheduler.stats()["coalesced"] == 1
+    assert scheduler.submit("a") is not a1  # finished jobs are not reused
+    scheduler.shutdown()
+
+
+def test_rebuild_requested_while_running_gets_one_follow_up():
+    started = threading.Semaphore(0)
+    release = threading.Event()
+    calls = []
+
+    def runner(project_id, ref="HEAD", full=False, progress=None):
+        calls.append(full)
+        started.release()
+        release.wait(5)
+        return {"mode": "incremental", "chunks": len(calls)}
+
+    scheduler = JobScheduler(runner, max_workers=2)
+    first = scheduler.submit("a")
+    assert started.acquire(timeout=5) and first.status == "running"
+    # a push lands while the first rebuild runs: it must not be reported as handled by it
+    second = scheduler.submit("a")
+    third = scheduler.submit("a", full=True)
+    assert second is not first and third is second and second.full
+    assert second.status == "queued"
+
+    release.set()
+    assert scheduler.wait([first, second], timeout=5)
+    assert calls == [False, True]
+    assert second.status == "done" and second.result["chunks"] == 2
+    scheduler.shutdown()
+
+
+def test_history_is_trimmed_while_a_long_rebuild_runs():
+    release = threading.Event()
+
+    def runner(project_id, ref="HEAD", full=False, progress=None):
+        if project_id == "slow":
+            release.wait(5)
+        return {"mode": "noop", "chunks": 0}
+
+    scheduler = JobScheduler(runner, max_workers=2, max_history=3)
+    slow = scheduler.submit("slow")
+    for i in range(10):
+        assert scheduler.wait([scheduler.submit(f"p{i}")], timeout=5)
+    # The running job is the oldest; finished ones behind it still make room
+    jobs = scheduler.list()
+    assert [j.project_id for j in jobs] == ["slow", "p8", "p9"]
+    release.set()
+    assert scheduler.wait([slow], timeout=5)
+    scheduler.shutdown()
+
+
+def test_rebuild_endpoint_enqueues_and_reports_status(monkeypatch):
+    for name, value in [("gitlab_token", "t"), ("openai_api_key", "k")]:
+        monkeypatch.setattr(settings, name, value)
+    scheduler = JobScheduler(lambda project_id, **kw: {"mode": "noop", "chunks": 0}, max_workers=1)
+    monkeypatch.setattr(chat_interface, "scheduler", scheduler)
+
+    with TestClient(chat_interface.app) as client:
+        resp = client.post("/rebuild/demo")
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+        scheduler.wait([scheduler.get(job_id)], timeout=5)
+        job = client.get(f"/jobs/{job_id}").json()
+        assert job["status"] == "done" and job["result"]["mode"] == "noop"
+        assert client.get("/jobs/missing").status_code == 404
+        assert [j["id"] for j in client.get("/jobs").json()["jobs"]] == [job_id]
+    scheduler.shutdown()
@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from src import lexical_index, query_processor, vectorizer
+from src.config import settings
+from src.index_builder import FaissIndex, index_path_for
+from src.index_registry import registry
+from src.lexical_index import BM25Builder, BM25Index, is_identifier_query, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_splits_code_identifiers():
+    tokens = tokenize("def getUserName(user_id): return HTTPServer.MAX_RETRIES")
+    for t in ("getusername", "get", "user", "name", "user_id", "id", "httpserver", "http", "server", "max_retries", "retries"):
+        assert t in tokens
+    assert is_identifier_query("MAX_RETRIES") and is_identifier_query("`getUserName`")
+    assert not is_identifier_query("how are retries configured?")
+    for question in ("Hello.", "retry?", "Thanks!", "why..."):
+        assert not is_identifier_query(question)
+    for lookup in ("settings.redis_url.", "getUserName?", "MAX_RETRIES!"):
+        assert is_identifier_query(lookup)
+
+
+def test_bm25_ranks_rare_terms_and_roundtrips(tmp_path):
+    docs = [(0, "common words here"), (1, "common words and parse_config here"), (2, "common")]
+    index = BM25Index.build(tmp_path / "x", docs)
+    assert index.search("parseConfig", k=3)[0][0] == 1
+    loaded = BM25Index.load(tmp_path / "x")
+    assert loaded.search("config", k=3) == index.search("config", k=3)
+    assert BM25Index.load(tmp_path / "missing") is None
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [i for i, _ in fused] == [1, 3, 2]
+
+
+def test_bm25_spilled_partitions_match_in_memory_build(tmp_path):
+    docs = [(i, f"def handler_{i % 7}(order): return order_total * {i % 3}") for i in range(200)]
+    whole = BM25Index.build(tmp_path / "whole", docs)
+    builder = BM25Builder(tmp_path / "spilled", spill_postings=16, partition_bits=3)
+    for doc_id, text in docs:
+        builder.add(doc_id, text)
+    spilled = builder.finish()
+    assert sorted(p.name for p in (tmp_path / "spilled").iterdir()) == [
+        "doc_ids.npy", "doc_lens.npy", "impacts.npy", "meta.json", "offsets.npy", "terms.npy", "tfs.npy"
+    ]
+    assert list(spilled.terms) == sorted(spilled.terms)
+    for query in ("handler_3 order", "orderTotal", "return"):
+        assert spilled.search(query, k=5) == whole.search(query, k=5)
+
+
+def _scores(index, query):
+    return {doc: pytest.approx(score, rel=1e-5) for doc, score in index.search(query, k=100)}
+
+
+def test_bm25_merge_from_base_matches_full_build(tmp_path):
+    docs = {i: f"def handler_{i % 7}(order): return order_total * {i % 3}" for i in range(60)}
+    base = BM25Index.build(tmp_path / "base", sorted(docs.items()))
+    for i in range(0, 60, 5):
+        del docs[i]
+    docs.update({60: "def handler_new(order): return refund_total", 61: "order order order"})
+    builder = BM25Builder(tmp_path / "merged", partition_bits=3, base=base)
+    builder.drop(range(0, 60, 5))
+    builder.add(60, docs[60])
+    builder.add(61, docs[61])
+    merged = builder.finish()
+    whole = BM25Index.build(tmp_path / "whole", sorted(docs.items()))
+    for query in ("handler_3 order", "refundTotal", "return", "handler_0"):
+        assert _scores(merged, query) == _scores(whole, query)
+
+
+def test_update_tokenizes_only_new_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[1.0, float(len(t) % 7)] for t in texts])
+    registry.clear()
+    idx = FaissIndex(index_path_for("lex-merge"))
+    docs = [{"path": f"src/m{i}.py", "chunk_id": "0", "text": f"def run_{i}(): return step_{i % 4}"} for i in range(30)]
+    idx.build(docs, commit_sha="a" * 40)
+    tokenized = []
+    real = lexical_index.text_hashes
+    monkeypatch.setattr(lexical_index, "text_hashes", lambda text: tokenized.append(text) or real(text))
+
+    changed = {"path": "src/m3.py", "chunk_id": "0", "text": "def run_3(): return refund_order()"}
+    idx.update([changed], ["src/m7.py"], commit_sha="b" * 40)
+    assert tokenized == [FaissIndex._lexical_text(changed)]
+
+    monkeypatch.setattr(lexical_index, "text_hashes", real)
+    live = [changed] + [d for d in docs if d["path"] not in ("src/m3.py", "src/m7.py")]
+    ids = {p: i for p, ((i, _),) in idx.load_state()["paths"].items()}
+    whole = BM25Index.build(tmp_path / "whole", [(ids[d["path"]], FaissIndex._lexical_text(d)) for d in live])
+    for query in ("refund order", "run_7", "step_1", "def"):
+        assert _scores(idx.lexical, query) == _scores(whole, query)
+
+
+def test_identifier_query_skips_embedding_and_updates_keep_postings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[1.0, float(len(t) % 7)] for t in texts]
+
+    monkeypatch.setattr(vectorizer, "_embed_uncached", fake_embed)
+    registry.clear()
+    idx = FaissIndex(index_path_for("lex"))
+    idx.build(
+        [
+            {"path": "src/config.py", "chunk_id": "0", "text": "embedding_tpm_limit: int = 0"},
+            {"path": "src/app.py", "chunk_id": "0", "text": "def main(): serve()"},
+        ],
+        commit_sha="a" * 40,
+    )
+    idx.update([{"path": "src/app.py", "chunk_id": "0", "text": "def main(): startWorker()"}], [], commit_sha="b" * 40)
+    calls.clear()
+
+    start = time.perf_counter()
+    hits = query_processor._hybrid_search("lex", "EMBEDDING_TPM_LIMIT", 3, "HEAD")
+    assert calls == []
+    assert hits[0]["path"] == "src/config.py"
+    assert (time.perf_counter() - start) < 0.05
+    assert query_processor._hybrid_search("lex", "start_worker", 3, "HEAD")[0]["path"] == "src/app.py"
+    assert registry.get("lex").search_lexical("serve") == []
+
+    hits = query_processor._hybrid_search("lex", "where is the config file?", 3, "HEAD")
+    assert len(calls) == 1
+    assert hits[0]["path"] == "src/config.py"
@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+
+from src import vectorizer
+from src.config import settings
+from src.index_builder import FaissIndex, index_path_for
+from src.query_batcher import MicroBatcher, QueryEmbedder, _embed_batch, _search_batch
+
+
+def test_concurrent_calls_share_one_batch_with_own_results():
+    calls = []
+    gate = threading.Event()
+
+    def fn(items):
+        calls.append(list(items))
+        gate.wait(1)
+        return [x * 10 for x in items]
+
+    batcher = MicroBatcher(fn, window_ms=50, max_batch=16)
+    futures = [batcher.submit(i) for i in range(5)]
+    gate.set()
+    assert [f.result(timeout=2) for f in futures] == [0, 10, 20, 30, 40]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["max_batch"] == 5
+
+    def boom(items):
+        raise ValueError("down")
+
+    failing = MicroBatcher(boom, window_ms=1)
+    fut = failing.submit("x")
+    assert isinstance(fut.exception(timeout=2), ValueError)
+
+
+def test_query_embeddings_cached_and_searches_batched(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[1.0 if "a" in t else 0.0, 1.0 if "b" in t else 0.0] for t in texts]
+
+    monkeypatch.setattr(vectorizer, "_embed_uncached", fake_embed)
+    embedder = QueryEmbedder(16, 60, MicroBatcher(_embed_batch, window_ms=0))
+    first = embedder.embed("alpha")
+    assert np.array_equal(embedder.embed("alpha"), first)
+    assert calls == [["alpha"]]
+    rows = _embed_batch(["b", "ab", "b"])
+    assert calls[-1] == ["b", "ab"] and len(rows) == 3
+
+    idx = FaissIndex(index_path_for("batch"))
+    idx.build([{"path": "a.py", "chunk_id": "0", "text": "a"}, {"path": "b.py", "chunk_id": "0", "text": "b"}])
+    searches = []
+    original = idx.search_vectors
+    monkeypatch.setattr(idx, "search_vectors", lambda mat, k: searches.append(len(mat)) or original(mat, k))
+    out = _search_batch([(idx, rows[0], 1), (idx, first, 2)])
+    assert searches == [2]
+    assert out[0][0][0] == 1 and len(out[0]) == 1 and out[1][0][0] == 0
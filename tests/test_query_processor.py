@@ -0,0 +1,66 @@
+from src import query_processor, vectorizer
+from src.config import settings
+from src.index_builder import FaissIndex, index_path_for
+from src.index_registry import registry
+
+
+def _fake_embed(texts):
+    return [[1.0 if "alpha" in t else 0.1, 1.0 if "beta" in t else 0.1, 0.2] for t in texts]
+
+
+def test_federated_search_merges_projects_by_score(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", _fake_embed)
+    registry.clear()
+    FaissIndex(index_path_for("g/one")).build([{"path": "a.py", "chunk_id": "0", "text": "alpha service"}])
+    FaissIndex(index_path_for("g/two")).build(
+        [
+            {"path": "b.py", "chunk_id": "0", "text": "beta worker"},
+            {"path": "c.py", "chunk_id": "0", "text": "gamma"},
+        ]
+    )
+    seen = {}
+
+    def fake_generate(question, chunks):
+        seen["chunks"] = chunks
+        return "ok"
+
+    monkeypatch.setattr(query_processor, "generate_answer", fake_generate)
+    out = query_processor.answer_question_multi(["g/one", "g/two", "g/missing"], "where is beta?", k=3)
+    assert out["answer"] == "ok"
+    assert out["projects"] == ["g/one", "g/two"]
+    scores = [s["score"] for s in out["sources"]]
+    assert scores == sorted(scores, reverse=True)
+    assert {(s["project"], s["path"]) for s in out["sources"]} == {("g/one", "a.py"), ("g/two", "b.py"), ("g/two", "c.py")}
+    assert seen["chunks"][0].startswith("[g/two] b.py")
+
+
+def test_answer_reports_usage_and_reuses_one_chat_client(tmp_path, monkeypatch):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from src import langchain_chain
+
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "answer_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", _fake_embed)
+    registry.clear()
+    FaissIndex(index_path_for("g/ctx")).build(
+        [{"path": "a.py", "chunk_id": str(i), "text": f"alpha part {i}\n"} for i in range(3)]
+    )
+    made = []
+
+    def make_chain():
+        made.append(1)
+        return FakeListChatModel(responses=["ok"])
+
+    monkeypatch.setattr(langchain_chain, "make_chain", make_chain)
+    first = query_processor.answer_question("g/ctx", "alpha?")
+    second = query_processor.answer_question("g/ctx", "alpha again?")
+    assert first["answer"] == second["answer"] == "ok"
+    assert len(made) == 1
+    usage = first["usage"]
+    assert usage["prompt_tokens"] > 0 and usage["llm_ms"] >= 0 and usage["retrieval_ms"] >= 0
+    # three consecutive chunks of one file reach the model as one block
+    assert usage["context_chunks"] == 1 and [s["path"] for s in first["sources"]] == ["a.py"]
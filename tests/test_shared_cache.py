@@ -0,0 +1,47 @@
+import fakeredis
+
+from src.shared_cache import MemoryCache, RedisCache, TieredCache
+from src.utils import TTLFileCache
+
+
+def _tiered(server, tmp_path, name):
+    client = fakeredis.FakeRedis(server=server)
+    return TieredCache(MemoryCache(16, 60), RedisCache(client, 60), TTLFileCache(str(tmp_path / name)), retry_seconds=60)
+
+
+def test_workers_share_entries_through_redis(tmp_path):
+    server = fakeredis.FakeServer()
+    a = _tiered(server, tmp_path, "a")
+    b = _tiered(server, tmp_path, "b")
+    a.set("file_raw:g/p:HEAD:README.md", "hello " * 500)
+    a.set("repo_tree:g/p:HEAD", [{"path": "README.md", "type": "blob"}])
+
+    assert b.get("file_raw:g/p:HEAD:README.md") == "hello " * 500
+    assert b.get("file_raw:g/p:HEAD:README.md") == "hello " * 500
+    assert b.l1.stats()["hits"] == 1 and b.l2.stats()["hits"] == 1
+    assert not list((tmp_path / "b").rglob("*.bin"))
+
+
+def test_get_many_pipelines_l1_misses(tmp_path):
+    server = fakeredis.FakeServer()
+    cache = _tiered(server, tmp_path, "w")
+    for i in range(10):
+        cache.l2.set(f"k{i}", i)
+    cache.l1.set("k0", 0)
+    found = cache.get_many([f"k{i}" for i in range(12)])
+    assert found == {f"k{i}": i for i in range(10)}
+    assert cache.l2.stats() == {"hits": 9, "misses": 2}
+    assert cache.l1.get("k5") == 5
+
+
+def test_falls_back_to_disk_when_redis_is_down(tmp_path):
+    server = fakeredis.FakeServer()
+    cache = _tiered(server, tmp_path, "w")
+    server.connected = False
+    cache.set("key", {"v": 1})
+    assert cache.redis_errors == 1 and not cache.redis_available
+    cache.l1 = MemoryCache(16, 60)
+    assert cache.get("key") == {"v": 1}
+    assert cache.get_many(["key", "other"]) == {"key": {"v": 1}}
+    assert cache.redis_errors == 1  # no reconnect attempts until retry_seconds pass
+    assert cache.stats()["disk"]["entries"] == 1
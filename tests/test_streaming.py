@@ -0,0 +1,65 @@
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src import access_control, chat_interface, langchain_chain, vectorizer
+from src.chat_interface import app
+from src.config import settings
+from src.index_builder import FaissIndex, index_path_for
+from src.index_registry import registry
+
+
+def test_ask_stream_sends_sources_then_tokens(tmp_path, monkeypatch):
+    for name, value in [("gitlab_token", "t"), ("openai_api_key", "k"), ("index_dir", str(tmp_path))]:
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vectorizer, "_embed_uncached", lambda texts: [[1.0, float(len(t))] for t in texts])
+    monkeypatch.setattr(
+        langchain_chain,
+        "make_chain",
+        lambda: GenericFakeChatModel(messages=iter([AIMessage(content="Сервис запускается через make")])),
+    )
+    registry.clear()
+    FaissIndex(index_path_for("demo")).build([{"path": "Makefile", "chunk_id": "0", "text": "run: uvicorn"}])
+
+    with TestClient(app) as client:
+        resp = client.post("/ask/stream/demo", params={"q": "как запустить?"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n") for block in resp.text.strip().split("\n\n")]
+        names = [lines[0].removeprefix("event: ") for lines in events]
+        assert names[0] == "meta" and names[-1] == "done"
+        assert '"path": "Makefile"' in events[0][1]
+        tokens = [json.loads(lines[1].removeprefix("data: ")) for lines in events if lines[0] == "event: token"]
+        assert "".join(tokens) == "Сервис запускается через make"
+        assert client.get("/stats").json()["stream_ttfb"]["count"] >= 1
+
+
+def test_ask_many_without_projects_is_a_bad_request(monkeypatch):
+    for name, value in [("gitlab_token", "t"), ("openai_api_key", "k")]:
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(access_control, "ALLOWED_PROJECTS", {"g/allowed"})
+    with TestClient(app) as client:
+        assert client.post("/ask", params={"q": "что?"}).status_code == 400
+        assert client.post("/ask", params={"q": "что?", "projects": ["g/other"]}).status_code == 403
+        assert client.post("/ask", params={"q": "что?", "projects": ["", " "], "group": " "}).status_code == 400
+
+
+def test_ask_many_maps_gitlab_group_errors(monkeypatch):
+    for name, value in [("gitlab_token", "t"), ("openai_api_key", "k")]:
+        monkeypatch.setattr(settings, name, value)
+    failures = iter([404, 500, None])
+
+    async def list_group_projects(self, group):
+        status = next(failures)
+        request = httpx.Request("GET", f"https://gitlab.test/groups/{group}/projects")
+        if status is None:
+            raise httpx.ConnectError("refused", request=request)
+        raise httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+    monkeypatch.setattr(chat_interface.AsyncGitLabAPI, "list_group_projects", list_group_projects)
+    with TestClient(app) as client:
+        assert [client.post("/ask", params={"q": "что?", "group": "g"}).status_code for _ in range(3)] == [404, 502, 502]